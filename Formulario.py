@@ -8,7 +8,12 @@ import functools
 from json import JSONDecodeError
 import sys
 import functools
+import heapq
 import json
+import hashlib
+import mmap
+import pickle
+import struct
 import inspect
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
@@ -17,6 +22,15 @@ from typing import Any, Dict, List, Optional, Union, Callable
 from datetime import datetime, time, date
 import logging
 import re
+import unicodedata
+import threading
+import atexit
+import weakref
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -495,12 +509,18 @@ class ConfiguracionTextbox:
     caracter_comodin: str = " "
     habilitado: bool = True
     # Parámetros de búsqueda/autocompletado
-    fuente_datos: Any = None
+    fuente_datos: Any = None  # lista, diccionario, DataFrame, FuenteDatos o función (ver BuscadorCadena)
     permite_agregar: bool = False
     modo_busqueda: str = "inicio"
     sensible_mayusculas: bool = False
     df_columna_id: str = None
     df_columna_valor: str = None
+    ruta_cache: str = None
+    indice_compacto: bool = False
+    df_columnas_busqueda: Any = None  # lista de columnas, o diccionario columna -> peso
+    orden_resultados: Any = None  # OrdenResultados con los criterios de relevancia
+    historial_uso: Any = None  # HistorialUso donde se anotan las selecciones
+    clave_historial: str = None  # clave del control en el historial (por defecto, título y ruta del widget)
 
     def __post_init__(self):
         """
@@ -537,7 +557,13 @@ class ConfiguracionTextbox:
             modo_busqueda=kwargs.get("modo_busqueda", "inicio"),
             sensible_mayusculas=kwargs.get("sensible_mayusculas", False),
             df_columna_id=kwargs.get("df_columna_id", None),
-            df_columna_valor=kwargs.get("df_columna_valor", None)
+            df_columna_valor=kwargs.get("df_columna_valor", None),
+            ruta_cache=kwargs.get("ruta_cache", None),
+            indice_compacto=kwargs.get("indice_compacto", False),
+            df_columnas_busqueda=kwargs.get("df_columnas_busqueda", None),
+            orden_resultados=kwargs.get("orden_resultados", None),
+            historial_uso=kwargs.get("historial_uso", None),
+            clave_historial=kwargs.get("clave_historial", None)
         )
 
 @dataclass
@@ -618,12 +644,20 @@ class ConfiguracionCombobox:
     ancho: int = 20
     valores: List[Any] = field(default_factory=list)
     estado: str = "readonly"
-    fuente_datos: Any = None
+    fuente_datos: Any = None  # lista, diccionario, DataFrame, FuenteDatos o función (ver BuscadorCadena)
     permite_agregar: bool = False
     modo_busqueda: str = "inicio"
     sensible_mayusculas: bool = False
     df_columna_id: str = None
     df_columna_valor: str = None
+    carga_diferida: bool = False
+    max_valores_desplegable: int = 100
+    ruta_cache: str = None
+    indice_compacto: bool = False
+    df_columnas_busqueda: Any = None  # lista de columnas, o diccionario columna -> peso
+    orden_resultados: Any = None  # OrdenResultados con los criterios de relevancia
+    historial_uso: Any = None  # HistorialUso donde se anotan las selecciones
+    clave_historial: str = None  # clave del control en el historial (por defecto, título y ruta del widget)
 
     @classmethod
     def from_args(cls, *args, **kwargs):
@@ -639,7 +673,15 @@ class ConfiguracionCombobox:
             modo_busqueda=kwargs.get("modo_busqueda", "inicio"),
             sensible_mayusculas=kwargs.get("sensible_mayusculas", False),
             df_columna_id=kwargs.get("df_columna_id", None),
-            df_columna_valor=kwargs.get("df_columna_valor", None)
+            df_columna_valor=kwargs.get("df_columna_valor", None),
+            carga_diferida=kwargs.get("carga_diferida", False),
+            max_valores_desplegable=kwargs.get("max_valores_desplegable", 100),
+            ruta_cache=kwargs.get("ruta_cache", None),
+            indice_compacto=kwargs.get("indice_compacto", False),
+            df_columnas_busqueda=kwargs.get("df_columnas_busqueda", None),
+            orden_resultados=kwargs.get("orden_resultados", None),
+            historial_uso=kwargs.get("historial_uso", None),
+            clave_historial=kwargs.get("clave_historial", None)
         )
 
 @dataclass
@@ -649,13 +691,24 @@ class ConfiguracionListbox:
     ancho: int = 20
     altura: int = 5
     seleccion_multiple: bool = False
-    fuente_datos: Any = None
+    fuente_datos: Any = None  # lista, diccionario, DataFrame, FuenteDatos o función (ver BuscadorCadena)
     permite_agregar: bool = False
     modo_busqueda: str = "inicio"
     sensible_mayusculas: bool = False
     titulo_busqueda: str = "Buscar:"
     df_columna_id: str = None
     df_columna_valor: str = None
+    limite_resultados: int = None
+    busqueda_asincrona: bool = False
+    retardo_busqueda_ms: int = 150
+    virtual: bool = False
+    margen_virtual: int = 10
+    ruta_cache: str = None
+    indice_compacto: bool = False
+    df_columnas_busqueda: Any = None  # lista de columnas, o diccionario columna -> peso
+    orden_resultados: Any = None  # OrdenResultados con los criterios de relevancia
+    historial_uso: Any = None  # HistorialUso donde se anotan las selecciones
+    clave_historial: str = None  # clave del control en el historial (por defecto, título y ruta del widget)
 
     @classmethod
     def from_args(cls, *args, **kwargs):
@@ -672,7 +725,18 @@ class ConfiguracionListbox:
             sensible_mayusculas=kwargs.get("sensible_mayusculas", False),
             titulo_busqueda=args[4] if len(args) > 4 else kwargs.get("titulo_busqueda", "Buscar:"),
             df_columna_id=kwargs.get("df_columna_id", None),
-            df_columna_valor=kwargs.get("df_columna_valor", None)
+            df_columna_valor=kwargs.get("df_columna_valor", None),
+            limite_resultados=kwargs.get("limite_resultados", None),
+            busqueda_asincrona=kwargs.get("busqueda_asincrona", False),
+            retardo_busqueda_ms=kwargs.get("retardo_busqueda_ms", 150),
+            virtual=kwargs.get("virtual", False),
+            margen_virtual=kwargs.get("margen_virtual", 10),
+            ruta_cache=kwargs.get("ruta_cache", None),
+            indice_compacto=kwargs.get("indice_compacto", False),
+            df_columnas_busqueda=kwargs.get("df_columnas_busqueda", None),
+            orden_resultados=kwargs.get("orden_resultados", None),
+            historial_uso=kwargs.get("historial_uso", None),
+            clave_historial=kwargs.get("clave_historial", None)
         )
 
 @dataclass    
@@ -911,274 +975,4194 @@ class ConfiguracionDeslizante:
         
         return config
 
-class BuscadorCadena:
+def _plegar_caracter(caracter):
+    """Quita las marcas diacríticas de un carácter mediante su descomposición NFD."""
+    return ''.join(c for c in unicodedata.normalize('NFD', caracter) if unicodedata.category(c) != 'Mn')
+
+# Tabla precalculada para Latin-1 y Latin Extendido-A (U+0080 a U+017F), que cubre el español
+# y el resto de lenguas de Europa occidental sin pasar por unicodedata en cada llamada
+_TABLA_PLEGADO = str.maketrans({
+    codigo: _plegar_caracter(chr(codigo)) for codigo in range(0x80, 0x180)
+    if _plegar_caracter(chr(codigo)) != chr(codigo)
+})
+TAMANO_CACHE_NORMALIZACION = 65536
+
+def _plegar_texto(texto):
     """
-    Clase utilitaria para búsqueda y autocompletado en fuentes de datos externas.
-    Centraliza el manejo de buffer, eventos de teclado y autocompletado para cualquier widget.
+    Pliega acentos y pasa a minúsculas sin pasar por la caché. Lo usan los índices al procesar
+    los valores de la fuente: cada valor se normaliza una sola vez y, si entrara en la caché,
+    desalojaría los textos de las consultas, que son los que se repiten.
     """
-    def __init__(self, fuente_datos=None, modo_busqueda="inicio", sensible_mayusculas=False,
-                 permite_agregar=False, df_columna_id=None, df_columna_valor=None):
-        self.fuente_datos = fuente_datos
-        self.modo_busqueda = modo_busqueda
-        self.sensible_mayusculas = sensible_mayusculas
-        self.permite_agregar = permite_agregar
-        self.df_columna_id = df_columna_id
-        self.df_columna_valor = df_columna_valor
-        self.coincidencias = []
-        self.texto_sugerido = None
-        self.buffers = {}  # buffer por widget
+    if texto.isascii():
+        return texto.lower()
+    plegado = texto.translate(_TABLA_PLEGADO)
+    if plegado.isascii() or max(plegado) <= 'ſ':
+        return plegado.lower()
+    # Fuera de los rangos de la tabla (u otros diacríticos combinados), descomposición completa
+    return _plegar_caracter(texto).lower()
+
+@functools.lru_cache(maxsize=TAMANO_CACHE_NORMALIZACION)
+def normalizar_texto(texto):
+    """
+    Pliega acentos y pasa a minúsculas ("Málaga" -> "malaga").
+    El resultado se memoriza en una caché LRU compartida por todos los controles, pensada para
+    los textos que escribe el usuario (los valores de las fuentes usan _plegar_texto).
 
-    def _normalizar_texto(self, texto):
-        import unicodedata
-        texto_norm = ''.join(c for c in unicodedata.normalize('NFD', texto)
-                             if unicodedata.category(c) != 'Mn')
-        return texto_norm.lower()
+    Args:
+        texto (str): Texto a normalizar.
 
-    def busca_cadena(self, texto, modo_busqueda=None, sensible_mayusculas=None, max_resultados=None):
-        if not texto:
-            self.coincidencias = []
-            self.texto_sugerido = None
-            return []
+    Returns:
+        str: Texto sin marcas diacríticas y en minúsculas.
+    """
+    return _plegar_texto(texto)
 
-        modo = modo_busqueda or self.modo_busqueda
-        texto_busqueda = self._normalizar_texto(texto)
-        resultados = []
-        mejor_coincidencia = None
-        mejor_coincidencia_normalizada = None
-
-        # Determinar la fuente de datos a usar
-        if isinstance(self.fuente_datos, list):
-            datos_procesados = [(str(i), item) for i, item in enumerate(self.fuente_datos)]
-        elif isinstance(self.fuente_datos, dict):
-            datos_procesados = list(self.fuente_datos.items())
-        elif self._es_dataframe(self.fuente_datos):
-            datos_procesados = self._procesar_dataframe(self.fuente_datos)
-        elif callable(self.fuente_datos):
-            try:
-                resultado = self.fuente_datos(texto_busqueda, modo_busqueda, max_resultados)
-                return resultado if isinstance(resultado, list) else []
-            except Exception:
-                return []
+class ResultadoBusqueda:
+    """
+    Resultado de una búsqueda sobre un índice, expresado en posiciones de la fuente.
+
+    Attributes:
+        posiciones (list): Posiciones coincidentes, en el orden de la fuente (o por prioridad
+            si la búsqueda fue acotada).
+        mejor (int): Primera posición que coincide sin normalizar acentos (o None).
+        mejor_normalizada (int): Primera posición que solo coincide tras normalizar (o None).
+        hay_mas (bool): True si existen más coincidencias que las devueltas.
+        columnas (list): En búsquedas sobre varias columnas, la columna por la que coincide
+            cada posición (None en el resto).
+    """
+    def __init__(self, posiciones=None, mejor=None, mejor_normalizada=None, hay_mas=False, columnas=None):
+        self.posiciones = posiciones if posiciones is not None else []
+        self.mejor = mejor
+        self.mejor_normalizada = mejor_normalizada
+        self.hay_mas = hay_mas
+        self.columnas = columnas
+
+class Coincidencia(tuple):
+    """
+    Resultado (valor, id) de una búsqueda sobre varias columnas. Se comporta como la tupla
+    habitual y además indica en `columna` la columna por la que coincidió.
+    """
+    def __new__(cls, valor, identificador, columna=None):
+        coincidencia = super().__new__(cls, (valor, identificador))
+        coincidencia.columna = columna
+        return coincidencia
+
+class RespuestaBusqueda:
+    """
+    Resultado de BuscadorCadena.resolver_busqueda: lo que una búsqueda debe dejar en el
+    buscador, calculado sin modificarlo para poder hacerlo en un hilo de trabajo.
+
+    Attributes:
+        coincidencias (list): Tuplas (valor, id) o Coincidencia.
+        texto_sugerido (str): Texto a sugerir (o None).
+        hay_mas (bool): True si existen más coincidencias que las devueltas.
+        widget: Widget que originó la búsqueda (o None).
+        pila (list): Nuevas búsquedas previas del widget (None si no cambian).
+    """
+    def __init__(self, coincidencias=None, texto_sugerido=None, hay_mas=False, widget=None, pila=None):
+        self.coincidencias = coincidencias if coincidencias is not None else []
+        self.texto_sugerido = texto_sugerido
+        self.hay_mas = hay_mas
+        self.widget = widget
+        self.pila = pila
+
+def distancia_prefijo(texto, clave, maximo):
+    """
+    Distancia de edición mínima entre `texto` y cualquier prefijo de `clave`, acotada.
+    Permite tolerar erratas mientras el usuario aún no ha terminado de escribir.
+
+    Args:
+        texto (str): Texto buscado.
+        clave (str): Clave con la que se compara.
+        maximo (int): Distancia máxima de interés.
+
+    Returns:
+        int: La distancia, o maximo + 1 si la supera.
+    """
+    fila = list(range(len(texto) + 1))
+    mejor = fila[-1]
+    for j, caracter in enumerate(clave[:len(texto) + maximo], 1):
+        anterior_diagonal, fila[0] = fila[0], j
+        for i in range(1, len(texto) + 1):
+            actual = min(fila[i] + 1, fila[i - 1] + 1, anterior_diagonal + (texto[i - 1] != caracter))
+            anterior_diagonal, fila[i] = fila[i], actual
+        mejor = min(mejor, fila[-1])
+        if min(fila) > maximo:
+            break
+    return mejor if mejor <= maximo else maximo + 1
+
+class IndiceTrigramas:
+    """
+    Índice invertido de trigramas de caracteres para el modo de búsqueda "difuso".
+    Se construye una sola vez por fuente sobre las claves normalizadas distintas; cada
+    búsqueda cuenta los trigramas compartidos con el texto, descarta los candidatos que no
+    pueden estar a la distancia permitida y verifica el resto con una distancia de edición
+    acotada contra el prefijo de la clave.
+    """
+    MAX_CANDIDATOS = 2000  # candidatos verificados como mucho, los de más trigramas en común
+
+    def __init__(self, claves_normalizadas):
+        """
+        Args:
+            claves_normalizadas (iterable): Clave normalizada de cada posición de la fuente.
+        """
+        codigos, unicas = pd.factorize(pd.Series(list(claves_normalizadas), dtype=object))
+        self.claves_unicas = list(unicas)
+        # Posiciones de la fuente agrupadas por clave distinta, en el orden de la fuente
+        self._orden = np.argsort(codigos, kind="stable")
+        self._limites = np.searchsorted(codigos[self._orden], np.arange(len(unicas) + 1))
+
+        listas = {}
+        for id_clave, clave in enumerate(self.claves_unicas):
+            for trigrama in self.trigramas("  " + clave + " "):
+                listas.setdefault(trigrama, []).append(id_clave)
+        self.listas = {trigrama: np.array(ids, dtype=np.intp) for trigrama, ids in listas.items()}
+
+    @staticmethod
+    def trigramas(texto):
+        """Devuelve el conjunto de trigramas de caracteres del texto."""
+        return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+    @staticmethod
+    def max_errores(texto):
+        """Erratas toleradas según la longitud del texto buscado."""
+        if len(texto) <= 4:
+            return 1
+        return 2 if len(texto) <= 8 else 3
+
+    def buscar(self, texto_busqueda, candidatos=None, limite=None):
+        """
+        Busca por similitud el texto normalizado.
+
+        Args:
+            texto_busqueda (str): Texto normalizado (sin acentos, en minúsculas).
+            candidatos (list, optional): Posiciones a las que se limita la búsqueda.
+            limite (int, optional): Número máximo de posiciones devueltas.
+
+        Returns:
+            ResultadoBusqueda: Posiciones ordenadas de más a menos parecidas; `mejor` es la primera.
+        """
+        errores = self.max_errores(texto_busqueda)
+        # Solo se exige el inicio de la clave: el texto no lleva relleno final
+        trigramas = self.trigramas("  " + texto_busqueda)
+        listas = [self.listas[t] for t in trigramas if t in self.listas]
+        if not listas:
+            return ResultadoBusqueda()
+
+        comunes = np.bincount(np.concatenate(listas), minlength=len(self.claves_unicas))
+        # Cada error de edición elimina como mucho tres trigramas del texto
+        ids = np.flatnonzero(comunes >= max(1, len(trigramas) - 3 * errores))
+        if len(ids) > self.MAX_CANDIDATOS:
+            ids = ids[np.argpartition(-comunes[ids], self.MAX_CANDIDATOS)[:self.MAX_CANDIDATOS]]
+
+        puntuados = []
+        for id_clave in ids.tolist():
+            distancia = distancia_prefijo(texto_busqueda, self.claves_unicas[id_clave], errores)
+            if distancia <= errores:
+                primera = int(self._orden[self._limites[id_clave]])
+                puntuados.append((distancia, -int(comunes[id_clave]), primera, id_clave))
+        puntuados.sort()
+
+        permitidas = set(candidatos) if candidatos is not None else None
+        posiciones = []
+        hay_mas = False
+        for _, _, _, id_clave in puntuados:
+            for posicion in self._orden[self._limites[id_clave]:self._limites[id_clave + 1]].tolist():
+                if permitidas is not None and posicion not in permitidas:
+                    continue
+                if limite and len(posiciones) >= limite:
+                    hay_mas = True
+                    break
+                posiciones.append(posicion)
+            if hay_mas:
+                break
+
+        return ResultadoBusqueda(posiciones=posiciones, mejor=posiciones[0] if posiciones else None,
+                                 hay_mas=hay_mas)
+
+class IndiceBusqueda:
+    """
+    Índice precalculado sobre una fuente de datos para BuscadorCadena.
+    Guarda, por cada elemento, el valor original, su identificador y las claves en minúsculas
+    y normalizada (sin acentos), de forma que cada búsqueda solo compara cadenas ya preparadas.
+    Para el modo "inicio" mantiene además las claves normalizadas ordenadas, de modo que un
+    prefijo se resuelve con búsqueda binaria en O(log n + k).
+    """
+    def __init__(self, valores, identificadores=None, normalizar=None):
+        """
+        Args:
+            valores (iterable): Valores a indexar (se convierten a str).
+            identificadores (list, optional): Identificador de cada valor. Si es None,
+                el identificador es la posición del valor en la fuente (como str).
+            normalizar (callable): Función que pliega acentos y pasa a minúsculas.
+        """
+        self.valores = [str(valor) for valor in valores]
+        self.identificadores = list(identificadores) if identificadores is not None else None
+        self.claves_minusculas = [valor.lower() for valor in self.valores]
+        self.claves_normalizadas = [normalizar(valor) for valor in self.valores]
+        # Índice de prefijos: se construye la primera vez que se busca en modo "inicio"
+        self._orden = None
+        self._claves_ordenadas = None
+        self._trigramas = None  # índice del modo "difuso", también bajo demanda
+        self.fuente_observada = None  # FuenteObservable cuyos cambios se aplican a este índice
+        # Los cambios llegan en el hilo que modifica la fuente y las búsquedas pueden hacerse en
+        # otro: ambos se hacen con este cerrojo. version cuenta los cambios aplicados.
+        self.cerrojo = threading.RLock()
+        self.version = 0
+
+    def __len__(self):
+        return len(self.valores)
+
+    def valor(self, posicion):
+        """Devuelve el valor del elemento en la posición indicada."""
+        return self.valores[posicion]
+
+    def identificador(self, posicion):
+        """Devuelve el identificador del elemento en la posición indicada."""
+        if self.identificadores is None:
+            return str(posicion)
+        return self.identificadores[posicion]
+
+    def materializar(self, posiciones):
+        """
+        Convierte posiciones del índice en tuplas (valor, id).
+
+        Args:
+            posiciones (list): Posiciones a convertir.
+
+        Returns:
+            list: Lista de tuplas (valor, id).
+        """
+        return [(self.valores[p], self.identificador(p)) for p in posiciones]
+
+    def aplicar_cambio(self, cambio):
+        """
+        Aplica un cambio de la fuente observada bajo el cerrojo del índice, de modo que una
+        búsqueda en curso en otro hilo nunca vea el índice a medio modificar.
+
+        Args:
+            cambio (CambioFuente): Cambio emitido por la fuente.
+        """
+        with self.cerrojo:
+            self._aplicar_cambio(cambio)
+            self.version += 1
+
+    def _aplicar_cambio(self, cambio):
+        """
+        Aplica un cambio de una ListaObservable sin reprocesar el resto de elementos.
+        Al añadir al final se mantiene el orden de prefijos con una inserción ordenada;
+        el resto de cambios desplaza posiciones y deja que ese orden se recalcule al usarse.
+        """
+        p = cambio.posicion
+        if cambio.tipo == "insertar":
+            valor = str(cambio.valor)
+            clave = _plegar_texto(valor)
+            self.valores.insert(p, valor)
+            self.claves_minusculas.insert(p, valor.lower())
+            self.claves_normalizadas.insert(p, clave)
+            if self._claves_ordenadas is not None and p == len(self.valores) - 1:
+                destino = bisect_right(self._claves_ordenadas, clave)
+                self._claves_ordenadas.insert(destino, clave)
+                self._orden.insert(destino, p)
+            else:
+                self._orden = self._claves_ordenadas = None
+        elif cambio.tipo == "actualizar":
+            valor = str(cambio.valor)
+            self.valores[p] = valor
+            self.claves_minusculas[p] = valor.lower()
+            self.claves_normalizadas[p] = _plegar_texto(valor)
+            self._orden = self._claves_ordenadas = None
+        elif cambio.tipo == "eliminar":
+            del self.valores[p], self.claves_minusculas[p], self.claves_normalizadas[p]
+            self._orden = self._claves_ordenadas = None
+        self._trigramas = None
+
+    def desvincular(self):
+        """Deja de recibir los cambios de la fuente observada."""
+        if self.fuente_observada is not None:
+            self.fuente_observada.desuscribir(self.aplicar_cambio)
+            self.fuente_observada = None
+
+    def estado(self):
+        """
+        Devuelve el índice (incluido el orden de prefijos) en un formato compacto para CacheIndices.
+
+        Returns:
+            dict: Estado serializable, o None si algún valor no se puede empaquetar.
+        """
+        self._preparar_orden()
+        textos = {nombre: _empaquetar_textos(lista) for nombre, lista in (
+            ("valores", self.valores), ("minusculas", self.claves_minusculas),
+            ("normalizadas", self.claves_normalizadas), ("ordenadas", self._claves_ordenadas))}
+        if any(buffer is None for buffer in textos.values()):
+            return None
+        return dict(textos, tipo="lista", cantidad=len(self.valores),
+                    orden=np.asarray(self._orden, dtype=np.int64), identificadores=self.identificadores)
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Reconstruye un índice a partir del estado guardado por CacheIndices."""
+        indice = cls.__new__(cls)
+        cantidad = estado["cantidad"]
+        indice.valores = _desempaquetar_textos(estado["valores"], cantidad)
+        indice.claves_minusculas = _desempaquetar_textos(estado["minusculas"], cantidad)
+        indice.claves_normalizadas = _desempaquetar_textos(estado["normalizadas"], cantidad)
+        indice._claves_ordenadas = _desempaquetar_textos(estado["ordenadas"], cantidad)
+        indice._orden = estado["orden"].tolist()
+        indice.identificadores = estado["identificadores"]
+        indice._trigramas = None
+        indice.fuente_observada = None
+        indice.cerrojo = threading.RLock()
+        indice.version = 0
+        return indice
+
+    def _preparar_orden(self):
+        """Ordena las claves normalizadas una sola vez para las búsquedas por prefijo."""
+        if self._claves_ordenadas is None:
+            claves = self.claves_normalizadas
+            self._orden = sorted(range(len(claves)), key=claves.__getitem__)
+            self._claves_ordenadas = [claves[p] for p in self._orden]
+
+    def candidatos_prefijo(self, prefijo):
+        """
+        Localiza con búsqueda binaria las posiciones cuya clave normalizada empieza por el prefijo.
+
+        Args:
+            prefijo (str): Prefijo ya normalizado.
+
+        Returns:
+            list: Posiciones candidatas, en el orden de la fuente.
+        """
+        self._preparar_orden()
+        inicio = bisect_left(self._claves_ordenadas, prefijo)
+        fin = bisect_left(self._claves_ordenadas, prefijo + "\U0010ffff", inicio)
+        return sorted(self._orden[inicio:fin])
+
+    def buscar(self, texto, texto_busqueda, modo, candidatos=None, limite=None):
+        """
+        Busca el texto sobre las claves precalculadas.
+
+        Args:
+            texto (str): Texto tal y como lo escribió el usuario.
+            texto_busqueda (str): Texto normalizado (sin acentos, en minúsculas).
+            modo (str): "inicio", "contenido", "exacto" o "difuso" (tolerante a erratas).
+            candidatos (list, optional): Posiciones a las que se limita la búsqueda
+                (por ejemplo, el resultado de una búsqueda anterior más corta).
+            limite (int, optional): Si se indica, la búsqueda es acotada: se detiene en cuanto
+                hay más de `limite` coincidencias sin normalizar y devuelve como mucho `limite`
+                posiciones, primero las coincidencias exactas y después las normalizadas.
+
+        Returns:
+            ResultadoBusqueda: Posiciones coincidentes y mejores coincidencias.
+        """
+        if modo == "difuso":
+            if self._trigramas is None:
+                self._trigramas = IndiceTrigramas(self.claves_normalizadas)
+            return self._trigramas.buscar(texto_busqueda, candidatos, limite)
+
+        texto_minusculas = texto.lower()
+        posiciones = range(len(self.valores)) if candidatos is None else sorted(candidatos)
+        if modo == "inicio":
+            coincide = str.startswith
+            # Toda coincidencia por prefijo (con o sin acentos) cae en el rango del prefijo normalizado
+            if candidatos is None:
+                posiciones = self.candidatos_prefijo(texto_busqueda)
+        elif modo == "contenido":
+            coincide = lambda clave, buscado: buscado in clave
+        elif modo == "exacto":
+            coincide = str.__eq__
         else:
+            return ResultadoBusqueda()
+
+        if limite:
+            return self._buscar_acotado(posiciones, coincide, texto_minusculas, texto_busqueda, limite)
+
+        resultado = ResultadoBusqueda()
+        claves_minusculas = self.claves_minusculas
+        claves_normalizadas = self.claves_normalizadas
+        for posicion in posiciones:
+            if coincide(claves_minusculas[posicion], texto_minusculas):
+                resultado.posiciones.append(posicion)
+                if resultado.mejor is None:
+                    resultado.mejor = posicion
+            elif coincide(claves_normalizadas[posicion], texto_busqueda):
+                resultado.posiciones.append(posicion)
+                if resultado.mejor_normalizada is None:
+                    resultado.mejor_normalizada = posicion
+        return resultado
+
+    def _buscar_acotado(self, posiciones, coincide, texto_minusculas, texto_busqueda, limite):
+        """
+        Recorre las posiciones hasta reunir `limite` + 1 coincidencias del mejor nivel
+        (sin normalizar); a partir de ahí el resto de la fuente no puede mejorar el resultado.
+        """
+        exactas = []
+        normalizadas = []
+        sobran_normalizadas = False
+        claves_minusculas = self.claves_minusculas
+        claves_normalizadas = self.claves_normalizadas
+        for posicion in posiciones:
+            if coincide(claves_minusculas[posicion], texto_minusculas):
+                exactas.append(posicion)
+                if len(exactas) > limite:
+                    break
+            elif coincide(claves_normalizadas[posicion], texto_busqueda):
+                if len(normalizadas) < limite:
+                    normalizadas.append(posicion)
+                else:
+                    sobran_normalizadas = True
+
+        return ResultadoBusqueda(
+            posiciones=(exactas + normalizadas)[:limite],
+            mejor=exactas[0] if exactas else None,
+            mejor_normalizada=normalizadas[0] if normalizadas else None,
+            hay_mas=sobran_normalizadas or len(exactas) + len(normalizadas) > limite
+        )
+
+class VistaTextos:
+    """
+    Secuencia de textos guardada en un único buffer UTF-8 (NUL + texto + NUL + ... + NUL) con una
+    tabla de desplazamientos array('I') que indica dónde empieza cada texto. Cada elemento solo
+    se decodifica a str cuando se accede a él.
+
+    Para los modos "inicio" y "exacto" mantiene además, a partir de la primera búsqueda, las
+    posiciones ordenadas por texto (array('I')): el orden de bytes UTF-8 es el de los puntos
+    de código, así que las coincidencias forman un tramo contiguo que se localiza con búsqueda
+    binaria en O(log n + k).
+    """
+    SEPARADOR = b"\x00"
+
+    def __init__(self, textos):
+        """
+        Args:
+            textos (iterable): Textos (str) a guardar.
+
+        Raises:
+            ValueError: Si algún texto contiene el carácter NUL.
+        """
+        textos = list(textos)
+        self._orden = None  # posiciones ordenadas por texto, bajo demanda
+        if not textos:
+            # [] y [""] darían el mismo buffer: la vista vacía es un único separador
+            self.buffer = bytearray(self.SEPARADOR)
+            self.desplazamientos = array("I", [1])
+            return
+        self.buffer = bytearray(("\x00" + "\x00".join(textos) + "\x00").encode("utf-8", "surrogatepass"))
+        # Cada texto empieza tras un separador; el desplazamiento extra (de un elemento
+        # ficticio) da el final del último texto
+        separadores = np.flatnonzero(np.frombuffer(self.buffer, dtype=np.uint8) == 0)
+        if len(separadores) != len(textos) + 1:
+            raise ValueError("Los textos de una VistaTextos no pueden contener el carácter NUL")
+        self.desplazamientos = array("I")
+        self.desplazamientos.frombytes((separadores + 1).astype(np.uint32).tobytes())
+
+    def __len__(self):
+        return len(self.desplazamientos) - 1
+
+    def __getitem__(self, posicion):
+        return self.buffer[self.desplazamientos[posicion]:self.desplazamientos[posicion + 1] - 1].decode(
+            "utf-8", "surrogatepass")
+
+    def __iter__(self):
+        return iter(self.como_lista())
+
+    def como_lista(self):
+        """Decodifica todos los textos de una vez (una sola llamada a decode y a split)."""
+        if not len(self):
             return []
+        return self.buffer[1:-1].decode("utf-8", "surrogatepass").split("\x00")
+
+    def _bytes(self, posicion):
+        """Texto de la posición indicada, sin decodificar."""
+        return bytes(self.buffer[self.desplazamientos[posicion]:self.desplazamientos[posicion + 1] - 1])
+
+    def _preparar_orden(self):
+        """Ordena las posiciones por texto la primera vez que se busca por prefijo o texto exacto."""
+        if self._orden is None:
+            claves = bytes(self.buffer[1:-1]).split(self.SEPARADOR) if len(self) else []
+            orden = np.argsort(np.array(claves, dtype=object), kind="stable").astype(np.uint32)
+            self._orden = array("I")
+            self._orden.frombytes(orden.tobytes())
+
+    def _posicion_en_orden(self, clave, derecha=False):
+        """Búsqueda binaria de una clave (bytes) en el orden de textos."""
+        orden, bajo, alto = self._orden, 0, len(self._orden)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            texto = self._bytes(orden[medio])
+            if texto < clave or (derecha and texto == clave):
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
 
-        for identificador, valor in datos_procesados:
-            valor_str = str(valor)
-            valor_comparar = self._normalizar_texto(valor_str)
-            if modo == "inicio":
-                if valor_str.lower().startswith(texto.lower()):
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia is None:
-                        mejor_coincidencia = (valor_str, identificador)
-                elif valor_comparar.startswith(texto_busqueda):
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia_normalizada is None:
-                        mejor_coincidencia_normalizada = (valor_str, identificador)
-            elif modo == "contenido":
-                if texto.lower() in valor_str.lower():
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia is None:
-                        mejor_coincidencia = (valor_str, identificador)
-                elif texto_busqueda in valor_comparar:
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia_normalizada is None:
-                        mejor_coincidencia_normalizada = (valor_str, identificador)
-            elif modo == "exacto":
-                if valor_str.lower() == texto.lower():
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia is None:
-                        mejor_coincidencia = (valor_str, identificador)
-                elif valor_comparar == texto_busqueda:
-                    resultados.append((valor_str, identificador))
-                    if mejor_coincidencia_normalizada is None:
-                        mejor_coincidencia_normalizada = (valor_str, identificador)
-
-        if mejor_coincidencia:
-            self.texto_sugerido = mejor_coincidencia[0]
-        elif mejor_coincidencia_normalizada:
-            self.texto_sugerido = mejor_coincidencia_normalizada[0]
-        elif resultados:
-            self.texto_sugerido = resultados[0][0]
-        else:
-            self.texto_sugerido = texto
-
-        if max_resultados and len(resultados) > max_resultados:
-            resultados = resultados[:max_resultados]
-
-        self.coincidencias = resultados
-        return resultados
-
-    def autocompletar_en_widget(self, widget, texto_usuario, tipo_widget="text"):
+    def filas(self, patron, modo, hasta=None):
         """
-        Realiza autocompletado visual en el widget (tk.Text, ttk.Combobox o tk.Listbox) usando la lógica de BuscadorCadena.
+        Genera en orden las posiciones cuyo texto cumple el patrón. En los modos "inicio" y
+        "exacto" las toma del tramo del orden de textos que empieza por el patrón; en modo
+        "contenido" salta de coincidencia en coincidencia con bytearray.find en lugar de
+        recorrer todos los textos.
 
         Args:
-            widget: El widget de Tkinter sobre el que se realiza el autocompletado.
-            texto_usuario (str): El texto que el usuario ha escrito (buffer).
-            tipo_widget (str): El tipo de widget ("text", "combobox" o "listbox").
+            patron (bytes): Texto buscado en UTF-8.
+            modo (str): "inicio", "contenido" o "exacto".
+            hasta (int, optional): No se generan posiciones a partir de esta.
+        """
+        if modo in ("inicio", "exacto"):
+            self._preparar_orden()
+            bajo = self._posicion_en_orden(patron)
+            # Ningún texto UTF-8 contiene el byte 0xFF: patron + 0xFF acota los que empiezan por patron
+            alto = (self._posicion_en_orden(patron + b"\xff") if modo == "inicio"
+                    else self._posicion_en_orden(patron, derecha=True))
+            posiciones = np.sort(np.frombuffer(self._orden, dtype=np.uint32)[bajo:alto])
+            if hasta is not None:
+                posiciones = posiciones[:np.searchsorted(posiciones, hasta)]
+            yield from posiciones.tolist()
+            return
+
+        desplazamientos = self.desplazamientos
+        # Las coincidencias no cruzan separadores: basta buscar entre el inicio del primer texto
+        # y el separador final del último admitido
+        fin = desplazamientos[len(self) if hasta is None else hasta] - 1
+        inicio = desplazamientos[0]
+        while True:
+            encontrado = self.buffer.find(patron, inicio, fin)
+            if encontrado == -1:
+                return
+            fila = bisect_right(desplazamientos, encontrado) - 1
+            yield fila
+            inicio = desplazamientos[fila + 1]
+
+    def _desplazar(self, desde, diferencia):
+        """Suma la diferencia a los desplazamientos desde una posición, en una sola operación de NumPy."""
+        # La vista es local: debe liberarse antes de que la tabla cambie de tamaño
+        vista = np.frombuffer(self.desplazamientos, dtype=np.uint32)
+        if diferencia >= 0:
+            vista[desde:] += np.uint32(diferencia)
+        else:
+            vista[desde:] -= np.uint32(-diferencia)
+
+    def _renumerar_orden(self, desde, diferencia):
+        """Suma la diferencia (+1 o -1) a las posiciones del orden de textos a partir de `desde`."""
+        vista = np.frombuffer(self._orden, dtype=np.uint32)
+        if diferencia >= 0:
+            vista[vista >= desde] += np.uint32(diferencia)
+        else:
+            vista[vista >= desde] -= np.uint32(-diferencia)
+
+    def _quitar_del_orden(self, posicion):
+        """Retira una posición del orden de textos (si está construido)."""
+        if self._orden is not None:
+            vista = np.frombuffer(self._orden, dtype=np.uint32)
+            indice = int(np.flatnonzero(vista == posicion)[0])
+            del vista
+            del self._orden[indice]
+
+    def _poner_en_orden(self, posicion):
+        """Coloca una posición en su lugar del orden de textos (si está construido)."""
+        if self._orden is not None:
+            self._orden.insert(self._posicion_en_orden(self._bytes(posicion), derecha=True), posicion)
+
+    def insertar(self, posicion, texto):
+        """Inserta un texto en la posición indicada."""
+        parte = texto.encode("utf-8", "surrogatepass") + self.SEPARADOR
+        inicio = self.desplazamientos[posicion]
+        self.buffer[inicio:inicio] = parte
+        self.desplazamientos.insert(posicion, inicio)
+        self._desplazar(posicion + 1, len(parte))
+        if self._orden is not None:
+            self._renumerar_orden(posicion, 1)
+            self._poner_en_orden(posicion)
+
+    def actualizar(self, posicion, texto):
+        """Sustituye el texto de la posición indicada."""
+        self._quitar_del_orden(posicion)
+        inicio, fin = self.desplazamientos[posicion], self.desplazamientos[posicion + 1] - 1
+        parte = texto.encode("utf-8", "surrogatepass")
+        self.buffer[inicio:fin] = parte
+        self._desplazar(posicion + 1, len(parte) - (fin - inicio))
+        self._poner_en_orden(posicion)
+
+    def eliminar(self, posicion):
+        """Elimina el texto de la posición indicada."""
+        inicio, fin = self.desplazamientos[posicion], self.desplazamientos[posicion + 1]
+        del self.buffer[inicio:fin]
+        del self.desplazamientos[posicion]
+        self._desplazar(posicion, inicio - fin)
+        if self._orden is not None:
+            self._quitar_del_orden(posicion)
+            self._renumerar_orden(posicion + 1, -1)
+
+    def estado(self):
+        """Buffers de la vista como arrays de NumPy (serializables fuera de banda)."""
+        return (np.frombuffer(self.buffer, dtype=np.uint8),
+                np.frombuffer(self.desplazamientos, dtype=np.uint32))
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Reconstruye la vista a partir de estado(), copiando los buffers sin recorrer los textos."""
+        buffer, desplazamientos = estado
+        vista = cls.__new__(cls)
+        vista._orden = None
+        vista.buffer = bytearray(buffer)
+        vista.desplazamientos = array("I")
+        vista.desplazamientos.frombytes(desplazamientos.astype(np.uint32).tobytes())
+        return vista
+
+class IndiceCompacto(IndiceBusqueda):
+    """
+    Variante de IndiceBusqueda para fuentes muy grandes (millones de elementos).
+
+    En lugar de tres cadenas Python por elemento guarda los valores, las claves en minúsculas,
+    las claves normalizadas y los identificadores (si son cadenas) en VistaTextos: un buffer
+    UTF-8 y una tabla array('I') por columna. Las búsquedas por prefijo o texto exacto usan
+    el orden de textos de VistaTextos y las de contenido bytearray.find, de modo que su coste
+    depende sobre todo del número de coincidencias, y solo se crean cadenas Python para las
+    filas que se devuelven. Los resultados son los mismos que
+    los de IndiceBusqueda.
+    """
+    def __init__(self, valores, identificadores=None):
         """
-        coincidencias = self.busca_cadena(texto_usuario)
-        texto_sugerido = self.texto_sugerido if coincidencias and self.texto_sugerido else texto_usuario
-        idx = texto_sugerido.lower().find(texto_usuario.lower())
-        if idx == -1:
-            idx = 0
-        final_pos = idx + len(texto_usuario)
+        Args:
+            valores (iterable): Valores a indexar (se convierten a str).
+            identificadores (list, optional): Identificador de cada valor. Si es None,
+                el identificador es la posición del valor en la fuente (como str).
+
+        Raises:
+            ValueError: Si algún valor o identificador contiene el carácter NUL.
+        """
+        valores = [str(valor) for valor in valores]
+        self.valores = VistaTextos(valores)
+        self.claves_minusculas = VistaTextos(valor.lower() for valor in valores)
+        self.claves_normalizadas = VistaTextos(_plegar_texto(valor) for valor in valores)
+        del valores
+        self.identificadores = None
+        if identificadores is not None:
+            identificadores = list(identificadores)
+            # Las claves que no son cadenas (p. ej. int de un dict) se conservan tal cual
+            if all(isinstance(identificador, str) for identificador in identificadores):
+                self.identificadores = VistaTextos(identificadores)
+            else:
+                self.identificadores = identificadores
+        self._orden = None
+        self._claves_ordenadas = None
+        self._trigramas = None
+        self.fuente_observada = None
+        self.cerrojo = threading.RLock()
+        self.version = 0
 
-        if tipo_widget == "text":
-            widget.delete("1.0", "end")
-            widget.insert("1.0", texto_sugerido)
-            widget.tag_add("sel", f"1.{idx}", f"1.{final_pos}")
-            widget.mark_set("insert", f"1.{final_pos}")
-        elif tipo_widget == "combobox":
-            widget.delete(0, "end")
-            widget.insert(0, texto_sugerido)
-            widget.selection_range(idx, final_pos)
-            widget.icursor(final_pos)
-        elif tipo_widget == "listbox":
-            # Para listbox, el widget es el Entry de búsqueda
-            widget.delete(0, "end")
-            widget.insert(0, texto_sugerido)
-            widget.selection_range(idx, final_pos)
-            widget.icursor(final_pos)
-            # El Listbox se actualiza desde el método _evento_keyrelease_busqueda de la clase Listbox
+    def buscar(self, texto, texto_busqueda, modo, candidatos=None, limite=None):
+        """
+        Busca el texto sobre los buffers de claves. Misma interfaz y resultados que IndiceBusqueda.buscar;
+        la búsqueda sobre candidatos (incremental) y el modo "difuso" se delegan en ella.
 
-    def on_keypress(self, widget, event, tipo_widget="text"):
+        Returns:
+            ResultadoBusqueda: Posiciones coincidentes y mejores coincidencias.
+        """
+        if candidatos is not None or modo not in ("inicio", "contenido", "exacto"):
+            return super().buscar(texto, texto_busqueda, modo, candidatos, limite)
+
+        patron_minusculas = texto.lower().encode("utf-8", "surrogatepass")
+        patron_normalizado = texto_busqueda.encode("utf-8", "surrogatepass")
+        if not limite:
+            exactas = list(self.claves_minusculas.filas(patron_minusculas, modo))
+            conjunto_exactas = set(exactas)
+            normalizadas = [fila for fila in self.claves_normalizadas.filas(patron_normalizado, modo)
+                            if fila not in conjunto_exactas]
+            return ResultadoBusqueda(
+                posiciones=sorted(exactas + normalizadas),
+                mejor=exactas[0] if exactas else None,
+                mejor_normalizada=normalizadas[0] if normalizadas else None
+            )
+
+        # Igual que _buscar_acotado: al superar `limite` coincidencias sin normalizar, el resto
+        # de la fuente ya no puede mejorar el resultado
+        exactas = []
+        for fila in self.claves_minusculas.filas(patron_minusculas, modo):
+            exactas.append(fila)
+            if len(exactas) > limite:
+                break
+        conjunto_exactas = set(exactas)
+        normalizadas = []
+        sobran_normalizadas = False
+        hasta = exactas[-1] if len(exactas) > limite else None
+        for fila in self.claves_normalizadas.filas(patron_normalizado, modo, hasta):
+            if fila in conjunto_exactas:
+                continue
+            if len(normalizadas) == limite:
+                sobran_normalizadas = True
+                break
+            normalizadas.append(fila)
+        return ResultadoBusqueda(
+            posiciones=(exactas + normalizadas)[:limite],
+            mejor=exactas[0] if exactas else None,
+            mejor_normalizada=normalizadas[0] if normalizadas else None,
+            hay_mas=sobran_normalizadas or len(exactas) + len(normalizadas) > limite
+        )
+
+    def _aplicar_cambio(self, cambio):
+        """Aplica un cambio de una ListaObservable modificando solo el tramo afectado de cada buffer."""
+        p = cambio.posicion
+        vistas = (self.valores, self.claves_minusculas, self.claves_normalizadas)
+        if cambio.tipo in ("insertar", "actualizar"):
+            valor = str(cambio.valor)
+            for vista, texto in zip(vistas, (valor, valor.lower(), _plegar_texto(valor))):
+                if cambio.tipo == "insertar":
+                    vista.insertar(p, texto)
+                else:
+                    vista.actualizar(p, texto)
+        elif cambio.tipo == "eliminar":
+            for vista in vistas:
+                vista.eliminar(p)
+        self._orden = self._claves_ordenadas = None
+        self._trigramas = None
+
+    def estado(self):
         """
-        Maneja el evento de teclado para cualquier widget con búsqueda/autocompletado.
-        Actualiza el buffer del usuario y realiza el autocompletado según la tecla presionada.
+        Devuelve los buffers del índice para CacheIndices.
+
+        Returns:
+            dict: Estado serializable.
+        """
+        identificadores = self.identificadores
+        return {"tipo": "compacto", "valores": self.valores.estado(),
+                "minusculas": self.claves_minusculas.estado(),
+                "normalizadas": self.claves_normalizadas.estado(),
+                "identificadores": identificadores.estado() if isinstance(identificadores, VistaTextos) else identificadores}
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Reconstruye un índice a partir del estado guardado por CacheIndices."""
+        indice = cls.__new__(cls)
+        indice.valores = VistaTextos.desde_estado(estado["valores"])
+        indice.claves_minusculas = VistaTextos.desde_estado(estado["minusculas"])
+        indice.claves_normalizadas = VistaTextos.desde_estado(estado["normalizadas"])
+        identificadores = estado["identificadores"]
+        indice.identificadores = (VistaTextos.desde_estado(identificadores)
+                                  if isinstance(identificadores, tuple) else identificadores)
+        indice._orden = None
+        indice._claves_ordenadas = None
+        indice._trigramas = None
+        indice.fuente_observada = None
+        indice.cerrojo = threading.RLock()
+        indice.version = 0
+        return indice
+
+class IndiceDataFrame:
+    """
+    Índice vectorizado para fuentes de tipo DataFrame de pandas.
+    Resuelve una sola vez las columnas de id y valor y guarda como Series las claves
+    en minúsculas y normalizadas, de modo que cada búsqueda es una máscara vectorizada
+    (.str.startswith, .str.contains o igualdad) y solo se crean objetos Python para
+    los resultados que finalmente se devuelven.
+    """
+    def __init__(self, df, columna_id, columna_valor, normalizar):
+        """
+        Args:
+            df (pd.DataFrame): Fuente de datos.
+            columna_id (str): Columna con los identificadores, o None para usar el índice del DataFrame.
+            columna_valor (str): Columna con los valores a buscar.
+            normalizar (callable): Función que pliega acentos y pasa a minúsculas.
+        """
+        self.valores = df[columna_valor].map(str).reset_index(drop=True)
+        if columna_id:
+            self.identificadores = df[columna_id].map(str).reset_index(drop=True)
+        else:
+            self.identificadores = pd.Series(df.index).map(str)
+        self.claves_minusculas = self.valores.str.lower()
+        # El plegado de acentos se hace una única vez por valor distinto
+        self.claves_normalizadas = self.valores.map(
+            {valor: normalizar(valor) for valor in self.valores.unique()})
+        self._trigramas = None  # índice del modo "difuso", se construye bajo demanda
+        self.columna_id = columna_id
+        self.columna_valor = columna_valor
+        self.fuente_observada = None  # DataFrameObservable cuyos cambios se aplican a este índice
+        self.cerrojo = threading.RLock()  # ver IndiceBusqueda
+        self.version = 0
+
+    def __len__(self):
+        return len(self.valores)
+
+    def valor(self, posicion):
+        """Devuelve el valor del elemento en la posición indicada."""
+        return self.valores.iat[posicion]
+
+    def identificador(self, posicion):
+        """Devuelve el identificador del elemento en la posición indicada."""
+        return self.identificadores.iat[posicion]
+
+    def materializar(self, posiciones):
+        """
+        Convierte posiciones del índice en tuplas (valor, id).
 
         Args:
-            widget: El widget de Tkinter que recibe el evento.
-            event: El evento de teclado de Tkinter.
-            tipo_widget (str): El tipo de widget ("text", "combobox" o "listbox").
+            posiciones (array): Posiciones a convertir (ya recortadas a max_resultados).
 
         Returns:
-            "break" si el evento debe ser detenido (para evitar el comportamiento por defecto de Tkinter).
+            list: Lista de tuplas (valor, id).
         """
-        buffer_usuario = self.buffers.get(widget, "")
+        return list(zip(self.valores.take(posiciones).tolist(),
+                        self.identificadores.take(posiciones).tolist()))
 
-        if event.keysym == "BackSpace":
-            buffer_usuario = buffer_usuario[:-1]
-            self.buffers[widget] = buffer_usuario
-            self.autocompletar_en_widget(widget, buffer_usuario, tipo_widget)
-            return "break"
+    def aplicar_cambio(self, cambio):
+        """
+        Aplica un cambio de la fuente observada bajo el cerrojo del índice (ver IndiceBusqueda).
 
-        if event.char and event.char.isprintable():
-            buffer_usuario += event.char
-            self.buffers[widget] = buffer_usuario
-            self.autocompletar_en_widget(widget, buffer_usuario, tipo_widget)
-            return "break"
+        Args:
+            cambio (CambioFuente): Cambio emitido por la fuente.
+        """
+        with self.cerrojo:
+            self._aplicar_cambio(cambio)
+            self.version += 1
+
+    def _aplicar_cambio(self, cambio):
+        """Aplica un cambio de un DataFrameObservable normalizando solo la fila afectada."""
+        p = cambio.posicion
+        series = ("valores", "identificadores", "claves_minusculas", "claves_normalizadas")
+        if cambio.tipo in ("insertar", "actualizar"):
+            valor = str(cambio.valor[self.columna_valor])
+            identificador = str(cambio.valor[self.columna_id]) if self.columna_id else str(cambio.etiqueta)
+            nuevos = (valor, identificador, valor.lower(), _plegar_texto(valor))
+            for nombre, nuevo in zip(series, nuevos):
+                serie = getattr(self, nombre)
+                if cambio.tipo == "actualizar":
+                    serie.iat[p] = nuevo
+                else:
+                    setattr(self, nombre, pd.concat(
+                        [serie.iloc[:p], pd.Series([nuevo], dtype=serie.dtype), serie.iloc[p:]],
+                        ignore_index=True))
+        elif cambio.tipo == "eliminar":
+            for nombre in series:
+                setattr(self, nombre, getattr(self, nombre).drop(p).reset_index(drop=True))
+        self._trigramas = None
 
-        if event.keysym in ("Return", "Tab"):
-            texto_final = getattr(self, "texto_sugerido", None)
-            if not texto_final:
-                texto_final = buffer_usuario
-            if tipo_widget == "text":
-                widget.delete("1.0", "end")
-                widget.insert("1.0", texto_final)
-                widget.tag_remove("sel", "1.0", "end")
-                widget.mark_set("insert", f"1.{len(texto_final)}")
-            
-            elif tipo_widget == "combobox":
-                widget.delete(0, "end")
-                widget.insert(0, texto_final)
-                widget.selection_clear()
-                widget.icursor(len(texto_final))
-                
-            elif tipo_widget == "entry":
-                # Para entry de búsqueda (como en Listbox)
-                widget.delete(0, "end")
-                widget.insert(0, texto_final)
-                widget.selection_clear()
-                widget.icursor(len(texto_final))
-            self.buffers[widget] = texto_final
-            widget.tk_focusNext().focus_set()
-            return "break"
+    def desvincular(self):
+        """Deja de recibir los cambios de la fuente observada."""
+        if self.fuente_observada is not None:
+            self.fuente_observada.desuscribir(self.aplicar_cambio)
+            self.fuente_observada = None
+
+    def estado(self):
+        """
+        Devuelve las Series del índice en un formato compacto para CacheIndices.
+
+        Returns:
+            dict: Estado serializable, o None si algún valor no se puede empaquetar.
+        """
+        series = {"valores": self.valores, "identificadores": self.identificadores,
+                  "minusculas": self.claves_minusculas, "normalizadas": self.claves_normalizadas}
+        textos = {nombre: _empaquetar_textos(serie.tolist()) for nombre, serie in series.items()}
+        if any(buffer is None for buffer in textos.values()):
+            return None
+        return dict(textos, tipo="dataframe", cantidad=len(self.valores),
+                    tipos={nombre: str(serie.dtype) for nombre, serie in series.items()},
+                    columna_id=self.columna_id, columna_valor=self.columna_valor)
+
+    @classmethod
+    def desde_estado(cls, estado):
+        """Reconstruye un índice a partir del estado guardado por CacheIndices."""
+        indice = cls.__new__(cls)
+        cantidad = estado["cantidad"]
+        for nombre, atributo in (("valores", "valores"), ("identificadores", "identificadores"),
+                                 ("minusculas", "claves_minusculas"), ("normalizadas", "claves_normalizadas")):
+            setattr(indice, atributo, pd.Series(_desempaquetar_textos(estado[nombre], cantidad),
+                                                dtype=estado["tipos"][nombre]))
+        indice.columna_id = estado["columna_id"]
+        indice.columna_valor = estado["columna_valor"]
+        indice._trigramas = None
+        indice.fuente_observada = None
+        indice.cerrojo = threading.RLock()
+        indice.version = 0
+        return indice
+
+    def buscar(self, texto, texto_busqueda, modo, candidatos=None, limite=None):
+        """
+        Busca el texto sobre las Series precalculadas usando operaciones vectorizadas.
+
+        Args:
+            texto (str): Texto tal y como lo escribió el usuario.
+            texto_busqueda (str): Texto normalizado (sin acentos, en minúsculas).
+            modo (str): "inicio", "contenido", "exacto" o "difuso" (tolerante a erratas).
+            candidatos (array, optional): Posiciones a las que se limita la búsqueda.
+            limite (int, optional): Si se indica, devuelve como mucho `limite` posiciones,
+                primero las coincidencias exactas y después las normalizadas.
+
+        Returns:
+            ResultadoBusqueda: Posiciones coincidentes (array de NumPy) y mejores coincidencias.
+        """
+        if modo == "difuso":
+            if self._trigramas is None:
+                self._trigramas = IndiceTrigramas(self.claves_normalizadas)
+            resultado = self._trigramas.buscar(texto_busqueda, candidatos, limite)
+            resultado.posiciones = np.asarray(resultado.posiciones, dtype=np.intp)
+            return resultado
+
+        texto_minusculas = texto.lower()
+        claves_minusculas = self.claves_minusculas
+        claves_normalizadas = self.claves_normalizadas
+        if candidatos is not None:
+            candidatos = np.sort(np.asarray(candidatos, dtype=np.intp))
+            claves_minusculas = claves_minusculas.take(candidatos)
+            claves_normalizadas = claves_normalizadas.take(candidatos)
+
+        if modo == "inicio":
+            mascara_exacta = claves_minusculas.str.startswith(texto_minusculas)
+            mascara_normalizada = claves_normalizadas.str.startswith(texto_busqueda)
+        elif modo == "contenido":
+            mascara_exacta = claves_minusculas.str.contains(texto_minusculas, regex=False)
+            mascara_normalizada = claves_normalizadas.str.contains(texto_busqueda, regex=False)
+        elif modo == "exacto":
+            mascara_exacta = claves_minusculas == texto_minusculas
+            mascara_normalizada = claves_normalizadas == texto_busqueda
+        else:
+            return ResultadoBusqueda()
+
+        mascara_exacta = mascara_exacta.to_numpy(dtype=bool, na_value=False)
+        mascara_normalizada = mascara_normalizada.to_numpy(dtype=bool, na_value=False) & ~mascara_exacta
+        posiciones = np.flatnonzero(mascara_exacta | mascara_normalizada)
+        exactas = np.flatnonzero(mascara_exacta)
+        normalizadas = np.flatnonzero(mascara_normalizada)
+        if candidatos is not None:
+            posiciones, exactas, normalizadas = candidatos[posiciones], candidatos[exactas], candidatos[normalizadas]
+
+        hay_mas = False
+        if limite:
+            hay_mas = len(posiciones) > limite
+            posiciones = np.concatenate((exactas[:limite], normalizadas[:max(0, limite - len(exactas))]))
+
+        return ResultadoBusqueda(
+            posiciones=posiciones,
+            mejor=int(exactas[0]) if len(exactas) else None,
+            mejor_normalizada=int(normalizadas[0]) if len(normalizadas) else None,
+            hay_mas=hay_mas
+        )
+
+class IndiceMulticolumna(IndiceDataFrame):
+    """
+    Índice de DataFrame que busca en varias columnas a la vez y muestra otra (la de valor).
+
+    Además de las Series por columna, guarda una clave combinada por fila con todas las
+    columnas de búsqueda separadas por \\x1f, de modo que cada pulsación hace una sola
+    pasada vectorizada sobre ella (como con una única columna). Solo las filas candidatas
+    se comprueban después columna a columna para saber por cuál coinciden y con qué peso.
+    """
+    SEPARADOR = "\x1f"
+
+    def __init__(self, df, columna_id, columna_valor, columnas_busqueda, normalizar):
+        """
+        Args:
+            df (pd.DataFrame): Fuente de datos.
+            columna_id (str): Columna con los identificadores, o None para usar el índice del DataFrame.
+            columna_valor (str): Columna que se muestra.
+            columnas_busqueda (dict): Columnas en las que buscar y su peso; a mayor peso,
+                antes aparecen sus coincidencias.
+            normalizar (callable): Función que pliega acentos y pasa a minúsculas.
+        """
+        super().__init__(df, columna_id, columna_valor, normalizar)
+        # De mayor a menor peso; a igual peso, en el orden indicado
+        self.columnas = sorted(columnas_busqueda, key=lambda columna: -columnas_busqueda[columna])
+        self.pesos = np.array([columnas_busqueda[columna] for columna in self.columnas], dtype=float)
+        self.minusculas_columna = {}
+        self.normalizadas_columna = {}
+        for columna in self.columnas:
+            textos = df[columna].map(str).reset_index(drop=True)
+            self.minusculas_columna[columna] = textos.str.lower()
+            self.normalizadas_columna[columna] = textos.map({texto: normalizar(texto) for texto in textos.unique()})
+        self.combinada_minusculas = self._combinar(self.minusculas_columna)
+        self.combinada_normalizada = self._combinar(self.normalizadas_columna)
+
+    def _combinar(self, series):
+        """Une las columnas de cada fila en una sola clave: \\x1f col1 \\x1f col2 ... \\x1f."""
+        columnas = [series[columna] for columna in self.columnas]
+        combinada = columnas[0].str.cat(columnas[1:], sep=self.SEPARADOR) if len(columnas) > 1 else columnas[0]
+        return self.SEPARADOR + combinada + self.SEPARADOR
+
+    @staticmethod
+    def _mascara(claves, buscado, modo):
+        if modo == "inicio":
+            mascara = claves.str.startswith(buscado)
+        elif modo == "contenido":
+            mascara = claves.str.contains(buscado, regex=False)
+        else:
+            mascara = claves == buscado
+        return mascara.to_numpy(dtype=bool, na_value=False)
+
+    def buscar(self, texto, texto_busqueda, modo, candidatos=None, limite=None):
+        """
+        Busca el texto en todas las columnas de búsqueda.
+
+        Args:
+            texto (str): Texto tal y como lo escribió el usuario.
+            texto_busqueda (str): Texto normalizado (sin acentos, en minúsculas).
+            modo (str): "inicio", "contenido", "exacto" o "difuso" (este último, solo sobre la
+                columna de valor).
+            candidatos (array, optional): Posiciones a las que se limita la búsqueda.
+            limite (int, optional): Número máximo de posiciones devueltas.
+
+        Returns:
+            ResultadoBusqueda: Posiciones ordenadas por el peso de la columna que coincide (y, a
+                igual peso, en el orden de la fuente), con la columna de cada una en `columnas`.
+        """
+        if modo not in ("inicio", "contenido", "exacto"):
+            return super().buscar(texto, texto_busqueda, modo, candidatos, limite)
+        texto_minusculas = texto.lower()
+        if self.SEPARADOR in texto_minusculas:
+            return ResultadoBusqueda(columnas=[])
+
+        # 1. Una sola pasada vectorizada sobre la clave combinada
+        patron = {"inicio": "{0}{1}", "contenido": "{1}", "exacto": "{0}{1}{0}"}[modo]
+        combinada_minusculas = self.combinada_minusculas
+        combinada_normalizada = self.combinada_normalizada
+        if candidatos is not None:
+            candidatos = np.sort(np.asarray(candidatos, dtype=np.intp))
+            combinada_minusculas = combinada_minusculas.take(candidatos)
+            combinada_normalizada = combinada_normalizada.take(candidatos)
+        filas = np.flatnonzero(
+            self._mascara(combinada_minusculas, patron.format(self.SEPARADOR, texto_minusculas), "contenido")
+            | self._mascara(combinada_normalizada, patron.format(self.SEPARADOR, texto_busqueda), "contenido"))
+        if candidatos is not None:
+            filas = candidatos[filas]
+
+        # 2. Solo en las filas candidatas: columna de mayor peso que coincide y si lo hace sin normalizar
+        columna_de = np.full(len(filas), -1, dtype=np.intp)
+        exacta = np.zeros(len(filas), dtype=bool)
+        for j, columna in enumerate(self.columnas):
+            pendientes = np.flatnonzero(columna_de == -1)
+            if not len(pendientes):
+                break
+            posiciones = filas[pendientes]
+            mascara_exacta = self._mascara(self.minusculas_columna[columna].take(posiciones), texto_minusculas, modo)
+            mascara = mascara_exacta | self._mascara(
+                self.normalizadas_columna[columna].take(posiciones), texto_busqueda, modo)
+            columna_de[pendientes[mascara]] = j
+            exacta[pendientes[mascara]] = mascara_exacta[mascara]
+
+        orden = np.argsort(-self.pesos[columna_de], kind="stable")
+        posiciones, columna_de, exacta = filas[orden], columna_de[orden], exacta[orden]
+        hay_mas = bool(limite) and len(posiciones) > limite
+        if limite:
+            posiciones, columna_de, exacta = posiciones[:limite], columna_de[:limite], exacta[:limite]
+        exactas = np.flatnonzero(exacta)
+        normalizadas = np.flatnonzero(~exacta)
+        return ResultadoBusqueda(
+            posiciones=posiciones,
+            mejor=int(posiciones[exactas[0]]) if len(exactas) else None,
+            mejor_normalizada=int(posiciones[normalizadas[0]]) if len(normalizadas) else None,
+            hay_mas=hay_mas,
+            columnas=[self.columnas[j] for j in columna_de.tolist()]
+        )
+
+    def _aplicar_cambio(self, cambio):
+        """Las columnas de búsqueda no se actualizan por filas: el índice se reconstruye sobre el DataFrame."""
+        fuente = self.fuente_observada
+        if fuente is None:
+            return
+        columnas = dict(zip(self.columnas, self.pesos.tolist()))
+        cerrojo, version = self.cerrojo, self.version
+        self.__init__(fuente.datos, self.columna_id, self.columna_valor, columnas, _plegar_texto)
+        self.fuente_observada = fuente
+        self.cerrojo, self.version = cerrojo, version
+
+    def estado(self):
+        """Los índices de varias columnas no se guardan en la caché en disco."""
+        return None
+
+class FuenteDatos(ABC):
+    """
+    Protocolo de fuente de datos externa para BuscadorCadena, Combobox y Listbox.
+
+    Permite respaldar un control con datos que no caben (o no conviene cargar) en memoria,
+    como una tabla SQLite o un servicio REST: el buscador solo pide la página de resultados
+    que necesita. Las subclases deben implementar `buscar`; el resto de métodos tiene una
+    implementación por defecto basada en él.
+
+    Attributes:
+        coste (str): Indicación del coste de cada consulta: "bajo" (memoria), "medio"
+            (disco local) o "alto" (red). Los controles lanzan en segundo plano las
+            búsquedas sobre fuentes de coste "alto".
+    """
+    coste = "medio"
+
+    @abstractmethod
+    def buscar(self, texto, modo="inicio", limite=None, desplazamiento=0):
+        """
+        Devuelve una página de coincidencias.
+
+        Args:
+            texto (str): Texto normalizado (sin acentos, en minúsculas). Un texto vacío
+                devuelve todos los elementos en el orden de la fuente.
+            modo (str): "inicio", "contenido" o "exacto".
+            limite (int, optional): Número máximo de resultados. None devuelve todos.
+            desplazamiento (int): Número de coincidencias a saltar (paginación).
+
+        Returns:
+            list: Lista de tuplas (valor, id).
+        """
+
+    def contar(self, texto="", modo="inicio"):
+        """
+        Devuelve el número total de coincidencias (o de elementos, si el texto está vacío).
+
+        Args:
+            texto (str): Texto normalizado.
+            modo (str): Modo de búsqueda.
+
+        Returns:
+            int: Número de coincidencias.
+        """
+        return len(self.buscar(texto, modo))
+
+    def buscar_async(self, texto, modo="inicio", limite=None, desplazamiento=0):
+        """
+        Variante asíncrona de `buscar`. Se puede cancelar con Future.cancel() mientras
+        no haya empezado.
+
+        Returns:
+            concurrent.futures.Future: Futuro cuyo resultado es la lista de tuplas (valor, id).
+        """
+        return _ejecutor_fuentes().submit(self.buscar, texto, modo, limite, desplazamiento)
+
+    @staticmethod
+    def desde(fuente_datos):
+        """
+        Devuelve la fuente como FuenteDatos: las instancias se devuelven tal cual y las
+        funciones se envuelven en FuenteInvocable.
+
+        Args:
+            fuente_datos: Fuente de datos de un control.
+
+        Returns:
+            FuenteDatos: La fuente adaptada, o None si es una lista, diccionario o DataFrame.
+        """
+        if isinstance(fuente_datos, FuenteDatos):
+            return fuente_datos
+        if callable(fuente_datos) and not isinstance(fuente_datos, pd.DataFrame):
+            return FuenteInvocable(fuente_datos)
+        return None
+
+class FuenteInvocable(FuenteDatos):
+    """
+    Adapta al protocolo FuenteDatos las funciones que ya se usaban como fuente de datos:
+    `funcion(texto, modo, max_resultados)` para buscar y `funcion(obtener_todos=True)`
+    para obtener todos los elementos. La paginación se resuelve recortando el resultado.
+    """
+    def __init__(self, funcion, coste="medio"):
+        self.funcion = funcion
+        self.coste = coste
+
+    def buscar(self, texto, modo="inicio", limite=None, desplazamiento=0):
+        if texto:
+            maximo = desplazamiento + limite if limite is not None else None
+            resultado = self.funcion(texto, modo, maximo)
+        else:
+            resultado = self.funcion(obtener_todos=True)
+        resultado = list(resultado) if resultado else []
+        fin = desplazamiento + limite if limite is not None else None
+        return resultado[desplazamiento:fin]
+
+class FuenteSQLite(FuenteDatos):
+    """
+    Motor de búsqueda sobre SQLite para fuentes demasiado grandes para tenerlas en listas Python.
+
+    Carga una lista, diccionario o DataFrame en una base de datos (en memoria o en disco) con
+    un índice B-tree sobre el valor normalizado (sin acentos, en minúsculas) para los modos
+    "inicio" y "exacto", y un índice FTS5 con el tokenizador trigram para el modo "contenido".
+    Si la base de datos en disco ya contiene un índice con la misma suma de control de la
+    fuente, se reutiliza sin volver a cargar nada.
+    """
+    VERSION_FORMATO = "1"  # cambiarlo invalida los ficheros de índice existentes
+
+    def __init__(self, datos, ruta=":memory:", df_columna_id=None, df_columna_valor=None):
+        """
+        Args:
+            datos (list | dict | pd.DataFrame): Fuente de datos a indexar.
+            ruta (str): Fichero de la base de datos, o ":memory:" para mantenerla en memoria.
+            df_columna_id (str, optional): Columna de identificadores si la fuente es un DataFrame.
+            df_columna_valor (str, optional): Columna de valores si la fuente es un DataFrame.
+        """
+        import sqlite3
+        self.ruta = ruta
+        self.coste = "bajo" if ruta == ":memory:" else "medio"
+        # Se reutiliza la resolución de columnas de BuscadorCadena
+        self._auxiliar = BuscadorCadena(df_columna_id=df_columna_id, df_columna_valor=df_columna_valor)
+        self._cerrojo = threading.Lock()  # la conexión se comparte con los hilos de búsqueda
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.usa_fts = False
+
+        elementos, suma_control = self._preparar_elementos(datos)
+        if not self._indice_vigente(suma_control):
+            self._cargar(elementos(), suma_control)
+        self.usa_fts = self._tiene_fts()
+
+    def _preparar_elementos(self, datos):
+        """
+        Calcula la suma de control de la fuente y prepara el generador de filas (valor, id).
+
+        Returns:
+            tuple: (función que genera las tuplas (valor, id), suma de control en hexadecimal).
+        """
+        suma = hashlib.sha1(self.VERSION_FORMATO.encode())
+        if isinstance(datos, pd.DataFrame):
+            id_col, valor_col = self._auxiliar._resolver_columnas_dataframe(datos)
+            valores = datos[valor_col].map(str)
+            identificadores = datos[id_col].map(str) if id_col else pd.Series(datos.index).map(str)
+            suma.update(repr((id_col, valor_col)).encode())
+            suma.update(pd.util.hash_pandas_object(valores, index=False).to_numpy().tobytes())
+            suma.update(pd.util.hash_pandas_object(identificadores, index=False).to_numpy().tobytes())
+            return (lambda: zip(valores.tolist(), identificadores.tolist())), suma.hexdigest()
+
+        if isinstance(datos, dict):
+            filas = [(str(valor), clave) for clave, valor in datos.items()]
+        else:
+            filas = [(str(valor), str(posicion)) for posicion, valor in enumerate(datos)]
+        for valor, identificador in filas:
+            suma.update(f"{valor}\x1f{identificador!r}\x1e".encode("utf-8", "surrogatepass"))
+        return (lambda: iter(filas)), suma.hexdigest()
+
+    def _indice_vigente(self, suma_control):
+        """Indica si la base de datos ya contiene el índice de esta misma fuente."""
+        import sqlite3
+        try:
+            fila = self.conexion.execute(
+                "SELECT valor FROM meta WHERE clave = 'suma_control'").fetchone()
+        except sqlite3.Error:
+            return False
+        return fila is not None and fila[0] == suma_control
+
+    def _cargar(self, elementos, suma_control):
+        """Crea las tablas e índices y vuelca la fuente normalizando cada valor distinto una sola vez."""
+        import sqlite3
+        normalizadas = {}
+
+        def filas():
+            for posicion, (valor, identificador) in enumerate(elementos):
+                clave = normalizadas.get(valor)
+                if clave is None:
+                    clave = normalizadas[valor] = _plegar_texto(valor)
+                yield posicion, valor, identificador, clave
+
+        with self._cerrojo, self.conexion:
+            cursor = self.conexion.cursor()
+            cursor.executescript("""
+                DROP TABLE IF EXISTS elementos_fts;
+                DROP TABLE IF EXISTS elementos;
+                DROP TABLE IF EXISTS meta;
+                CREATE TABLE meta (clave TEXT PRIMARY KEY, valor TEXT);
+                CREATE TABLE elementos (pos INTEGER PRIMARY KEY, valor TEXT, id, clave TEXT);
+            """)
+            cursor.executemany("INSERT INTO elementos VALUES (?, ?, ?, ?)", filas())
+            cursor.execute("CREATE INDEX elementos_clave ON elementos (clave)")
+            try:
+                cursor.execute("CREATE VIRTUAL TABLE elementos_fts USING fts5("
+                               "clave, content='elementos', content_rowid='pos', tokenize='trigram')")
+                cursor.execute("INSERT INTO elementos_fts (elementos_fts) VALUES ('rebuild')")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"SQLite sin FTS5/trigram, el modo 'contenido' recorrerá la tabla: {e}")
+            # La suma de control se escribe al final: un índice a medio cargar no se reutiliza
+            cursor.execute("INSERT INTO meta VALUES ('suma_control', ?)", (suma_control,))
+
+    def _tiene_fts(self):
+        """Indica si la base de datos dispone del índice FTS5."""
+        fila = self.conexion.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'elementos_fts'").fetchone()
+        return fila is not None
+
+    def _condicion(self, texto, modo):
+        """
+        Traduce el modo de búsqueda a una condición SQL sobre la tabla de elementos.
+
+        Returns:
+            tuple: (cláusula WHERE, parámetros), o (None, None) si el modo no es válido.
+        """
+        if not texto:
+            return "1", ()
+        if modo == "inicio":
+            return "clave >= ? AND clave < ?", (texto, texto + "\U0010ffff")
+        if modo == "exacto":
+            return "clave = ?", (texto,)
+        if modo == "contenido":
+            # El tokenizador trigram necesita al menos tres caracteres
+            if self.usa_fts and len(texto) >= 3:
+                frase = '"' + texto.replace('"', '""') + '"'
+                return "pos IN (SELECT rowid FROM elementos_fts WHERE elementos_fts MATCH ?)", (frase,)
+            return "instr(clave, ?) > 0", (texto,)
+        return None, None
+
+    def buscar(self, texto, modo="inicio", limite=None, desplazamiento=0):
+        condicion, parametros = self._condicion(texto, modo)
+        if condicion is None:
+            return []
+        consulta = f"SELECT valor, id FROM elementos WHERE {condicion} ORDER BY pos LIMIT ? OFFSET ?"
+        with self._cerrojo:
+            filas = self.conexion.execute(
+                consulta, (*parametros, limite if limite is not None else -1, desplazamiento)).fetchall()
+        return filas
+
+    def contar(self, texto="", modo="inicio"):
+        condicion, parametros = self._condicion(texto, modo)
+        if condicion is None:
+            return 0
+        with self._cerrojo:
+            return self.conexion.execute(
+                f"SELECT count(*) FROM elementos WHERE {condicion}", parametros).fetchone()[0]
+
+    def cerrar(self):
+        """Cierra la conexión con la base de datos."""
+        with self._cerrojo:
+            self.conexion.close()
+
+_EJECUTOR_FUENTES = None
+
+def _ejecutor_fuentes():
+    """Devuelve el ejecutor compartido por las consultas asíncronas de las fuentes de datos."""
+    global _EJECUTOR_FUENTES
+    if _EJECUTOR_FUENTES is None:
+        _EJECUTOR_FUENTES = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fuente_datos")
+    return _EJECUTOR_FUENTES
+
+@atexit.register
+def _cerrar_ejecutor_fuentes():
+    """Descarta las consultas pendientes al salir, sin esperar a las que están en marcha."""
+    if _EJECUTOR_FUENTES is not None:
+        _EJECUTOR_FUENTES.shutdown(wait=False, cancel_futures=True)
+
+class CambioFuente:
+    """
+    Cambio emitido por una fuente observable.
+
+    Attributes:
+        tipo (str): "insertar", "actualizar", "eliminar" o "recargar" (cambio masivo, sin detalle).
+        posicion (int): Posición afectada en la fuente (None si tipo es "recargar").
+        valor: Elemento insertado o actualizado (en DataFrames, dict con la fila).
+        etiqueta: Etiqueta del índice del DataFrame para la fila afectada (None en listas).
+    """
+    def __init__(self, tipo, posicion=None, valor=None, etiqueta=None):
+        self.tipo = tipo
+        self.posicion = posicion
+        self.valor = valor
+        self.etiqueta = etiqueta
+
+class FuenteObservable:
+    """
+    Base de las fuentes de datos que avisan de sus cambios. Los BuscadorCadena y los
+    controles que las usan se suscriben y aplican cada cambio de forma incremental en
+    lugar de reprocesar y repintar todos los datos.
+    """
+    def _suscriptores(self):
+        if "_lista_suscriptores" not in self.__dict__:
+            self.__dict__["_lista_suscriptores"] = []
+        return self.__dict__["_lista_suscriptores"]
+
+    @property
+    def datos(self):
+        """Datos subyacentes (la propia lista o el DataFrame envuelto)."""
+        return self
+
+    def suscribir(self, funcion, prioritario=False):
+        """
+        Registra una función que recibirá cada CambioFuente.
+
+        Args:
+            funcion (callable): Función a llamar con el cambio.
+            prioritario (bool): Si es True se llama antes que el resto (lo usan los índices,
+                que deben estar actualizados cuando los controles reaccionan al cambio).
+        """
+        if prioritario:
+            self._suscriptores().insert(0, funcion)
+        else:
+            self._suscriptores().append(funcion)
+
+    def desuscribir(self, funcion):
+        """Retira una función registrada con suscribir()."""
+        suscriptores = self._suscriptores()
+        if funcion in suscriptores:
+            suscriptores.remove(funcion)
+
+    def _notificar(self, tipo, posicion=None, valor=None, etiqueta=None):
+        cambio = CambioFuente(tipo, posicion, valor, etiqueta)
+        fallido = False
+        for funcion in list(self._suscriptores()):
+            try:
+                funcion(cambio)
+            except Exception as e:
+                logger.error(f"Error al aplicar un cambio de la fuente de datos: {e}")
+                fallido = True
+        # Un suscriptor que no pudo aplicar el cambio ha quedado desfasado: se avisa de una
+        # recarga completa para que los índices se reconstruyan y los controles se repinten
+        if fallido and tipo != "recargar":
+            self._notificar("recargar")
+
+class ListaObservable(FuenteObservable, list):
+    """
+    Lista que notifica inserciones, actualizaciones y borrados a los controles que la usan.
+    Se comporta como una lista normal; las operaciones masivas (slices, sort, reverse...)
+    se notifican como "recargar".
+    """
+    def append(self, valor):
+        list.append(self, valor)
+        self._notificar("insertar", len(self) - 1, valor)
+
+    def insert(self, posicion, valor):
+        posicion = max(0, min(len(self), posicion + len(self) if posicion < 0 else posicion))
+        list.insert(self, posicion, valor)
+        self._notificar("insertar", posicion, valor)
+
+    def extend(self, valores):
+        for valor in list(valores):
+            self.append(valor)
+
+    def __iadd__(self, valores):
+        self.extend(valores)
+        return self
+
+    def pop(self, posicion=-1):
+        posicion = posicion + len(self) if posicion < 0 else posicion
+        valor = list.pop(self, posicion)
+        self._notificar("eliminar", posicion, valor)
+        return valor
+
+    def remove(self, valor):
+        self.pop(self.index(valor))
+
+    def __setitem__(self, posicion, valor):
+        list.__setitem__(self, posicion, valor)
+        if isinstance(posicion, slice):
+            self._notificar("recargar")
+        else:
+            self._notificar("actualizar", posicion + len(self) if posicion < 0 else posicion, valor)
+
+    def __delitem__(self, posicion):
+        if isinstance(posicion, slice):
+            list.__delitem__(self, posicion)
+            self._notificar("recargar")
+        else:
+            self.pop(posicion)
+
+    def clear(self):
+        list.clear(self)
+        self._notificar("recargar")
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._notificar("recargar")
+
+    def reverse(self):
+        list.reverse(self)
+        self._notificar("recargar")
+
+class DataFrameObservable(FuenteObservable):
+    """
+    Envoltorio de un DataFrame que notifica altas, modificaciones y bajas de filas.
+    El DataFrame se modifica en el sitio, así que `df` sigue siendo el mismo objeto.
+    """
+    def __init__(self, df):
+        self.df = df
+
+    @property
+    def datos(self):
+        return self.df
+
+    def __len__(self):
+        return len(self.df)
+
+    def agregar(self, fila, etiqueta=None):
+        """
+        Añade una fila al final.
+
+        Args:
+            fila (dict): Valores de la fila por columna.
+            etiqueta (optional): Etiqueta de índice. Por defecto, la siguiente a la mayor existente.
+        """
+        if etiqueta is None:
+            etiqueta = self.df.index.max() + 1 if len(self.df) and pd.api.types.is_integer_dtype(self.df.index) else len(self.df)
+        self.df.loc[etiqueta] = pd.Series(fila)
+        # Se notifica la fila tal como ha quedado (las columnas omitidas valen NaN)
+        self._notificar("insertar", len(self.df) - 1, self.df.iloc[-1].to_dict(), etiqueta)
+
+    def actualizar(self, posicion, **valores):
+        """Modifica columnas de la fila en la posición indicada."""
+        etiqueta = self.df.index[posicion]
+        for columna, valor in valores.items():
+            self.df.at[etiqueta, columna] = valor
+        self._notificar("actualizar", posicion, self.df.iloc[posicion].to_dict(), etiqueta)
+
+    def eliminar(self, posicion):
+        """Elimina la fila en la posición indicada."""
+        etiqueta = self.df.index[posicion]
+        fila = self.df.iloc[posicion].to_dict()
+        self.df.drop(index=etiqueta, inplace=True)
+        self._notificar("eliminar", posicion, fila, etiqueta)
+
+    def recargar(self, df=None):
+        """Sustituye el contenido completo (o avisa de cambios hechos directamente en `df`)."""
+        if df is not None:
+            self.df = df
+        self._notificar("recargar")
+
+def _empaquetar_textos(textos):
+    """
+    Concatena textos en un único buffer UTF-8 separado por NUL, apto para serializarse
+    fuera de banda. Devuelve None si algún texto contiene el separador.
+    """
+    unidos = "\x00".join(textos)
+    if unidos.count("\x00") != max(0, len(textos) - 1):
+        return None
+    return np.frombuffer(unidos.encode("utf-8", "surrogatepass"), dtype=np.uint8)
+
+def _desempaquetar_textos(buffer, cantidad):
+    """Recupera la lista de textos de un buffer creado por _empaquetar_textos, sin bucles Python."""
+    if cantidad == 0:
+        return []
+    return str(buffer, "utf-8", "surrogatepass").split("\x00")
+
+class CacheIndices:
+    """
+    Caché en disco de índices de búsqueda ya procesados.
+
+    Cada índice se guarda en un fichero identificado por un hash del contenido de la fuente
+    y de las columnas elegidas. Los textos se guardan como buffers UTF-8 contiguos y el orden
+    de prefijos como array de NumPy, serializados con pickle protocolo 5 fuera de banda; al
+    cargar, los buffers se leen sobre un mmap del fichero y se reconstruyen sin trabajo Python
+    por fila (ni normalización ni ordenación).
+
+    La carpeta conserva como mucho max_ficheros índices: al guardar uno nuevo se borran los
+    menos usados recientemente (cada lectura renueva la fecha de modificación del fichero).
+    """
+    MAGIA = b"FTKIDX01"
+    VERSION = "1"  # cambiarla invalida los ficheros existentes
+
+    def __init__(self, directorio, max_ficheros=32):
+        """
+        Args:
+            directorio (str): Carpeta donde se guardan los ficheros de índice.
+            max_ficheros (int): Número máximo de ficheros de índice que se conservan.
+        """
+        self.directorio = directorio
+        self.max_ficheros = max_ficheros
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta(self, clave):
+        """Ruta del fichero de índice de una clave."""
+        return os.path.join(self.directorio, f"indice_{clave}.idx")
+
+    @classmethod
+    def clave(cls, fuente, columna_id=None, columna_valor=None, compacto=False):
+        """
+        Calcula la clave de caché de una fuente: un hash de su contenido, de las columnas
+        elegidas, del tipo de índice y de la versión de Unicode usada al normalizar.
+
+        Args:
+            fuente (list | tuple | dict | pd.DataFrame): Fuente de datos.
+            columna_id (str, optional): Columna de identificadores (DataFrames).
+            columna_valor (str, optional): Columna de valores (DataFrames).
+            compacto (bool): Si el índice es un IndiceCompacto.
+
+        Returns:
+            str: Clave en hexadecimal.
+        """
+        suma = hashlib.sha1(f"{cls.VERSION}|{unicodedata.unidata_version}|{type(fuente).__name__}|"
+                            f"{compacto}".encode())
+        if isinstance(fuente, pd.DataFrame):
+            suma.update(repr((columna_id, columna_valor)).encode())
+            columnas = [columna for columna in (columna_id, columna_valor) if columna]
+            suma.update(pd.util.hash_pandas_object(
+                fuente[columnas], index=columna_id is None).to_numpy().tobytes())
+        else:
+            valores = fuente.values() if isinstance(fuente, dict) else fuente
+            # pickle guarda la longitud de cada texto, así ["a\x1eb"] y ["a", "b"] no coinciden
+            suma.update(pickle.dumps([str(valor) for valor in valores], protocol=5))
+            if isinstance(fuente, dict):
+                suma.update(repr(list(fuente.keys())).encode("utf-8", "surrogatepass"))
+        return suma.hexdigest()
+
+    def cargar(self, clave):
+        """
+        Carga el índice guardado con la clave indicada.
+
+        Returns:
+            IndiceBusqueda | IndiceDataFrame: Índice, o None si no existe o no se puede leer.
+        """
+        ruta = self.ruta(clave)
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, "rb") as fichero, \
+                    mmap.mmap(fichero.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                vista = memoryview(mapa)
+                try:
+                    if vista[:len(self.MAGIA)] != self.MAGIA:
+                        return None
+                    posicion = len(self.MAGIA)
+                    longitud, cantidad = struct.unpack_from("<QQ", vista, posicion)
+                    posicion += 16
+                    tamanos = struct.unpack_from(f"<{cantidad}Q", vista, posicion)
+                    posicion += 8 * cantidad
+                    cabecera = vista[posicion:posicion + longitud]
+                    posicion += longitud
+                    buffers = []
+                    for tamano in tamanos:
+                        buffers.append(vista[posicion:posicion + tamano])
+                        posicion += tamano
+                    estado = pickle.loads(cabecera, buffers=buffers)
+                    clase = {"dataframe": IndiceDataFrame, "compacto": IndiceCompacto}.get(
+                        estado["tipo"], IndiceBusqueda)
+                    indice = clase.desde_estado(estado)
+                    # Ningún objeto debe seguir apuntando al mmap al cerrarlo
+                    del estado, buffers, cabecera
+                finally:
+                    vista.release()
+            # Un acierto cuenta como uso reciente para la poda
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+            return indice
+        except Exception as e:
+            logger.warning(f"No se pudo leer la caché de índice {ruta}: {e}")
+            return None
+
+    def guardar(self, clave, indice):
+        """
+        Guarda el índice con la clave indicada. La escritura es atómica: se escribe en un
+        fichero temporal que después sustituye al definitivo.
+        """
+        estado = indice.estado()
+        if estado is None:
+            return
+        ruta = self.ruta(clave)
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        try:
+            buffers = []
+            cabecera = pickle.dumps(estado, protocol=5, buffer_callback=buffers.append)
+            vistas = [buffer.raw() for buffer in buffers]
+            with open(temporal, "wb") as fichero:
+                fichero.write(self.MAGIA)
+                fichero.write(struct.pack("<QQ", len(cabecera), len(vistas)))
+                fichero.write(struct.pack(f"<{len(vistas)}Q", *(vista.nbytes for vista in vistas)))
+                fichero.write(cabecera)
+                for vista in vistas:
+                    fichero.write(vista)
+            os.replace(temporal, ruta)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar la caché de índice {ruta}: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        self.podar()
+
+    def podar(self):
+        """Borra los ficheros de índice menos usados recientemente por encima de max_ficheros."""
+        try:
+            rutas = [os.path.join(self.directorio, nombre) for nombre in os.listdir(self.directorio)
+                     if nombre.startswith("indice_") and nombre.endswith(".idx")]
+            if len(rutas) <= self.max_ficheros:
+                return
+            rutas.sort(key=os.path.getmtime)
+            for ruta in rutas[:len(rutas) - self.max_ficheros]:
+                os.remove(ruta)
+        except OSError as e:
+            logger.warning(f"No se pudo podar la caché de índices {self.directorio}: {e}")
+
+class _EntradaRegistro:
+    """Entrada de RegistroIndices: el índice compartido de una clave y la fuente de la que procede."""
+    __slots__ = ("fuente", "indice", "referencias", "generacion", "cerrojo")
+
+    def __init__(self, fuente):
+        # Referencia fuerte: mientras la entrada exista, el id() de la fuente no puede reutilizarse
+        self.fuente = fuente
+        self.indice = None
+        self.referencias = 0
+        self.generacion = 0  # aumenta con cada invalidación
+        self.cerrojo = threading.Lock()  # serializa la construcción del índice de esta clave
+
+class RegistroIndices:
+    """
+    Registro compartido de índices de búsqueda.
+
+    Los BuscadorCadena que trabajan sobre la misma fuente (misma identidad y tamaño y, en
+    DataFrames, las mismas columnas) comparten un único índice en lugar de procesar cada uno
+    los mismos datos. Cada buscador adquiere una referencia a la clave de su fuente y la libera
+    al destruirse su control, al cambiar de fuente o al recolectarse el propio buscador; el
+    índice se descarta cuando se libera la última referencia. Cada entrada guarda la propia fuente, de modo que una clave basada en
+    id() nunca devuelve el índice de un objeto ya liberado.
+    """
+    def __init__(self):
+        self._entradas = {}  # clave -> _EntradaRegistro
+        self._cerrojo = threading.Lock()  # protege solo el diccionario, no las construcciones
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _entrada(self, clave, fuente):
+        """Devuelve la entrada de la clave para esta fuente, creándola si no existe. Requiere el cerrojo."""
+        entrada = self._entradas.get(clave)
+        if entrada is None or entrada.fuente is not fuente:
+            if entrada is not None:
+                self._desvincular(entrada.indice)
+            entrada = self._entradas[clave] = _EntradaRegistro(fuente)
+        return entrada
+
+    def adquirir(self, clave, fuente):
+        """
+        Registra una nueva referencia a la clave.
+
+        Args:
+            clave (tuple): Clave de la fuente (ver BuscadorCadena._firma_fuente).
+            fuente: Objeto del que procede la clave; la entrada lo mantiene vivo.
+        """
+        with self._cerrojo:
+            self._entrada(clave, fuente).referencias += 1
+
+    def liberar(self, clave):
+        """Libera una referencia; al liberar la última se descarta el índice."""
+        with self._cerrojo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return
+            entrada.referencias -= 1
+            if entrada.referencias > 0:
+                return
+            del self._entradas[clave]
+        self._desvincular(entrada.indice)
+
+    def obtener(self, clave, fuente, construir):
+        """
+        Devuelve el índice de la clave, construyéndolo si aún no existe.
+
+        La construcción se hace fuera del cerrojo del registro, bajo el de la propia entrada:
+        los controles con otras fuentes no esperan, y los que comparten esta esperan al primero
+        en lugar de construir el mismo índice dos veces.
+
+        Args:
+            clave (tuple): Clave de la fuente (ver BuscadorCadena._firma_fuente).
+            fuente: Objeto del que procede la clave.
+            construir (callable): Función sin argumentos que crea el índice.
+
+        Returns:
+            IndiceBusqueda | IndiceDataFrame: Índice compartido.
+        """
+        with self._cerrojo:
+            entrada = self._entrada(clave, fuente)
+        with entrada.cerrojo:
+            while True:
+                with self._cerrojo:
+                    indice, generacion = entrada.indice, entrada.generacion
+                if indice is not None:
+                    return indice
+                indice = construir()
+                with self._cerrojo:
+                    registrada = self._entradas.get(clave) is entrada
+                    if registrada and entrada.generacion == generacion:
+                        entrada.indice = indice
+                        return indice
+                if not registrada:
+                    # Nadie comparte ya la entrada: el índice sirve solo para esta búsqueda
+                    self._desvincular(indice)
+                    return indice
+                # Se invalidó durante la construcción: se reconstruye con los datos nuevos
+                self._desvincular(indice)
+
+    def invalidar(self, clave):
+        """Descarta el índice de la clave para que se reconstruya en su siguiente uso."""
+        with self._cerrojo:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return
+            indice, entrada.indice = entrada.indice, None
+            entrada.generacion += 1
+        self._desvincular(indice)
+
+    @staticmethod
+    def _desvincular(indice):
+        """Desconecta un índice descartado de la fuente observable que lo mantenía al día."""
+        if indice is not None and hasattr(indice, "desvincular"):
+            indice.desvincular()
+
+# Registro único compartido por todos los controles de la aplicación
+registro_indices = RegistroIndices()
+
+def _valores_distintos(indice, nombre):
+    """
+    Factoriza una columna del índice ("valores" o "claves_normalizadas"): devuelve el código de
+    cada posición y los valores distintos (array de objetos). Se calcula una vez por versión del
+    índice y se guarda en él, de modo que los criterios de orden trabajan con códigos y solo
+    evalúan cada valor distinto coincidente, sin crear textos por coincidencia en cada pulsación.
+    """
+    cache = indice.__dict__.setdefault("_factorizaciones", {})
+    version = getattr(indice, "version", 0)
+    guardado = cache.get(nombre)
+    if guardado is None or guardado[0] != version:
+        columna = getattr(indice, nombre)
+        if isinstance(columna, pd.Series):
+            columna = columna.to_numpy(dtype=object)
+        elif isinstance(columna, VistaTextos):
+            columna = columna.como_lista()
+        codigos, unicos = pd.factorize(np.asarray(columna, dtype=object))
+        guardado = cache[nombre] = (version, codigos, np.asarray(unicos, dtype=object))
+    return guardado[1], guardado[2]
+
+def _puntuar_distintos(indice, nombre, posiciones, funcion):
+    """
+    Puntúa las posiciones evaluando `funcion` una sola vez por valor distinto de la columna.
+
+    Args:
+        indice: Índice de búsqueda.
+        nombre (str): Columna del índice ("valores" o "claves_normalizadas").
+        posiciones (list): Posiciones coincidentes.
+        funcion (callable): Recibe el array de valores distintos y devuelve su puntuación.
+
+    Returns:
+        np.ndarray: Puntuación de cada posición.
+    """
+    codigos, unicos = _valores_distintos(indice, nombre)
+    distintos, inverso = np.unique(codigos[np.asarray(posiciones, dtype=np.intp)], return_inverse=True)
+    return np.asarray(funcion(unicos[distintos]), dtype=float)[inverso]
+
+class CriterioOrden(ABC):
+    """
+    Criterio de ordenación de resultados de búsqueda.
+
+    Las subclases implementan puntuar(), que recibe todas las posiciones coincidentes de una
+    vez y devuelve una puntuación por posición (mayor es mejor), de modo que el criterio
+    pueda calcularse vectorizado. Los criterios que dependen del texto usan
+    _puntuar_distintos para evaluar cada valor distinto una sola vez.
+    """
+    @abstractmethod
+    def puntuar(self, indice, posiciones, texto_busqueda, fuente):
+        """
+        Args:
+            indice: Índice de búsqueda de la fuente.
+            posiciones (list): Posiciones coincidentes.
+            texto_busqueda (str): Texto buscado, normalizado.
+            fuente: Fuente de datos original (lista, diccionario o DataFrame).
+
+        Returns:
+            np.ndarray: Puntuación de cada posición.
+        """
+
+class OrdenPorPosicion(CriterioOrden):
+    """Prefiere los valores en los que el texto aparece antes (al principio, lo primero)."""
+    def puntuar(self, indice, posiciones, texto_busqueda, fuente):
+        def puntos(claves):
+            # Si el texto no aparece tal cual (modo difuso), se considera al final del valor
+            inicios = (clave.find(texto_busqueda) for clave in claves)
+            return [-(inicio if inicio >= 0 else len(clave)) for inicio, clave in zip(inicios, claves)]
+        return _puntuar_distintos(indice, "claves_normalizadas", posiciones, puntos)
+
+class OrdenPorLongitud(CriterioOrden):
+    """Prefiere los valores más cortos, que son los más parecidos a lo escrito."""
+    def puntuar(self, indice, posiciones, texto_busqueda, fuente):
+        return _puntuar_distintos(indice, "valores", posiciones, lambda valores: [-len(valor) for valor in valores])
+
+class OrdenPorFrecuencia(CriterioOrden):
+    """
+    Prefiere los valores más frecuentes según una columna del DataFrame, un diccionario
+    valor -> frecuencia o una secuencia de frecuencias alineada con la fuente.
+    """
+    def __init__(self, frecuencias):
+        """
+        Args:
+            frecuencias (str | dict | list | pd.Series): Nombre de la columna de frecuencias del
+                DataFrame, diccionario valor -> frecuencia o frecuencias por posición.
+        """
+        self.frecuencias = frecuencias
+
+    def puntuar(self, indice, posiciones, texto_busqueda, fuente):
+        frecuencias = self.frecuencias
+        if isinstance(frecuencias, str):
+            frecuencias = fuente[frecuencias]
+        if isinstance(frecuencias, dict):
+            return _puntuar_distintos(indice, "valores", posiciones,
+                                      lambda valores: [frecuencias.get(valor, 0) for valor in valores])
+        if isinstance(frecuencias, pd.Series):
+            frecuencias = frecuencias.to_numpy()
+        return np.asarray(frecuencias, dtype=float)[np.asarray(posiciones, dtype=np.intp)]
+
+class OrdenPorHistorial(CriterioOrden):
+    """
+    Prefiere los valores que el usuario ha elegido más veces. El historial es cualquier objeto
+    con get(valor) que devuelva el número (o peso) de selecciones; por defecto, un diccionario
+    propio que se alimenta con registrar() (BuscadorCadena lo llama al aceptar una selección).
+    """
+    def __init__(self, historial=None):
+        self.historial = historial if historial is not None else {}
+
+    def registrar(self, valor):
+        """
+        Anota una selección del valor. Solo los historiales en diccionario se alimentan aquí;
+        el resto (p. ej. el de un HistorialUso) los mantiene su propietario.
+        """
+        if isinstance(self.historial, dict):
+            self.historial[valor] = self.historial.get(valor, 0) + 1
+
+    def puntuar(self, indice, posiciones, texto_busqueda, fuente):
+        historial = self.historial
+        return _puntuar_distintos(indice, "valores", posiciones,
+                                  lambda valores: [historial.get(valor, 0) or 0 for valor in valores])
+
+class OrdenResultados:
+    """
+    Etapa de ordenación de los resultados de búsqueda. Combina uno o varios criterios con su
+    peso y se queda con los k mejores mediante un montículo, sin ordenar todas las coincidencias.
+    A igual puntuación se respeta el orden de la fuente.
+    """
+    def __init__(self, *criterios):
+        """
+        Args:
+            *criterios: Instancias de CriterioOrden o tuplas (criterio, peso). El peso por defecto es 1.
+        """
+        self.criterios = [c if isinstance(c, tuple) else (c, 1) for c in criterios]
+
+    def registrar(self, valor):
+        """Anota una selección del usuario en los criterios que aprenden de ellas."""
+        for criterio, _ in self.criterios:
+            if hasattr(criterio, "registrar"):
+                criterio.registrar(valor)
+
+    def ordenar(self, indice, posiciones, texto_busqueda, fuente, k=None):
+        """
+        Ordena las posiciones coincidentes por su puntuación combinada.
+
+        Args:
+            indice: Índice de búsqueda de la fuente.
+            posiciones (list): Posiciones coincidentes, en el orden de la fuente.
+            texto_busqueda (str): Texto buscado, normalizado.
+            fuente: Fuente de datos original.
+            k (int, optional): Número de posiciones a devolver. None para ordenarlas todas.
+
+        Returns:
+            list: Las k posiciones de mayor puntuación, de mejor a peor.
+        """
+        posiciones = list(posiciones)
+        if not posiciones or not self.criterios:
+            return posiciones[:k] if k else posiciones
+        puntuacion = np.zeros(len(posiciones))
+        for criterio, peso in self.criterios:
+            puntuacion += peso * np.asarray(criterio.puntuar(indice, posiciones, texto_busqueda, fuente),
+                                            dtype=float)
+        puntuacion = puntuacion.tolist()
+        if k is None or k >= len(posiciones):
+            orden = sorted(range(len(posiciones)), key=puntuacion.__getitem__, reverse=True)
+        else:
+            orden = heapq.nlargest(k, range(len(posiciones)), key=puntuacion.__getitem__)
+        return [posiciones[i] for i in orden]
+
+class HistorialUso:
+    """
+    Almacén de los valores que los usuarios eligen en cada control, con decaimiento exponencial.
+
+    Cada selección suma 1 al peso del valor en su control, y el peso se reduce a la mitad cada
+    vida_media_dias sin usarse. Se guarda en local, en JSON o en SQLite según la extensión de
+    la ruta (sin ruta, solo en memoria). Para los prefijos cortos mantiene una caché caliente
+    prefijo -> valores más usados, de modo que la sugerencia habitual se obtiene sin consultar
+    el índice completo. Como los pesos decaen todos al mismo ritmo, el orden de la caché solo
+    cambia al registrar una selección.
+
+    Las selecciones se guardan en disco en segundo plano, agrupadas: la primera tras un
+    guardado programa el siguiente al cabo de retardo_guardado segundos, de modo que el hilo
+    de Tk nunca espera a la escritura. guardar() y cerrar() fuerzan el guardado pendiente.
+    """
+    VERSION = 1
+
+    def __init__(self, ruta=None, vida_media_dias=30, longitud_prefijo=3, max_valores=500, peso_minimo=0.05,
+                 retardo_guardado=2.0):
+        """
+        Args:
+            ruta (str, optional): Fichero .json, o base de datos SQLite con cualquier otra extensión.
+            vida_media_dias (float): Días tras los que el peso de una selección se reduce a la mitad.
+            longitud_prefijo (int): Longitud máxima del texto que se responde desde la caché caliente.
+            max_valores (int): Valores más usados de cada control que entran en la caché caliente.
+            peso_minimo (float): Peso por debajo del cual un valor se olvida al guardar.
+            retardo_guardado (float): Segundos que se agrupan las selecciones antes de guardarlas.
+        """
+        self.ruta = ruta
+        self.vida_media = vida_media_dias * 86400
+        self.longitud_prefijo = longitud_prefijo
+        self.max_valores = max_valores
+        self.peso_minimo = peso_minimo
+        self.retardo_guardado = retardo_guardado
+        self.controles = {}  # control -> {valor: [peso, instante de la última selección]}
+        self._calientes = {}  # control -> {prefijo normalizado: [valores de más a menos usado]}
+        self._cerrojo = threading.Lock()
+        self._cerrojo_guardado = threading.Lock()  # una sola escritura en disco a la vez
+        self._pendientes = set()  # (control, valor) registrados desde el último guardado
+        self._temporizador = None
+        self._conexion = None
+        if ruta:
+            try:
+                self._cargar()
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el historial de uso {ruta}: {e}")
+            # Lo pendiente se guarda también si la aplicación termina sin llamar a cerrar()
+            atexit.register(self.guardar)
+
+    def _es_json(self):
+        return self.ruta.lower().endswith(".json")
+
+    def _cargar(self):
+        if self._es_json():
+            if os.path.exists(self.ruta):
+                with open(self.ruta, encoding="utf-8") as fichero:
+                    datos = json.load(fichero)
+                if datos.get("version") == self.VERSION:
+                    self.controles = {control: {valor: list(uso) for valor, uso in valores.items()}
+                                      for control, valores in datos.get("controles", {}).items()}
+            return
+        import sqlite3
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS uso (control TEXT, valor TEXT, peso REAL, instante REAL, "
+            "PRIMARY KEY (control, valor))")
+        for control, valor, peso, instante in self._conexion.execute("SELECT * FROM uso"):
+            self.controles.setdefault(control, {})[valor] = [peso, instante]
+
+    def _ahora(self):
+        return datetime.now().timestamp()
+
+    def _peso_actual(self, uso, ahora):
+        peso, instante = uso
+        return peso * 0.5 ** ((ahora - instante) / self.vida_media)
+
+    def registrar(self, control, valor):
+        """
+        Anota que el usuario ha elegido el valor en el control y programa su guardado.
+
+        Args:
+            control (str): Clave del control.
+            valor (str): Valor elegido.
+        """
+        ahora = self._ahora()
+        with self._cerrojo:
+            valores = self.controles.setdefault(control, {})
+            uso = valores.get(valor)
+            peso = self._peso_actual(uso, ahora) + 1 if uso else 1
+            valores[valor] = [peso, ahora]
+            self._calientes.pop(control, None)
+            if not self.ruta:
+                return
+            self._pendientes.add((control, valor))
+            if self._temporizador is None:
+                self._temporizador = threading.Timer(self.retardo_guardado, self.guardar)
+                self._temporizador.daemon = True
+                self._temporizador.start()
+
+    def guardar(self):
+        """
+        Guarda ya las selecciones pendientes, olvidando los valores cuyo peso es despreciable.
+        El estado se copia con el cerrojo tomado y se escribe fuera de él.
+        """
+        with self._cerrojo_guardado:
+            with self._cerrojo:
+                if self._temporizador is not None:
+                    self._temporizador.cancel()
+                    self._temporizador = None
+                if not self._pendientes or (self._conexion is None and not (self.ruta and self._es_json())):
+                    return
+                olvidados = self._podar(self._ahora())
+                pendientes, self._pendientes = self._pendientes, set()
+                if self._conexion is not None:
+                    filas = [(control, valor, *self.controles[control][valor])
+                             for control, valor in pendientes
+                             if valor in self.controles.get(control, {})]
+                else:
+                    contenido = json.dumps({"version": self.VERSION, "controles": self.controles},
+                                           ensure_ascii=False)
+            try:
+                if self._conexion is not None:
+                    with self._conexion:
+                        self._conexion.executemany("INSERT OR REPLACE INTO uso VALUES (?, ?, ?, ?)", filas)
+                        self._conexion.executemany("DELETE FROM uso WHERE control = ? AND valor = ?", olvidados)
+                else:
+                    self._guardar_json(contenido)
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el historial de uso {self.ruta}: {e}")
+
+    def _podar(self, ahora):
+        """
+        Olvida los valores cuyo peso ya es despreciable. Requiere el cerrojo.
+
+        Returns:
+            list: Tuplas (control, valor) olvidadas.
+        """
+        olvidados = []
+        for control, valores in self.controles.items():
+            for valor in [v for v, uso in valores.items() if self._peso_actual(uso, ahora) < self.peso_minimo]:
+                del valores[valor]
+                olvidados.append((control, valor))
+                self._calientes.pop(control, None)
+        return olvidados
+
+    def _guardar_json(self, contenido):
+        """Escribe el historial de forma atómica."""
+        temporal = f"{self.ruta}.{os.getpid()}.tmp"
+        with open(temporal, "w", encoding="utf-8") as fichero:
+            fichero.write(contenido)
+        os.replace(temporal, self.ruta)
+
+    def peso(self, control, valor):
+        """Devuelve el peso actual (con decaimiento) del valor en el control, o 0 si nunca se eligió."""
+        uso = self.controles.get(control, {}).get(valor)
+        return self._peso_actual(uso, self._ahora()) if uso else 0
+
+    def vista(self, control):
+        """
+        Devuelve una vista del historial de un control con get(valor) -> peso, que puede usarse
+        como historial de OrdenPorHistorial.
+        """
+        return _VistaHistorial(self, control)
+
+    def sugerir(self, control, texto_busqueda, existe=None):
+        """
+        Devuelve el valor más usado del control que empieza por el texto, si este es corto.
+
+        Args:
+            control (str): Clave del control.
+            texto_busqueda (str): Texto escrito, normalizado.
+            existe (callable, optional): Función valor -> bool; los valores frecuentes para los
+                que devuelve False (por ejemplo, ya borrados de la fuente) se saltan.
+
+        Returns:
+            str: Valor sugerido, o None si el texto es largo o ningún valor frecuente coincide.
+        """
+        if not texto_busqueda or len(texto_busqueda) > self.longitud_prefijo:
+            return None
+        with self._cerrojo:
+            calientes = self._calientes.get(control)
+            if calientes is None:
+                calientes = self._calientes[control] = self._construir_calientes(control)
+        for valor in calientes.get(texto_busqueda, ()):
+            if existe is None or existe(valor):
+                return valor
+        return None
+
+    def _construir_calientes(self, control):
+        valores = self.controles.get(control, {})
+        ahora = self._ahora()
+        frecuentes = heapq.nlargest(self.max_valores, valores,
+                                    key=lambda valor: self._peso_actual(valores[valor], ahora))
+        calientes = {}
+        for valor in frecuentes:
+            clave = _plegar_texto(valor)
+            for longitud in range(1, min(len(clave), self.longitud_prefijo) + 1):
+                calientes.setdefault(clave[:longitud], []).append(valor)
+        return calientes
+
+    def cerrar(self):
+        """Guarda las selecciones pendientes y cierra la base de datos SQLite, si se usa."""
+        self.guardar()
+        if self.ruta:
+            atexit.unregister(self.guardar)
+        with self._cerrojo_guardado:
+            if self._conexion is not None:
+                self._conexion.close()
+                self._conexion = None
+
+class _VistaHistorial:
+    """Historial de uso de un único control, con la interfaz get() de un diccionario."""
+    def __init__(self, historial, control):
+        self.historial = historial
+        self.control = control
+
+    def get(self, valor, defecto=0):
+        return self.historial.peso(self.control, valor) or defecto
+
+class _RecursosBuscador:
+    """
+    Lo que un BuscadorCadena tiene tomado fuera de sí mismo: su referencia a una clave de
+    registro_indices y su suscripción a la fuente observable. No guarda el buscador (la
+    suscripción lo llama a través de una referencia débil), de modo que un weakref.finalize
+    lo suelta todo cuando el buscador se recolecta sin que nadie haya llamado a liberar().
+    """
+    __slots__ = ("firma", "observable", "aplicar_cambio")
+
+    def __init__(self, buscador):
+        self.firma = None  # clave adquirida en registro_indices
+        self.observable = None  # fuente observable a la que está suscrito aplicar_cambio
+        metodo = weakref.WeakMethod(buscador._aplicar_cambio)
+
+        def aplicar_cambio(cambio):
+            funcion = metodo()
+            if funcion is not None:
+                funcion(cambio)
+        self.aplicar_cambio = aplicar_cambio
+
+    def soltar(self):
+        """Libera la clave del registro y retira la suscripción a la fuente observable."""
+        if self.firma is not None:
+            registro_indices.liberar(self.firma)
+            self.firma = None
+        if self.observable is not None:
+            self.observable.desuscribir(self.aplicar_cambio)
+            self.observable = None
+
+class BuscadorCadena:
+    """
+    Clase utilitaria para búsqueda y autocompletado en fuentes de datos externas.
+    Centraliza el manejo de buffer, eventos de teclado y autocompletado para cualquier widget.
+
+    Las listas, tuplas, diccionarios y DataFrames se indexan una sola vez. Para saber si han
+    cambiado solo se comprueba su identidad y su tamaño, de modo que una modificación en el
+    sitio que no cambia el tamaño (`fuente[3] = "x"`) no se ve hasta llamar a
+    invalidar_indice(). Las fuentes que cambian mientras el formulario está abierto deben
+    envolverse en ListaObservable o DataFrameObservable, cuyos cambios se aplican solos al
+    índice y a los controles.
+
+    El índice compartido se suelta con liberar() o, si nadie la llama, cuando el buscador se
+    recolecta: un buscador suelto (fuera de un control) no lo mantiene vivo en el registro.
+    """
+    def __init__(self, fuente_datos=None, modo_busqueda="inicio", sensible_mayusculas=False,
+                 permite_agregar=False, df_columna_id=None, df_columna_valor=None,
+                 limite_resultados=None, ruta_cache=None, indice_compacto=False, df_columnas_busqueda=None,
+                 orden_resultados=None, historial_uso=None, clave_historial=None):
+        self.al_cambiar_fuente = None  # función del control que aplica los cambios al widget
+        self._recursos = _RecursosBuscador(self)
+        weakref.finalize(self, self._recursos.soltar)
+        self._observable = None
+        self._fuente_datos = None
+        self._enlazar_fuente(fuente_datos)
+        self.modo_busqueda = modo_busqueda
+        self.sensible_mayusculas = sensible_mayusculas
+        self.permite_agregar = permite_agregar
+        self.df_columna_id = df_columna_id
+        self.df_columna_valor = df_columna_valor
+        # Columnas del DataFrame en las que buscar (lista, o diccionario columna -> peso); la de
+        # valor sigue siendo la que se muestra. None para buscar solo en la columna de valor.
+        if isinstance(df_columnas_busqueda, (list, tuple)):
+            df_columnas_busqueda = {columna: 1 for columna in df_columnas_busqueda}
+        self.df_columnas_busqueda = dict(df_columnas_busqueda) if df_columnas_busqueda else None
+        # Si se indica, las búsquedas son acotadas (top-k) y se detienen al reunir el límite
+        self.limite_resultados = limite_resultados
+        # OrdenResultados que decide qué coincidencias se muestran primero (None: orden de la fuente)
+        self.orden_resultados = orden_resultados
+        # HistorialUso donde se anotan las sugerencias aceptadas, bajo la clave de este control
+        self.historial_uso = historial_uso
+        self.clave_historial = clave_historial or ""
+        self._sugerencia_aceptable = False  # texto_sugerido es un valor de la fuente
+        # Carpeta de la caché en disco de índices procesados (None para no usarla)
+        self.cache_indices = CacheIndices(ruta_cache) if ruta_cache else None
+        # Listas y diccionarios enormes: índice en buffers UTF-8 en lugar de cadenas Python
+        self.indice_compacto = indice_compacto
+        self.coincidencias = []
+        self.texto_sugerido = None
+        self.hay_mas = False
+        self.buffers = {}  # buffer por widget
+        self._indice = None
+        self._cerrojo_indice = threading.Lock()  # el índice puede pedirse desde un hilo de búsqueda
+        # Búsquedas anteriores por widget: pila de (texto en minúsculas, modo, ResultadoBusqueda,
+        # versión del índice)
+        self._busquedas_previas = {}
+        self._fuente_adaptada = None  # FuenteDatos que envuelve una fuente invocable
+
+    @property
+    def fuente_datos(self):
+        """Datos sobre los que se busca (los datos actuales si la fuente es observable)."""
+        return self._fuente_datos
+
+    @fuente_datos.setter
+    def fuente_datos(self, fuente_datos):
+        # Al cambiar de fuente se suelta enseguida la referencia al índice de la anterior, para
+        # que el registro no la mantenga viva hasta la siguiente búsqueda
+        if fuente_datos is self._fuente_datos or (fuente_datos is self._observable and fuente_datos is not None):
+            return
+        self.liberar()
+        self._enlazar_fuente(fuente_datos)
+
+    def _enlazar_fuente(self, fuente_datos):
+        """Toma la fuente de datos; las observables se indexan sobre sus datos y avisan de cada cambio."""
+        self._observable = fuente_datos if isinstance(fuente_datos, FuenteObservable) else None
+        self._fuente_datos = fuente_datos.datos if self._observable is not None else fuente_datos
+        if self._observable is not None:
+            self._observable.suscribir(self._recursos.aplicar_cambio)
+            self._recursos.observable = self._observable
+
+    def fuente_externa(self):
+        """
+        Devuelve la fuente de datos como FuenteDatos si resuelve las búsquedas por sí misma
+        (una FuenteDatos o una función), o None si es una lista, diccionario o DataFrame.
+        """
+        fuente = self.fuente_datos
+        if self._fuente_adaptada is not None and (
+                self._fuente_adaptada is fuente or getattr(self._fuente_adaptada, "funcion", None) is fuente):
+            return self._fuente_adaptada
+        self._fuente_adaptada = FuenteDatos.desde(fuente)
+        return self._fuente_adaptada
+
+    def _normalizar_texto(self, texto):
+        return normalizar_texto(texto)
+
+    def _firma_fuente(self, fuente):
+        """
+        Calcula una firma barata de la fuente de datos para detectar si ha cambiado.
+        Combina la identidad del objeto con su tamaño y, en DataFrames, las columnas elegidas;
+        no detecta los cambios en el sitio que conservan el tamaño (ver la clase).
+        Es también la clave con la que el índice se comparte en registro_indices, por lo que
+        incluye el tipo de índice (compacto o no). Las fuentes observables mantienen su índice
+        al día, así que su firma no incluye el tamaño.
+        """
+        if self._observable is not None:
+            return (id(self._observable), "observable", self.df_columna_id, self.df_columna_valor,
+                    self.indice_compacto, self._firma_columnas_busqueda())
+        if self._es_dataframe(fuente):
+            return (id(fuente), fuente.shape, tuple(fuente.columns), self.df_columna_id, self.df_columna_valor,
+                    self._firma_columnas_busqueda())
+        return (id(fuente), len(fuente), self.indice_compacto)
+
+    def _identidad_fuente(self, fuente):
+        """Objeto cuyo id() forma parte de la firma; el registro lo conserva junto al índice."""
+        return self._observable if self._observable is not None else fuente
+
+    def _firma_columnas_busqueda(self):
+        return tuple(self.df_columnas_busqueda.items()) if self.df_columnas_busqueda else None
+
+    def _obtener_indice(self):
+        """
+        Devuelve el índice de búsqueda de la fuente actual, construyéndolo solo
+        la primera vez o cuando la fuente de datos ha cambiado.
+
+        Returns:
+            IndiceBusqueda | IndiceDataFrame: Índice de la fuente, o None si la fuente no es indexable.
+        """
+        fuente = self.fuente_datos
+        if not isinstance(fuente, (list, tuple, dict)) and not self._es_dataframe(fuente):
+            return None
+
+        with self._cerrojo_indice:
+            return self._construir_indice(fuente)
+
+    def _construir_indice(self, fuente):
+        """
+        Obtiene del registro compartido el índice de la fuente, cambiando de entrada si la
+        firma de la fuente ha cambiado. Requiere el cerrojo del índice.
+        """
+        firma = self._firma_fuente(fuente)
+        if firma != self._recursos.firma:
+            if self._recursos.firma is not None:
+                registro_indices.liberar(self._recursos.firma)
+            registro_indices.adquirir(firma, self._identidad_fuente(fuente))
+            self._recursos.firma = firma
+        indice = registro_indices.obtener(firma, self._identidad_fuente(fuente), lambda: self._crear_indice(fuente))
+        # Otro control pudo invalidar y reconstruir el índice compartido
+        if indice is not self._indice:
+            self._indice = indice
+            self._busquedas_previas.clear()
+        return indice
+
+    def _crear_indice(self, fuente):
+        """
+        Crea el índice de búsqueda de una lista, tupla, diccionario o DataFrame, o lo carga de
+        la caché en disco si está configurada y contiene esta misma fuente. Si la fuente es
+        observable, el índice se suscribe a ella para aplicar sus cambios incrementalmente.
+        """
+        id_col = valor_col = None
+        if self._es_dataframe(fuente):
+            try:
+                id_col, valor_col = self._resolver_columnas_dataframe(fuente)
+            except Exception as e:
+                logger.warning(f"No se pudo indexar el DataFrame para la búsqueda: {e}")
+                return IndiceBusqueda([], normalizar=_plegar_texto)
+
+        clave_cache = None
+        multicolumna = self.df_columnas_busqueda and self._es_dataframe(fuente)
+        if self.cache_indices is not None and not multicolumna:
+            try:
+                clave_cache = CacheIndices.clave(fuente, id_col, valor_col,
+                                                 self.indice_compacto and not self._es_dataframe(fuente))
+                indice = self.cache_indices.cargar(clave_cache)
+                if indice is not None:
+                    return self._vincular_indice(indice)
+            except Exception as e:
+                logger.warning(f"No se pudo consultar la caché de índices: {e}")
+
+        if isinstance(fuente, (list, tuple, dict)):
+            valores, identificadores = (fuente.values(), list(fuente.keys())) if isinstance(fuente, dict) else (fuente, None)
+            indice = None
+            if self.indice_compacto:
+                try:
+                    indice = IndiceCompacto(valores, identificadores)
+                except ValueError as e:
+                    logger.warning(f"No se pudo crear el índice compacto, se usa el normal: {e}")
+            if indice is None:
+                indice = IndiceBusqueda(valores, identificadores, normalizar=_plegar_texto)
+        else:
+            try:
+                if multicolumna:
+                    indice = IndiceMulticolumna(fuente, id_col, valor_col, self.df_columnas_busqueda,
+                                                normalizar=_plegar_texto)
+                else:
+                    indice = IndiceDataFrame(fuente, id_col, valor_col, normalizar=_plegar_texto)
+            except Exception as e:
+                logger.warning(f"No se pudo indexar el DataFrame para la búsqueda: {e}")
+                return IndiceBusqueda([], normalizar=_plegar_texto)
+        if clave_cache is not None:
+            self.cache_indices.guardar(clave_cache, indice)
+        return self._vincular_indice(indice)
+
+    def _vincular_indice(self, indice):
+        """Suscribe el índice a la fuente observable, si la hay, para mantenerlo al día."""
+        if self._observable is not None:
+            self._observable.suscribir(indice.aplicar_cambio, prioritario=True)
+            indice.fuente_observada = self._observable
+        return indice
+
+    def _aplicar_cambio(self, cambio):
+        """
+        Recibe un cambio de la fuente observable. El índice compartido ya lo ha aplicado;
+        aquí se descartan las búsquedas previas (sus posiciones han cambiado) y se avisa al control.
+        """
+        if cambio.tipo == "recargar":
+            # Misma fuente observable con datos nuevos: la clave se conserva y se reconstruye
+            self._fuente_datos = self._observable.datos
+            self.invalidar_indice()
+        else:
+            with self._cerrojo_indice:
+                self._busquedas_previas.clear()
+        if self.al_cambiar_fuente is not None:
+            self.al_cambiar_fuente(cambio)
+
+    def valor_mostrado(self, cambio):
+        """
+        Devuelve el texto que un control debe mostrar para el elemento de un cambio.
+
+        Args:
+            cambio (CambioFuente): Cambio de una fuente observable.
+
+        Returns:
+            str: Valor a mostrar.
+        """
+        if isinstance(cambio.valor, dict) and self._es_dataframe(self.fuente_datos):
+            _, valor_col = self._resolver_columnas_dataframe(self.fuente_datos)
+            return str(cambio.valor[valor_col])
+        return str(cambio.valor)
+
+    def primeros_valores(self, limite):
+        """
+        Devuelve los primeros elementos de la fuente sin filtrar, sin recorrerla entera.
+
+        Args:
+            limite (int): Número máximo de elementos.
+
+        Returns:
+            list: Lista de tuplas (valor, id).
+        """
+        fuente = self.fuente_externa()
+        if fuente is not None:
+            try:
+                return fuente.buscar("", self.modo_busqueda, limite)
+            except Exception as e:
+                logger.error(f"Error al obtener valores desde la fuente de datos: {e}")
+                return []
+        indice = self._obtener_indice()
+        if indice is None:
+            return []
+        with indice.cerrojo:
+            return indice.materializar(range(min(limite, len(indice))))
+
+    def invalidar_indice(self):
+        """
+        Descarta el índice de búsqueda para que se reconstruya en la siguiente búsqueda.
+        Necesario cuando una lista, diccionario o DataFrame se modifica sin cambiar de tamaño
+        (las fuentes observables no lo necesitan). Al ser un índice compartido, el resto de
+        controles con la misma fuente también usarán el nuevo.
+        """
+        with self._cerrojo_indice:
+            if self._recursos.firma is not None:
+                registro_indices.invalidar(self._recursos.firma)
+            self._indice = None
+            self._busquedas_previas.clear()
+
+    def liberar(self):
+        """
+        Libera la referencia de este buscador al índice compartido. Lo llaman los controles
+        al destruirse; el índice se descarta cuando ningún otro control lo usa.
+        """
+        with self._cerrojo_indice:
+            self._recursos.soltar()
+            self._indice = None
+            self._busquedas_previas.clear()
+
+    def _buscar_incremental(self, indice, pila, texto, texto_busqueda, modo, limite=None):
+        """
+        Busca reutilizando la búsqueda anterior del mismo widget cuando es posible.
+
+        Si el texto actual extiende el anterior ("Mad" -> "Madr") solo se filtran las
+        coincidencias previas; si coincide con una búsqueda anterior (por ejemplo tras un
+        BackSpace) se devuelve directamente el resultado guardado.
+
+        Args:
+            indice (IndiceBusqueda): Índice de la fuente de datos.
+            pila (list): Copia de las búsquedas previas del widget; se actualiza en el sitio.
+            texto (str): Texto escrito por el usuario.
+            texto_busqueda (str): Texto normalizado.
+            modo (str): Modo de búsqueda.
+            limite (int, optional): Límite de la búsqueda acotada.
+
+        Returns:
+            ResultadoBusqueda: Resultado de la búsqueda.
+        """
+        if modo not in ("inicio", "contenido"):
+            # En modo exacto un texto más largo no es un subconjunto del anterior
+            return indice.buscar(texto, texto_busqueda, modo, limite=limite)
+
+        texto_minusculas = texto.lower()
+        # Descartar las búsquedas que ya no son prefijo del texto actual o que se hicieron sobre
+        # otro índice o antes del último cambio de la fuente (sus posiciones ya no son válidas)
+        while pila and not (pila[-1][1] == modo and texto_minusculas.startswith(pila[-1][0])
+                            and pila[-1][3] is indice and pila[-1][4] == indice.version):
+            pila.pop()
+
+        if pila and pila[-1][0] == texto_minusculas:
+            previo = pila[-1][2]
+            # Un resultado acotado sirve si llega al límite pedido (con desplazamiento puede pedirse más)
+            if not previo.hay_mas or (limite is not None and len(previo.posiciones) >= limite):
+                return previo
+            pila.pop()
+
+        # Un resultado acotado incompleto no contiene todas las coincidencias: no sirve de candidato
+        candidatos = None
+        if pila and not pila[-1][2].hay_mas:
+            candidatos = pila[-1][2].posiciones
+        resultado = indice.buscar(texto, texto_busqueda, modo, candidatos, limite)
+        pila.append((texto_minusculas, modo, resultado, indice, indice.version))
+        return resultado
+
+    def busca_cadena(self, texto, modo_busqueda=None, sensible_mayusculas=None, max_resultados=None, widget=None,
+                     desplazamiento=0):
+        """
+        Busca el texto en la fuente de datos y actualiza coincidencias y texto sugerido.
+
+        Args:
+            texto (str): Texto a buscar.
+            modo_busqueda (str, optional): "inicio", "contenido", "exacto" o "difuso". Por defecto,
+                el del buscador. En modo "difuso" los resultados vienen ordenados por parecido.
+            sensible_mayusculas (bool, optional): Reservado para compatibilidad.
+            max_resultados (int, optional): Número máximo de resultados devueltos. En modo acotado
+                (limite_resultados) sustituye al límite configurado.
+            widget (optional): Widget que origina la búsqueda. Si se indica, la búsqueda se
+                estrecha a partir de la anterior del mismo widget mientras el usuario sigue escribiendo.
+            desplazamiento (int): Número de coincidencias a saltar, para pedir páginas sucesivas.
+
+        Returns:
+            list: Lista de tuplas (valor, id) coincidentes. Si se busca en varias columnas de un
+                DataFrame, son Coincidencia, que indican además la columna por la que coinciden.
+        """
+        return self.aplicar_busqueda(self.resolver_busqueda(texto, modo_busqueda, max_resultados, widget,
+                                                            desplazamiento))
+
+    def buscar_async(self, texto, ejecutor, widget=None):
+        """
+        Resuelve la búsqueda en un hilo de trabajo sin tocar el estado del buscador. El
+        resultado se aplica después, en el hilo de Tk, con aplicar_busqueda().
+
+        Args:
+            texto (str): Texto a buscar.
+            ejecutor (concurrent.futures.Executor): Ejecutor donde se hace la búsqueda.
+            widget (optional): Widget que origina la búsqueda (ver busca_cadena).
+
+        Returns:
+            concurrent.futures.Future: Futuro con la RespuestaBusqueda.
+        """
+        fuente = self.fuente_externa() if texto else None
+        if fuente is None:
+            return ejecutor.submit(self.resolver_busqueda, texto, widget=widget)
+
+        # Las fuentes externas consultan con su propio buscar_async (y su ejecutor compartido)
+        modo = self.modo_busqueda
+        limite = self.limite_resultados
+        consulta = fuente.buscar_async(self._normalizar_texto(texto), modo, limite + 1 if limite else None)
+        futuro = Future()
+
+        def terminar(consulta):
+            if not futuro.set_running_or_notify_cancel():
+                return
+            try:
+                resultados = consulta.result()
+            except Exception as e:
+                logger.error(f"Error al buscar en la fuente de datos: {e}")
+                resultados = []
+            futuro.set_result(self._respuesta_de_fuente(texto, modo, resultados, limite))
+
+        # Cancelar la respuesta cancela la consulta si aún no ha empezado
+        futuro.add_done_callback(lambda futuro: futuro.cancelled() and consulta.cancel())
+        consulta.add_done_callback(terminar)
+        return futuro
+
+    def aplicar_busqueda(self, respuesta):
+        """
+        Deja en el buscador el resultado de resolver_busqueda (coincidencias, texto sugerido,
+        hay_mas y las búsquedas previas del widget).
+
+        Args:
+            respuesta (RespuestaBusqueda): Resultado de la búsqueda.
+
+        Returns:
+            list: Las coincidencias de la respuesta.
+        """
+        self.coincidencias = respuesta.coincidencias
+        self.texto_sugerido = respuesta.texto_sugerido
+        self.hay_mas = respuesta.hay_mas
+        if respuesta.widget is not None and respuesta.pila is not None:
+            with self._cerrojo_indice:
+                if respuesta.pila:
+                    self._busquedas_previas[respuesta.widget] = respuesta.pila
+                else:
+                    self._busquedas_previas.pop(respuesta.widget, None)
+        return respuesta.coincidencias
+
+    def resolver_busqueda(self, texto, modo_busqueda=None, max_resultados=None, widget=None, desplazamiento=0):
+        """
+        Calcula el resultado de busca_cadena sin modificar el buscador, de modo que puede
+        llamarse desde un hilo de trabajo. Los argumentos son los de busca_cadena.
+
+        Returns:
+            RespuestaBusqueda: Resultado de la búsqueda.
+        """
+        if not texto:
+            return RespuestaBusqueda(widget=widget, pila=[])
+
+        modo = modo_busqueda or self.modo_busqueda
+        texto_busqueda = self._normalizar_texto(texto)
+
+        # Las fuentes externas (FuenteDatos o funciones) resuelven la búsqueda por sí mismas
+        fuente = self.fuente_externa()
+        if fuente is not None:
+            return self._buscar_en_fuente(fuente, texto, texto_busqueda, modo, max_resultados, desplazamiento)
+
+        indice = self._obtener_indice()
+        if indice is None:
+            return RespuestaBusqueda(texto_sugerido=self.texto_sugerido, hay_mas=self.hay_mas)
+
+        pila = None
+        if widget is not None:
+            with self._cerrojo_indice:
+                pila = list(self._busquedas_previas.get(widget, ()))
+
+        limite = (max_resultados or self.limite_resultados) if self.limite_resultados else None
+        # La búsqueda acotada incluye las coincidencias que se saltan por el desplazamiento
+        ventana = limite + desplazamiento if limite else None
+        # Para ordenar por relevancia hacen falta todas las coincidencias, no las primeras de la fuente
+        ordenar = self.orden_resultados is not None and modo != "difuso"
+        # El índice no cambia mientras se busca y se leen sus valores (ver IndiceBusqueda.aplicar_cambio)
+        with indice.cerrojo:
+            if pila is not None:
+                busqueda = self._buscar_incremental(indice, pila, texto, texto_busqueda, modo,
+                                                    None if ordenar else ventana)
+            else:
+                busqueda = indice.buscar(texto, texto_busqueda, modo, limite=None if ordenar else ventana)
+            posiciones = busqueda.posiciones
+            columnas = busqueda.columnas
+
+            if ordenar and len(posiciones):
+                busqueda = self._ordenar_busqueda(indice, busqueda, texto_busqueda, limite, max_resultados,
+                                                  desplazamiento)
+                posiciones, columnas = busqueda.posiciones, busqueda.columnas
+                texto_sugerido = indice.valor(posiciones[0])
+            elif busqueda.mejor is not None:
+                texto_sugerido = indice.valor(busqueda.mejor)
+            elif busqueda.mejor_normalizada is not None:
+                texto_sugerido = indice.valor(busqueda.mejor_normalizada)
+            elif len(posiciones):
+                texto_sugerido = indice.valor(posiciones[0])
+            else:
+                texto_sugerido = texto
+
+            # Primero se salta el desplazamiento y después se recorta la página: hay más
+            # coincidencias si el índice descartó alguna o si la página no cabe entera
+            if desplazamiento:
+                posiciones = posiciones[desplazamiento:]
+                columnas = columnas[desplazamiento:] if columnas is not None else None
+            pagina = max_resultados or limite
+            hay_mas = busqueda.hay_mas
+            if pagina and len(posiciones) > pagina:
+                posiciones = posiciones[:pagina]
+                columnas = columnas[:pagina] if columnas is not None else None
+                hay_mas = True
+
+            resultados = indice.materializar(posiciones)
+        if columnas is not None:
+            resultados = [Coincidencia(valor, identificador, columna)
+                          for (valor, identificador), columna in zip(resultados, columnas)]
+        return RespuestaBusqueda(resultados, texto_sugerido, hay_mas, widget, pila)
+
+    def _ordenar_busqueda(self, indice, busqueda, texto_busqueda, limite, max_resultados, desplazamiento):
+        """
+        Aplica orden_resultados a una búsqueda completa y se queda con las coincidencias que se
+        van a devolver (más las saltadas por el desplazamiento).
+
+        Returns:
+            ResultadoBusqueda: Posiciones de mejor a peor, con hay_mas si se descartó alguna.
+        """
+        k = max_resultados or limite
+        k = k + desplazamiento if k else None
+        posiciones = self.orden_resultados.ordenar(indice, busqueda.posiciones, texto_busqueda,
+                                                   self.fuente_datos, k)
+        columnas = None
+        if busqueda.columnas is not None:
+            columna_de = dict(zip(np.asarray(busqueda.posiciones).tolist(), busqueda.columnas))
+            columnas = [columna_de[p] for p in posiciones]
+        return ResultadoBusqueda(posiciones=posiciones, hay_mas=len(posiciones) < len(busqueda.posiciones),
+                                 columnas=columnas)
+
+    def _buscar_en_fuente(self, fuente, texto, texto_busqueda, modo, max_resultados, desplazamiento):
+        """
+        Pide a una FuenteDatos la página de resultados. Se solicita un elemento más del
+        límite para saber si quedan más coincidencias sin tener que contarlas.
+
+        Returns:
+            RespuestaBusqueda: Resultado de la búsqueda.
+        """
+        limite = max_resultados or self.limite_resultados
+        try:
+            resultados = fuente.buscar(texto_busqueda, modo, limite + 1 if limite else None, desplazamiento)
+        except Exception as e:
+            logger.error(f"Error al buscar en la fuente de datos: {e}")
+            resultados = []
+        return self._respuesta_de_fuente(texto, modo, resultados, limite)
+
+    def _respuesta_de_fuente(self, texto, modo, resultados, limite):
+        """Recorta la página devuelta por una FuenteDatos y elige el texto sugerido."""
+        hay_mas = bool(limite) and len(resultados) > limite
+        if hay_mas:
+            resultados = resultados[:limite]
+        # Se sugiere la primera coincidencia sin normalizar acentos; si no hay, la primera devuelta
+        texto_minusculas = texto.lower()
+        coincide = {"inicio": str.startswith, "contenido": str.__contains__, "exacto": str.__eq__}.get(modo)
+        texto_sugerido = next(
+            (str(valor) for valor, _ in resultados if coincide and coincide(str(valor).lower(), texto_minusculas)),
+            str(resultados[0][0]) if resultados else texto)
+        return RespuestaBusqueda(resultados, texto_sugerido, hay_mas)
+
+    def contar_coincidencias(self, texto, modo_busqueda=None):
+        """
+        Devuelve el número total de coincidencias del texto, sin limitar ni materializar resultados
+        cuando la fuente sabe contarlas por sí misma.
+
+        Args:
+            texto (str): Texto a buscar. Vacío cuenta todos los elementos.
+            modo_busqueda (str, optional): Modo de búsqueda. Por defecto, el del buscador.
+
+        Returns:
+            int: Número de coincidencias.
+        """
+        modo = modo_busqueda or self.modo_busqueda
+        texto_busqueda = self._normalizar_texto(texto) if texto else ""
+        fuente = self.fuente_externa()
+        if fuente is not None:
+            try:
+                return fuente.contar(texto_busqueda, modo)
+            except Exception as e:
+                logger.error(f"Error al contar en la fuente de datos: {e}")
+                return 0
+        indice = self._obtener_indice()
+        if indice is None:
+            return 0
+        if not texto:
+            return len(indice)
+        with indice.cerrojo:
+            return len(indice.buscar(texto, texto_busqueda, modo).posiciones)
+
+    def autocompletar_en_widget(self, widget, texto_usuario, tipo_widget="text", coincidencias=None):
+        """
+        Realiza autocompletado visual en el widget (tk.Text, ttk.Combobox o tk.Listbox) usando la lógica de BuscadorCadena.
+
+        Args:
+            widget: El widget de Tkinter sobre el que se realiza el autocompletado.
+            texto_usuario (str): El texto que el usuario ha escrito (buffer).
+            tipo_widget (str): El tipo de widget ("text", "combobox" o "listbox").
+            coincidencias (list, optional): Resultado de una búsqueda ya aplicada al buscador
+                para este mismo texto; si se indica no se vuelve a buscar.
+        """
+        frecuente = self._sugerencia_frecuente(texto_usuario)
+        if frecuente is not None:
+            # Prefijo corto de un valor habitual: se sugiere sin consultar el índice
+            self.texto_sugerido = frecuente
+            coincidencias = [frecuente]
+        elif coincidencias is None:
+            coincidencias = self.busca_cadena(texto_usuario, widget=widget)
+        self._sugerencia_aceptable = bool(coincidencias and self.texto_sugerido)
+        texto_sugerido = self.texto_sugerido if coincidencias and self.texto_sugerido else texto_usuario
+        idx = texto_sugerido.lower().find(texto_usuario.lower())
+        if idx == -1:
+            idx = 0
+        final_pos = idx + len(texto_usuario)
+
+        if tipo_widget == "text":
+            widget.delete("1.0", "end")
+            widget.insert("1.0", texto_sugerido)
+            widget.tag_add("sel", f"1.{idx}", f"1.{final_pos}")
+            widget.mark_set("insert", f"1.{final_pos}")
+        elif tipo_widget == "combobox":
+            widget.delete(0, "end")
+            widget.insert(0, texto_sugerido)
+            widget.selection_range(idx, final_pos)
+            widget.icursor(final_pos)
+        elif tipo_widget == "listbox":
+            # Para listbox, el widget es el Entry de búsqueda
+            widget.delete(0, "end")
+            widget.insert(0, texto_sugerido)
+            widget.selection_range(idx, final_pos)
+            widget.icursor(final_pos)
+            # El Listbox se actualiza desde el método _evento_keyrelease_busqueda de la clase Listbox
+
+    def _sugerencia_frecuente(self, texto):
+        """
+        Devuelve la sugerencia de la caché caliente del historial de uso para un texto corto, o
+        None si no hay historial, el modo no es de prefijo/contenido o ningún valor frecuente
+        está en la fuente actual. El historial puede tener valores que ya no están en la fuente
+        (borrados, o anotados por otro control con la misma clave), así que cada uno se
+        comprueba en el índice antes de sugerirlo.
+        """
+        if self.historial_uso is None or (self.modo_busqueda not in ("inicio", "contenido")):
+            return None
+        return self.historial_uso.sugerir(self.clave_historial, self._normalizar_texto(texto),
+                                          existe=self._existe_en_fuente)
+
+    def _existe_en_fuente(self, valor):
+        """
+        Comprueba con una búsqueda exacta en el índice que el valor está en la fuente actual.
+        Las fuentes sin índice (FuenteDatos, funciones) no se comprueban: devuelve False y la
+        sugerencia sale de la búsqueda normal.
+        """
+        indice = self._obtener_indice()
+        if indice is None:
+            return False
+        with indice.cerrojo:
+            busqueda = indice.buscar(valor, self._normalizar_texto(valor), "exacto")
+            return any(str(indice.valor(posicion)) == valor for posicion in busqueda.posiciones)
+
+    def registrar_seleccion(self, valor):
+        """
+        Anota que el usuario ha elegido el valor en el historial de uso y en los criterios de
+        orden_resultados que aprenden de las selecciones (si están configurados).
+
+        Args:
+            valor (str): Valor elegido.
+        """
+        if not valor:
+            return
+        if self.historial_uso is not None:
+            self.historial_uso.registrar(self.clave_historial, valor)
+        if self.orden_resultados is not None:
+            self.orden_resultados.registrar(valor)
+
+    def on_keypress(self, widget, event, tipo_widget="text"):
+        """
+        Maneja el evento de teclado para cualquier widget con búsqueda/autocompletado.
+        Actualiza el buffer del usuario y realiza el autocompletado según la tecla presionada.
+
+        Args:
+            widget: El widget de Tkinter que recibe el evento.
+            event: El evento de teclado de Tkinter.
+            tipo_widget (str): El tipo de widget ("text", "combobox" o "listbox").
+
+        Returns:
+            "break" si el evento debe ser detenido (para evitar el comportamiento por defecto de Tkinter).
+        """
+        buffer_usuario = self.buffers.get(widget, "")
+
+        if event.keysym == "BackSpace":
+            buffer_usuario = buffer_usuario[:-1]
+            self.buffers[widget] = buffer_usuario
+            self.autocompletar_en_widget(widget, buffer_usuario, tipo_widget)
+            return "break"
+
+        if event.char and event.char.isprintable():
+            buffer_usuario += event.char
+            self.buffers[widget] = buffer_usuario
+            self.autocompletar_en_widget(widget, buffer_usuario, tipo_widget)
+            return "break"
+
+        if event.keysym in ("Return", "Tab"):
+            texto_final = getattr(self, "texto_sugerido", None)
+            if not texto_final:
+                texto_final = buffer_usuario
+            elif self._sugerencia_aceptable:
+                self.registrar_seleccion(texto_final)
+            self._sugerencia_aceptable = False
+            if tipo_widget == "text":
+                widget.delete("1.0", "end")
+                widget.insert("1.0", texto_final)
+                widget.tag_remove("sel", "1.0", "end")
+                widget.mark_set("insert", f"1.{len(texto_final)}")
+            
+            elif tipo_widget == "combobox":
+                widget.delete(0, "end")
+                widget.insert(0, texto_final)
+                widget.selection_clear()
+                widget.icursor(len(texto_final))
+                
+            elif tipo_widget == "entry":
+                # Para entry de búsqueda (como en Listbox)
+                widget.delete(0, "end")
+                widget.insert(0, texto_final)
+                widget.selection_clear()
+                widget.icursor(len(texto_final))
+            self.buffers[widget] = texto_final
+            widget.tk_focusNext().focus_set()
+            return "break"
+
+        if event.keysym in ('Up', 'Down', 'Left', 'Right', 'Escape'):
+            return
+
+    def reset_buffer(self, widget, valor=""):
+        """
+        Permite resetear el buffer de un widget (por ejemplo, al hacer set() desde el control).
+        Es útil para mantener sincronizado el buffer interno con el valor real del widget.
+
+        Args:
+            widget: El widget de Tkinter cuyo buffer se va a resetear.
+            valor (str): El nuevo valor a establecer en el buffer.
+        """
+        self.buffers[widget] = valor
+        self._busquedas_previas.pop(widget, None)
+
+    def _es_dataframe(self, obj):
+        """
+        Determina si el objeto proporcionado es un DataFrame de pandas.
+
+        Args:
+            obj: Objeto a comprobar.
+
+        Returns:
+            bool: True si es un DataFrame, False en caso contrario.
+        """
+        
+        try:
+            import pandas as pd
+            return isinstance(obj, pd.DataFrame)
+        except ImportError:
+            return False
+
+    def _resolver_columnas_dataframe(self, df):
+        """
+        Determina las columnas de identificador y de valor a usar en un DataFrame.
+
+        Args:
+            df: DataFrame de pandas.
+
+        Returns:
+            tuple: (columna_id, columna_valor). columna_id es None si se debe usar el índice.
+        """
+        if self.df_columna_id:
+            id_col = self.df_columna_id
+        else:
+            if 'id' in df.columns:
+                id_col = 'id'
+            elif 'ID' in df.columns:
+                id_col = 'ID'
+            elif 'Id' in df.columns:
+                id_col = 'Id'
+            else:
+                id_col = None
+        if id_col not in df.columns:
+            id_col = None
+        if self.df_columna_valor:
+            valor_col = self.df_columna_valor
+        else:
+            columnas_preferidas = ['nombre', 'descripcion', 'valor', 'texto', 'label', 'etiqueta']
+            valor_col = None
+            for col_pref in columnas_preferidas:
+                if col_pref in df.columns:
+                    valor_col = col_pref
+                    break
+            if valor_col is None:
+                for col in df.columns:
+                    if df[col].dtype == 'object':
+                        valor_col = col
+                        break
+            if valor_col is None:
+                valor_col = df.columns[0]
+        return id_col, valor_col
+
+    def _procesar_dataframe(self, df):
+        """
+        Procesa un DataFrame de pandas para extraer una lista de tuplas (id, valor) para la búsqueda.
+
+        Args:
+            df: DataFrame de pandas.
+
+        Returns:
+            list: Lista de tuplas (id, valor) extraídas del DataFrame.
+        """
+        try:
+            id_col, valor_col = self._resolver_columnas_dataframe(df)
+            valores = df[valor_col].map(str).tolist()
+            if id_col:
+                identificadores = df[id_col].map(str).tolist()
+            else:
+                identificadores = [str(index) for index in df.index]
+            return list(zip(identificadores, valores))
+        except Exception:
+            return []
+
+@dataclass(frozen=True)
+class PlanMascara:
+    """
+    Plan inmutable de una máscara de Textbox, compilado una sola vez por combinación de
+    (mascara, caracteres_fijos, tipo_validacion, caracter_comodin) y compartido por todos
+    los Textbox que la usan. Las rutinas de formateo, validación y cursor lo consultan en
+    lugar de recorrer la máscara carácter a carácter en cada pulsación.
+    """
+    mascara: str
+    caracteres_fijos: str
+    tipo_validacion: str
+    caracter_comodin: str
+    bloques: tuple  # tramos consecutivos de caracteres editables ("DD", "MM", "AAAA"...)
+    anchos: tuple  # longitud de cada bloque
+    separadores: tuple  # caracteres fijos de la máscara, en orden
+    roles: tuple  # papel de cada bloque: "dia", "mes", "anio", "hora", "minuto" o None
+    posiciones_fijas: frozenset  # índices de la máscara con caracteres fijos
+    posiciones_editables: tuple  # índices de la máscara sin caracteres fijos
+    posiciones_comodin: tuple  # índices de la máscara con el carácter comodín
+    primera_editable: int
+    posiciones_formato: tuple  # índices de los bloques en el texto formateado de fecha/hora
+    longitud_formato: int  # longitud del texto formateado de fecha/hora
+    patron_separadores: Any  # expresión regular que separa los bloques del texto formateado
+    indice_dia: Optional[int]
+    indice_mes: Optional[int]
+    indice_anio: Optional[int]
+    separador_decimal: str
+    longitud_entera: int
+    longitud_decimal: int
+    solo_almohadillas: bool  # la máscara está formada solo por "#"
+    plantilla_retroceso: str  # "#" y caracteres fijos de la máscara, para reconstruir tras borrar
+    huecos_retroceso: tuple  # posiciones de los "#" en plantilla_retroceso
+    separador_fecha: str
+    separador_hora: str
+    # Solo en "momento": planes de la fecha y la hora para formatear (con todos los caracteres
+    # fijos) y para validar (con el separador propio de cada parte)
+    plan_fecha: Any = None
+    plan_hora: Any = None
+    validacion_fecha: Any = None
+    validacion_hora: Any = None
+
+def _roles_bloques(bloques, tipo_validacion):
+    """
+    Identifica el papel de cada bloque: en fechas, el año por su longitud y el día y el mes por
+    su letra o, si no la tienen, por su posición (día antes que mes salvo que empiece por M).
+
+    Returns:
+        tuple: (roles, indice_dia, indice_mes, indice_anio).
+    """
+    if tipo_validacion == "hora":
+        roles = tuple(("hora", "minuto")[i] if i < 2 else None for i in range(len(bloques)))
+        return roles, None, None, None
+    idx_anio = idx_mes = idx_dia = None
+    for idx, bloque in enumerate(bloques):
+        if len(bloque) == 4:
+            idx_anio = idx
+        elif len(bloque) == 2:
+            if 'M' in bloque.upper():
+                idx_mes = idx
+            elif 'D' in bloque.upper():
+                idx_dia = idx
+    if None in (idx_anio, idx_mes, idx_dia):
+        for idx, bloque in enumerate(bloques):
+            if len(bloque) == 4:
+                idx_anio = idx
+                break
+        otros_indices = [i for i in range(len(bloques)) if i != idx_anio]
+        if len(otros_indices) == 2:
+            idx_dia, idx_mes = otros_indices
+            if bloques[otros_indices[0]].upper().startswith('M'):
+                idx_mes, idx_dia = otros_indices
+    nombres = {idx_dia: "dia", idx_mes: "mes", idx_anio: "anio"}
+    roles = tuple(nombres.get(i) for i in range(len(bloques)))
+    return roles, idx_dia, idx_mes, idx_anio
+
+@functools.lru_cache(maxsize=256)
+def compilar_mascara(mascara, caracteres_fijos, tipo_validacion, caracter_comodin):
+    """
+    Compila una máscara en su PlanMascara. El resultado se memoriza, de modo que todos los
+    Textbox con la misma máscara comparten el mismo plan.
+
+    Args:
+        mascara (str): Máscara del control.
+        caracteres_fijos (str): Caracteres de la máscara que no son editables.
+        tipo_validacion (str): Tipo de validación del control.
+        caracter_comodin (str): Carácter que marca las posiciones editables.
+
+    Returns:
+        PlanMascara: Plan compilado.
+    """
+    bloques = []
+    separadores = []
+    bloque_actual = ""
+    for char in mascara:
+        if char in caracteres_fijos:
+            if bloque_actual:
+                bloques.append(bloque_actual)
+                bloque_actual = ""
+            separadores.append(char)
+        else:
+            bloque_actual += char
+    if bloque_actual:
+        bloques.append(bloque_actual)
+
+    # Disposición del texto formateado de fecha/hora: cada bloque seguido de su separador
+    posiciones_formato = []
+    longitud_formato = 0
+    for i, bloque in enumerate(bloques):
+        posiciones_formato.extend(range(longitud_formato, longitud_formato + len(bloque)))
+        longitud_formato += len(bloque) + (1 if i < len(separadores) else 0)
+
+    separador_decimal = "." if "." in mascara else ("," if "," in mascara else ".")
+    partes_mascara = mascara.split(separador_decimal)
+    plantilla_retroceso = "".join(c for c in mascara if c == "#" or c in caracteres_fijos)
+
+    separador_fecha, separador_hora = "/", ":"
+    if tipo_validacion == "momento":
+        partes_fijos = caracteres_fijos.split(" ") if caracteres_fijos else []
+        if partes_fijos:
+            separador_fecha = partes_fijos[0]
+        if len(partes_fijos) >= 2:
+            separador_hora = partes_fijos[1]
+    elif tipo_validacion == "fecha":
+        separador_fecha = caracteres_fijos[0] if caracteres_fijos else "/"
+    elif tipo_validacion == "hora":
+        separador_hora = caracteres_fijos[0] if caracteres_fijos else ":"
+
+    subplanes = {}
+    if tipo_validacion == "momento":
+        if " " in mascara:
+            mascara_fecha, mascara_hora = mascara.split(" ", 1)
+        else:
+            mascara_fecha, mascara_hora = mascara, ""
+        subplanes = dict(
+            plan_fecha=compilar_mascara(mascara_fecha, caracteres_fijos, "fecha", caracter_comodin),
+            plan_hora=compilar_mascara(mascara_hora, caracteres_fijos, "hora", caracter_comodin),
+            validacion_fecha=compilar_mascara(mascara_fecha if " " in mascara else "DD/MM/AAAA",
+                                              separador_fecha, "fecha", caracter_comodin),
+            validacion_hora=compilar_mascara(mascara_hora if " " in mascara else "HH:MM",
+                                             separador_hora, "hora", caracter_comodin))
+
+    idx_dia = idx_mes = idx_anio = None
+    if tipo_validacion in ("fecha", "hora"):
+        roles, idx_dia, idx_mes, idx_anio = _roles_bloques(bloques, tipo_validacion)
+    elif subplanes and len(bloques) == len(subplanes["plan_fecha"].bloques) + len(subplanes["plan_hora"].bloques):
+        roles = subplanes["plan_fecha"].roles + subplanes["plan_hora"].roles
+    else:
+        roles = (None,) * len(bloques)
+
+    posiciones_editables = tuple(i for i, c in enumerate(mascara) if c not in caracteres_fijos)
+    return PlanMascara(
+        mascara=mascara,
+        caracteres_fijos=caracteres_fijos,
+        tipo_validacion=tipo_validacion,
+        caracter_comodin=caracter_comodin,
+        bloques=tuple(bloques),
+        anchos=tuple(len(bloque) for bloque in bloques),
+        separadores=tuple(separadores),
+        roles=roles,
+        posiciones_fijas=frozenset(i for i, c in enumerate(mascara) if c in caracteres_fijos),
+        posiciones_editables=posiciones_editables,
+        posiciones_comodin=tuple(i for i, c in enumerate(mascara) if c == caracter_comodin),
+        primera_editable=posiciones_editables[0] if posiciones_editables else len(mascara),
+        posiciones_formato=tuple(posiciones_formato),
+        longitud_formato=longitud_formato,
+        patron_separadores=re.compile('|'.join(map(re.escape, separadores))),
+        indice_dia=idx_dia,
+        indice_mes=idx_mes,
+        indice_anio=idx_anio,
+        separador_decimal=separador_decimal,
+        longitud_entera=partes_mascara[0].count(caracter_comodin),
+        longitud_decimal=partes_mascara[1].count(caracter_comodin) if len(partes_mascara) > 1 else 0,
+        solo_almohadillas="#" in mascara and all(char == "#" for char in mascara),
+        plantilla_retroceso=plantilla_retroceso,
+        huecos_retroceso=tuple(i for i, c in enumerate(plantilla_retroceso) if c == "#"),
+        separador_fecha=separador_fecha,
+        separador_hora=separador_hora,
+        **subplanes
+    )
+
+@dataclass(frozen=True)
+class EstadoRender:
+    """
+    Resultado de renderizar un Textbox: lo que la capa del widget debe mostrar tras una pulsación.
+    """
+    texto_ingresado: str  # texto escrito, normalizado según el tipo (el nuevo buffer del control)
+    texto: str  # texto formateado con la máscara
+    longitud_oscura: int  # caracteres iniciales que se muestran como texto escrito
+    cursor: int  # posición del cursor
+
+def _detectar_caracter_comodin(mascara, caracteres_fijos, caracter_comodin=None):
+    """
+    Determina el carácter comodín de una máscara: el configurado o, si no se indica,
+    el primer carácter de la máscara que no sea fijo ni espacio.
+
+    Args:
+        mascara (str): Máscara del control.
+        caracteres_fijos (str): Caracteres de la máscara que no son editables.
+        caracter_comodin (str, optional): Comodín configurado.
+
+    Returns:
+        str: Carácter comodín (un espacio si la máscara no tiene ninguno).
+    """
+    if caracter_comodin not in (None, "", " "):
+        return caracter_comodin
+    for c in mascara:
+        if c not in caracteres_fijos and c != ' ':
+            return c
+    return ' '
+
+@dataclass(frozen=True)
+class ResultadoMascara:
+    """
+    Resultado de evaluar un texto con un MotorMascara.
+    """
+    texto_ingresado: str  # texto normalizado según el tipo, como lo guarda el Textbox
+    formateado: str  # texto formateado con la máscara
+    valor: Any  # valor interpretado (datetime, time, int, float o str); None si hay error
+    error: Optional[str]  # código de error (ver MotorMascara.ERRORES); None si el dato es válido
+
+class MotorMascara:
+    """
+    Motor sin estado ni widgets que aplica una máscara: formatea, calcula la parte oscura y el
+    cursor, y valida. Textbox delega en él, y permite validar datos importados con las mismas
+    reglas del formulario sin crear controles.
+    """
+    ERRORES = {
+        "vacio": "Valor vacío",
+        "incompleto": "Faltan caracteres para completar la máscara",
+        "mascara": "La máscara no permite identificar día, mes y año",
+        "fecha_invalida": "La fecha no existe",
+        "hora_invalida": "La hora no existe",
+        "numero_invalido": "No es un número",
+        "email_invalido": "No es un email válido",
+        "fuera_de_rango": "Fuera del rango permitido por las restricciones",
+        "longitud": "Más caracteres de los que admite la máscara",
+    }
+    PATRON_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+    def __init__(self, plan, restricciones=None):
+        """
+        Args:
+            plan (PlanMascara): Máscara compilada con compilar_mascara().
+            restricciones (dict, optional): Restricciones normalizadas de ConfiguracionTextbox
+                ("min", "max" o "length").
+        """
+        self.plan = plan
+        self.tipo_validacion = plan.tipo_validacion
+        self.restricciones = restricciones if restricciones is not None else {}
+
+    @classmethod
+    def desde_configuracion(cls, config):
+        """
+        Crea el motor de una ConfiguracionTextbox, con el mismo comodín que usaría el Textbox.
+
+        Args:
+            config (ConfiguracionTextbox): Configuración del campo.
+
+        Returns:
+            MotorMascara: Motor para la configuración.
+        """
+        caracter_comodin = _detectar_caracter_comodin(config.mascara, config.caracteres_fijos,
+                                                     getattr(config, "caracter_comodin", None))
+        plan = compilar_mascara(config.mascara, config.caracteres_fijos, config.tipo_validacion, caracter_comodin)
+        return cls(plan, getattr(config, "restricciones", {}))
+
+    # --- Formateo ---
+
+    @staticmethod
+    def _formatear_bloques(plan, digitos):
+        """Rellena los bloques de una máscara de fecha u hora con los dígitos indicados."""
+        resultado = ""
+        idx = 0
+        for i, bloque in enumerate(plan.bloques):
+            tam = len(bloque)
+            parte_digitos = digitos[idx:idx+tam]
+            if parte_digitos:
+                if tam == 4:  # Año: rellenar izquierda a derecha con la letra de la máscara
+                    parte = parte_digitos.ljust(tam, bloque[0])
+                else:  # Día, mes, hora, minuto: rellenar con ceros a la izquierda
+                    parte = parte_digitos.rjust(tam, "0")
+            else:
+                parte = bloque
+            resultado += parte
+            idx += len(parte_digitos)
+            if i < len(plan.separadores):
+                resultado += plan.separadores[i]
+        return resultado
+
+    @staticmethod
+    def _longitud_oscura_bloques(plan, caracteres):
+        """
+        Longitud de la parte oscura de una máscara por bloques: cada bloque completo con su
+        separador y, del bloque en curso, los caracteres escritos (con ceros de relleno salvo en el año).
+        """
+        longitud = 0
+        idx = 0
+        for i, tam in enumerate(plan.anchos):
+            escritos = len(caracteres[idx:idx+tam])
+            if escritos:
+                # Año: solo los dígitos ingresados; día, mes, hora, minuto: con ceros de relleno
+                longitud += escritos if tam == 4 else tam
+            # Solo avanza al siguiente bloque (y a su separador) si el bloque actual está completo
+            if escritos != tam:
+                break
+            idx += tam
+            if i < len(plan.separadores):
+                longitud += 1
+        return longitud
+
+    @staticmethod
+    def _cursor_bloques(plan, numero_digitos):
+        """Posición del cursor en una máscara de fecha u hora: el primer hueco sin dígito."""
+        if numero_digitos < len(plan.posiciones_formato):
+            return plan.posiciones_formato[numero_digitos]
+        return plan.longitud_formato
+
+    @staticmethod
+    def _rellenar_comodines(plan, caracteres):
+        """Coloca los caracteres en las posiciones del comodín; el resto de la máscara se mantiene."""
+        resultado = list(plan.mascara)
+        for posicion, caracter in zip(plan.posiciones_comodin, caracteres):
+            resultado[posicion] = caracter
+        return "".join(resultado)
+
+    def renderizar(self, texto):
+        """
+        Calcula en un solo paso lo que debe mostrar un control para el texto escrito: el texto
+        formateado, la longitud de la parte oscura y la posición del cursor. Los dígitos se
+        extraen una sola vez.
+
+        Args:
+            texto (str): Texto escrito por el usuario.
+
+        Returns:
+            EstadoRender: Estado que la capa del widget aplica al tk.Text.
+        """
+        plan = self.plan
+
+        # --- TV FECHA y TV HORA ---
+        if self.tipo_validacion in ("fecha", "hora"):
+            digitos = ''.join(c for c in texto if c.isdigit())
+            caracteres = ''.join(c for c in texto if c.isalnum())
+            return EstadoRender(
+                texto_ingresado=texto,
+                texto=self._formatear_bloques(plan, digitos),
+                longitud_oscura=self._longitud_oscura_bloques(plan, caracteres) if texto else 0,
+                cursor=self._cursor_bloques(plan, len(digitos)))
+
+        # --- TV MOMENTO ---
+        if self.tipo_validacion == "momento":
+            partes = texto.split(" ", 1)
+            fecha_txt = partes[0]
+            hora_txt = partes[1] if len(partes) > 1 else ""
+            digitos_fecha = ''.join(c for c in fecha_txt if c.isdigit())
+            digitos_hora = ''.join(c for c in hora_txt if c.isdigit())
+            fecha_formateada = self._formatear_bloques(plan.plan_fecha, digitos_fecha)
+            hora_formateada = self._formatear_bloques(plan.plan_hora, digitos_hora)
+            resultado = f"{fecha_formateada} {hora_formateada}".strip()
+
+            # La parte oscura de cada parte se mide sobre los bloques de la máscara completa
+            if not texto:
+                longitud_oscura = 0
+            elif " " not in texto:
+                longitud_oscura = self._longitud_oscura_bloques(plan, ''.join(c for c in texto if c.isalnum()))
+            else:
+                partes_oscuras = texto.split(" ")
+                oscura_fecha = self._longitud_oscura_bloques(plan, ''.join(c for c in partes_oscuras[0] if c.isalnum()))
+                oscura_hora = self._longitud_oscura_bloques(plan, ''.join(c for c in partes_oscuras[1] if c.isalnum()))
+                longitud_oscura = oscura_fecha + (1 if oscura_hora else 0) + oscura_hora
+            # Lo escrito de más (bloques desbordados) no amplía la parte oscura más allá del texto
+            longitud_oscura = min(longitud_oscura, len(resultado))
+
+            if " " not in resultado:
+                cursor = self._cursor_bloques(plan.plan_fecha, len(digitos_fecha) + len(digitos_hora))
+            elif texto.strip().endswith(" ") or hora_txt:
+                cursor = len(resultado.split(" ", 1)[0]) + 1 + self._cursor_bloques(plan.plan_hora, len(digitos_hora))
+            else:
+                cursor = self._cursor_bloques(plan.plan_fecha, len(digitos_fecha))
+            return EstadoRender(texto_ingresado=texto, texto=resultado, longitud_oscura=longitud_oscura,
+                                cursor=cursor)
+
+        # --- TV FLOAT ---
+        if self.tipo_validacion == "float":
+            separador_mascara = plan.separador_decimal
+            longitud_entera = plan.longitud_entera
+            longitud_decimal = plan.longitud_decimal
+
+            texto_normalizado = texto.replace(",", ".")
+
+            # Determinar si estamos en modo decimal por la presencia del separador
+            modo_decimal = "." in texto_normalizado
+            digitos = ''.join(c for c in texto_normalizado if c.isdigit())
+
+            # Parte entera
+            if modo_decimal:
+                parte_entera_txt, parte_decimal_txt = texto_normalizado.split(".", 1)
+                digitos_entera = ''.join(c for c in parte_entera_txt if c.isdigit())[:longitud_entera]
+            else:
+                digitos_entera = digitos[:longitud_entera]
+            parte_entera = digitos_entera.rjust(longitud_entera, "0")
+
+            # Parte decimal
+            if modo_decimal:
+                decimales = ''.join(c for c in parte_decimal_txt if c.isdigit())
+            else:
+                decimales = digitos[longitud_entera:]
+
+            if len(decimales) == 0:
+                parte_decimal = "0" * longitud_decimal
+                buffer_decimal = ""
+            else:
+                # Mantener todos los decimales que quepan en la máscara
+                if len(decimales) <= longitud_decimal:
+                    parte_decimal = decimales.ljust(longitud_decimal, "0")
+                    buffer_decimal = decimales
+                else:
+                    # Si hay más decimales que los permitidos, mantener todos menos el último que se reemplaza
+                    parte_decimal = decimales[:longitud_decimal-1] + decimales[-1]
+                    buffer_decimal = parte_decimal
+
+            # Siempre incluir el separador y la parte decimal si la máscara lo requiere
+            resultado = parte_entera + separador_mascara + parte_decimal
+
+            # Buffer: mantener el separador si estamos en modo decimal. La parte oscura es la
+            # parte entera, el separador si se escribió y la parte decimal si tiene dígitos, y
+            # el cursor queda tras el último decimal escrito (o antes del separador).
+            if modo_decimal:
+                texto_ingresado = digitos_entera + separador_mascara + buffer_decimal
+                longitud_oscura = len(parte_entera) + 1 + (max(longitud_decimal, len(buffer_decimal)) if buffer_decimal else 0)
+                cursor = len(parte_entera) + 1 + len(buffer_decimal)
+            else:
+                texto_ingresado = digitos_entera + buffer_decimal
+                longitud_oscura = len(parte_entera) if texto_ingresado else 0
+                cursor = len(parte_entera)
+            return EstadoRender(texto_ingresado=texto_ingresado, texto=resultado,
+                                longitud_oscura=longitud_oscura, cursor=cursor)
+
+        # --- TV INT ---
+        if self.tipo_validacion == "int":
+            longitud = len(plan.posiciones_comodin)
+            digitos = ''.join(c for c in texto if c.isdigit())
+            if len(digitos) > longitud:
+                # Mantener los primeros (N-1) y el último
+                digitos = digitos[:longitud-1] + digitos[-1]
+            resultado = digitos.rjust(longitud, '0')
+            return EstadoRender(texto_ingresado=digitos, texto=resultado,
+                                longitud_oscura=len(resultado) if digitos else 0, cursor=len(resultado))
+
+        # --- TV STR con máscara de comodín (CP, teléfono, etc) ---
+        if self.tipo_validacion == "str" and plan.posiciones_comodin:
+            longitud = len(plan.posiciones_comodin)
+            caracteres = ''.join(c for c in texto if c.isalnum())
+            if len(caracteres) > longitud:
+                # Mantener los primeros (N-1) y el último
+                caracteres = caracteres[:longitud-1] + caracteres[-1]
+            # La parte oscura y el cursor llegan hasta el primer comodín sin rellenar
+            corte = plan.posiciones_comodin[len(caracteres)] if len(caracteres) < longitud else len(plan.mascara)
+            return EstadoRender(texto_ingresado=caracteres, texto=self._rellenar_comodines(plan, caracteres),
+                                longitud_oscura=corte if caracteres else 0, cursor=corte)
+
+        # --- TV EMAIL ---
+        if self.tipo_validacion == "email":
+            # Eliminar espacios al inicio y final, convertir a minúsculas y eliminar espacios en medio
+            texto = texto.strip().lower().replace(" ", "")
+
+        # --- TV STR sin máscara, TV EMAIL y por defecto ---
+        return EstadoRender(texto_ingresado=texto, texto=texto, longitud_oscura=len(texto), cursor=len(texto))
+
+    def formatear(self, texto):
+        """Devuelve el texto formateado según la máscara."""
+        return self.renderizar(texto).texto
+
+    def aplicar_separador(self, texto, tipo_separador, digitos=None):
+        """
+        Inserta en el texto escrito el separador que corresponde tras una pulsación.
+
+        Args:
+            texto (str): Texto escrito hasta el momento.
+            tipo_separador (str): 'fecha_auto', 'fecha_manual' o 'hora_manual'.
+            digitos (str, optional): Dígitos del texto escrito. Necesario para 'fecha_auto'.
+
+        Returns:
+            str: El texto escrito con el separador aplicado.
+        """
+        plan = self.plan
+        separador_momento = " "
+        # Determinar el separador correcto según el contexto
+        if tipo_separador.startswith('fecha'):
+            sep = plan.separador_fecha
+        elif tipo_separador.startswith('hora'):
+            sep = plan.separador_hora
+        else:
+            sep = ""
+
+        if tipo_separador == 'fecha_auto' and digitos:
+            # Manejo automático de separadores para fechas
+            if self.tipo_validacion == "fecha":
+                if len(digitos) == 2 and texto.count(sep) == 0:
+                    texto += sep
+                elif len(digitos) == 4 and texto.count(sep) == 1:
+                    texto += sep
+            elif self.tipo_validacion == "momento":
+                if separador_momento not in texto:
+                    # Estamos en la parte de fecha del momento
+                    if len(digitos) == 2 and texto.count(plan.separador_fecha) == 0:
+                        texto += plan.separador_fecha
+                    elif len(digitos) == 4 and texto.count(plan.separador_fecha) == 1:
+                        texto += plan.separador_fecha
+                    elif len(digitos) == 8 and texto.count(plan.separador_fecha) == 2:
+                        texto += separador_momento  # Espacio entre fecha y hora
+                else:
+                    # Estamos en la parte de hora del momento
+                    partes = texto.split(separador_momento)
+                    parte_hora = partes[1] if len(partes) > 1 else ""
+                    digitos_hora = ''.join(c for c in parte_hora if c.isdigit())
+                    if len(digitos_hora) == 2 and plan.separador_hora not in parte_hora:
+                        texto += plan.separador_hora
+
+        elif tipo_separador == 'fecha_manual':
+            # Manejo manual de separadores para fechas
+            if self.tipo_validacion == "fecha":
+                partes = texto.split(sep)
+                bloque_actual = partes[-1]
+                # Si el bloque actual tiene un solo dígito, rellenarlo con cero
+                if len(bloque_actual) == 1 and bloque_actual.isdigit():
+                    partes[-1] = "0" + bloque_actual
+                    texto = sep.join(partes) + sep
+                else:
+                    texto += sep
+            elif self.tipo_validacion == "momento":
+                partes = texto.split(plan.separador_fecha)
+                bloque_actual = partes[-1]
+                if len(bloque_actual) == 1 and bloque_actual.isdigit():
+                    partes[-1] = "0" + bloque_actual
+                    texto = plan.separador_fecha.join(partes) + plan.separador_fecha
+                else:
+                    texto += plan.separador_fecha
+
+        elif tipo_separador == 'hora_manual':
+            # Manejo manual de separadores para horas
+            if self.tipo_validacion == "momento":
+                partes = texto.split(separador_momento)
+                parte_hora = partes[1] if len(partes) > 1 else ""
+                # Si la parte de hora tiene un solo dígito, rellenarla con cero
+                if len(parte_hora) == 1 and parte_hora.isdigit():
+                    partes[1] = "0" + parte_hora
+                    texto = separador_momento.join(partes) + plan.separador_hora
+                else:
+                    texto += plan.separador_hora
+            else:
+                # Para el tipo hora
+                if len(texto) == 1 and texto.isdigit():
+                    texto = "0" + texto + sep
+                else:
+                    texto += sep
+        return texto
+
+    @staticmethod
+    def aplicar_separador_miles(texto, separador):
+        """
+        Aplica el separador de miles al texto formateado.
+        """
+        partes = texto.split(separador)
+        parte_entera = partes[0]
+        parte_decimal = partes[1] if len(partes) > 1 else ""
+
+        # Aplicar separador de miles a la parte entera
+        parte_entera_con_separadores = ""
+        for i, char in enumerate(reversed(parte_entera)):
+            if i > 0 and i % 3 == 0:
+                parte_entera_con_separadores = separador + parte_entera_con_separadores
+            parte_entera_con_separadores = char + parte_entera_con_separadores
+
+        # Reconstruir el texto con los separadores de miles
+        if parte_decimal:
+            return f"{parte_entera_con_separadores}{separador}{parte_decimal}"
+        else:
+            return parte_entera_con_separadores
+
+    # --- Validación ---
+
+    def _validar_fecha(self, plan, texto):
+        """
+        Valida una fecha escrita según un plan de máscara de fecha.
+
+        Returns:
+            tuple: (texto formateado, datetime o None, código de error o None).
+        """
+        texto_formateado = self._formatear_bloques(plan, ''.join(c for c in texto if c.isdigit()))
+        valores = [v for v in plan.patron_separadores.split(texto_formateado) if v]
+
+        idx_anio, idx_mes, idx_dia = plan.indice_anio, plan.indice_mes, plan.indice_dia
+        if None in (idx_anio, idx_mes, idx_dia):
+            return texto_formateado, None, "mascara"
+        try:
+            anio = valores[idx_anio]
+            mes = valores[idx_mes]
+            dia = valores[idx_dia]
+        except IndexError:
+            return texto_formateado, None, "incompleto"
+
+        if not (dia.isdigit() and len(dia) == 2 and mes.isdigit() and len(mes) == 2
+                and anio.isdigit() and len(anio) == 4):
+            return texto_formateado, None, "incompleto"
+
+        try:
+            fecha_obj = datetime(int(anio), int(mes), int(dia))
+        except ValueError:
+            return texto_formateado, None, "fecha_invalida"
+
+        # Validar restricciones de rango si existen
+        fecha_iso = fecha_obj.strftime("%Y-%m-%d")
+        min_fecha = self.restricciones.get("min")
+        max_fecha = self.restricciones.get("max")
+        if (min_fecha and fecha_iso < min_fecha) or (max_fecha and fecha_iso > max_fecha):
+            return texto_formateado, None, "fuera_de_rango"
+        return texto_formateado, fecha_obj, None
+
+    def _validar_hora(self, plan, texto):
+        """
+        Valida una hora escrita según un plan de máscara de hora.
+
+        Returns:
+            tuple: (texto formateado, time o None, código de error o None).
+        """
+        texto_formateado = self._formatear_bloques(plan, ''.join(c for c in texto if c.isdigit()))
+        valores = [v for v in plan.patron_separadores.split(texto_formateado) if v]
+        if len(valores) != 2:
+            return texto_formateado, None, "incompleto"
+        hora, minuto = valores
+        if not (hora.isdigit() and minuto.isdigit()):
+            return texto_formateado, None, "incompleto"
+        if 0 <= int(hora) <= 23 and 0 <= int(minuto) <= 59:
+            return texto_formateado, time(int(hora), int(minuto)), None
+        return texto_formateado, None, "hora_invalida"
+
+    def _en_rango(self, valor):
+        """Comprueba un valor numérico contra los límites "min" y "max" de las restricciones."""
+        min_valor = self.restricciones.get("min", float("-inf"))
+        max_valor = self.restricciones.get("max", float("inf"))
+        return min_valor <= valor <= max_valor
+
+    @staticmethod
+    def _completar_grupos(plan, texto):
+        """Rellena con ceros los grupos de dígitos de cada bloque de una máscara de fecha u hora."""
+        grupos = re.findall(r"\d+", texto)
+        if len(grupos) < 2 or len(grupos) != len(plan.anchos):
+            return texto
+        return "".join(grupo if tam == 4 else grupo.rjust(tam, "0") for grupo, tam in zip(grupos, plan.anchos))
+
+    def _completar_bloques(self, texto):
+        """
+        Completa los bloques escritos a medias entre separadores ("1/1/2020"), como hace el
+        Textbox cuando el usuario teclea el separador antes de llenar el bloque.
+        """
+        if self.tipo_validacion != "momento":
+            return self._completar_grupos(self.plan, texto)
+        partes = texto.strip().split(None, 1)
+        if len(partes) < 2:
+            return texto
+        return (self._completar_grupos(self.plan.plan_fecha, partes[0]) + " "
+                + self._completar_grupos(self.plan.plan_hora, partes[1]))
+
+    def _numero_mal_escrito(self, texto):
+        """
+        Indica si un texto numérico tiene caracteres ajenos. Al teclear, el Textbox los ignora;
+        en una importación ("7.5" en un entero, "12a") son un error del dato.
+        """
+        texto = texto.strip()
+        if self.tipo_validacion == "int":
+            return not texto.lstrip("+").isdigit()
+        texto = texto.lstrip("+").replace(",", ".")
+        return not texto or texto.count(".") > 1 or not texto.replace(".", "").isdigit()
+
+    def _normalizar_numero(self, texto):
+        """Quita el signo "+", los ceros a la izquierda de la parte entera y los de la derecha de la decimal."""
+        entera, _, decimal = texto.strip().lstrip("+").replace(",", ".").partition(".")
+        entera = entera.lstrip("0")
+        decimal = decimal.rstrip("0")
+        if self.tipo_validacion == "int":
+            return entera or "0"
+        return entera + ("." + decimal if decimal else "")
+
+    @staticmethod
+    def _excede_bloques(plan, texto):
+        """Un grupo de dígitos más largo que su bloque, o más dígitos de los que caben en la máscara."""
+        grupos = re.findall(r"\d+", texto)
+        if len(grupos) >= 2 and len(grupos) == len(plan.anchos):
+            return any(len(grupo) > tam for grupo, tam in zip(grupos, plan.anchos))
+        return sum(map(len, grupos)) > sum(plan.anchos)
+
+    def _anio_incompleto(self, texto):
+        """
+        Indica si una fecha escrita por grupos trae el año con menos de 4 dígitos ("5/3/24"): al
+        teclear, sus dígitos pasarían a los bloques siguientes.
+        """
+        tipo = self.tipo_validacion
+        if tipo == "momento":
+            plan = self.plan.plan_fecha
+            texto = (texto.strip().split(None, 1) + [""])[0]
+        elif tipo == "fecha":
+            plan = self.plan
+        else:
+            return False
+        grupos = re.findall(r"\d+", texto)
+        if len(grupos) < 2 or len(grupos) != len(plan.anchos):
+            return False
+        return any(tam == 4 and len(grupo) < 4 for grupo, tam in zip(grupos, plan.anchos))
+
+    def _desborda(self, texto):
+        """
+        Indica si el texto tiene más caracteres de los que admite la máscara. Al teclear, el
+        Textbox descarta o sustituye el exceso; en una importación es un error del dato.
+        Los números se esperan ya normalizados con _normalizar_numero().
+        """
+        plan = self.plan
+        if self.tipo_validacion in ("fecha", "hora"):
+            return self._excede_bloques(plan, texto)
+        if self.tipo_validacion == "momento":
+            partes = (texto.strip().split(None, 1) + ["", ""])[:2]
+            return self._excede_bloques(plan.plan_fecha, partes[0]) or self._excede_bloques(plan.plan_hora, partes[1])
+        if self.tipo_validacion == "int":
+            return len(texto) > len(plan.posiciones_comodin)
+        if self.tipo_validacion == "float":
+            entera, _, decimal = texto.partition(".")
+            return len(entera) > plan.longitud_entera or len(decimal) > plan.longitud_decimal
+        if self.tipo_validacion == "str" and plan.posiciones_comodin:
+            return sum(c.isalnum() for c in texto) > len(plan.posiciones_comodin)
+        return False
+
+    def evaluar(self, texto, estricto=False):
+        """
+        Formatea y valida un texto escrito con las mismas reglas que el Textbox.
+
+        Args:
+            texto (str): Texto tal como lo escribiría el usuario.
+            estricto (bool): Si es True, los bloques de fecha y hora escritos a medias entre
+                separadores se completan con ceros, los números se leen como tales (sin ceros de
+                relleno), y además son errores los números con caracteres ajenos
+                ("numero_invalido"), el texto que no cabe en la máscara ("longitud") y las
+                máscaras de comodín rellenadas a medias ("incompleto").
+
+        Returns:
+            ResultadoMascara: Texto normalizado, formateado, valor interpretado y código de error.
+        """
+        plan = self.plan
+        tipo = self.tipo_validacion
+        escrito = texto
+        if estricto and tipo in ("fecha", "hora", "momento"):
+            texto = self._completar_bloques(texto.strip())
+        mal_escrito = estricto and tipo in ("float", "int") and self._numero_mal_escrito(texto)
+        if estricto and tipo in ("float", "int") and not mal_escrito:
+            texto = self._normalizar_numero(texto)
+        estado = self.renderizar(texto)
+        formateado = estado.texto
+        valor = None
+        error = None
+
+        if tipo == "fecha":
+            formateado, valor, error = self._validar_fecha(plan, texto)
+        elif tipo == "hora":
+            formateado, valor, error = self._validar_hora(plan, texto)
+        elif tipo == "momento":
+            partes = formateado.split(" ", 1)
+            if len(partes) != 2:
+                error = "incompleto"
+            else:
+                # Cada parte se valida con su propia máscara y su separador
+                _, fecha, error = self._validar_fecha(plan.validacion_fecha, partes[0])
+                if error is None:
+                    _, hora, error = self._validar_hora(plan.validacion_hora, partes[1])
+                if error is None:
+                    valor = datetime.combine(fecha, hora)
+        elif tipo in ("float", "int"):
+            if mal_escrito:
+                error = "numero_invalido"
+            try:
+                valor = float(formateado.replace(",", ".")) if tipo == "float" else int(formateado)
+            except ValueError:
+                error = "numero_invalido"
+            if error:
+                valor = None
+            elif not self._en_rango(valor):
+                valor, error = None, "fuera_de_rango"
+        elif tipo == "str" and plan.posiciones_comodin:
+            # El texto formateado siempre tiene todas las posiciones editables de la máscara
+            valor = formateado
+            if estricto and 0 < len(estado.texto_ingresado) < len(plan.posiciones_comodin):
+                valor, error = None, "incompleto"
+        elif tipo == "str" and plan.solo_almohadillas:
+            if formateado.isalnum() and len(formateado) == len(plan.mascara):
+                valor = formateado
+            else:
+                error = "incompleto"
+        elif tipo == "str":
+            if len(formateado) <= self.restricciones.get('length', float('inf')):
+                valor = formateado
+            else:
+                error = "longitud"
+        elif tipo == "email":
+            if self.PATRON_EMAIL.match(formateado):
+                valor = formateado
+            else:
+                error = "email_invalido"
+        else:
+            valor = formateado
+
+        if estricto and self._anio_incompleto(escrito):
+            valor, error = None, "incompleto"
+        # El texto que no cabe en la máscara es el primer error, salvo en números mal escritos
+        if estricto and error != "numero_invalido" and self._desborda(texto if tipo in ("float", "int") else escrito):
+            valor, error = None, "longitud"
+        return ResultadoMascara(texto_ingresado=estado.texto_ingresado, formateado=formateado,
+                                valor=valor, error=error)
+
+    def validar(self, texto):
+        """
+        Valida un texto como lo hace Textbox.validar_dato().
+
+        Returns:
+            Any: El valor (int o float) o el texto formateado si es válido; False en caso contrario.
+        """
+        resultado = self.evaluar(texto)
+        if resultado.error:
+            return False
+        return resultado.valor if self.tipo_validacion in ("float", "int") else resultado.formateado
+
+    # --- Lotes ---
+
+    def _como_texto(self, valor):
+        """Convierte un valor importado en el texto que escribiría el usuario."""
+        if isinstance(valor, str):
+            return valor
+        if isinstance(valor, (float, np.floating)) and float(valor).is_integer():
+            return str(int(valor))
+        if isinstance(valor, (float, np.floating)) and np.isfinite(valor):
+            valor = float(valor)
+            if self.tipo_validacion == "float":
+                # Como en ValidadorDataFrame, el error de representación por debajo del último
+                # decimal de la máscara no cuenta como decimal escrito
+                escala = 10.0 ** self.plan.longitud_decimal
+                if abs(valor * escala - round(valor * escala)) <= 1e-6:
+                    valor = round(valor * escala) / escala
+            # Sin notación científica, que no se podría escribir en el control (1e-05 -> 0.00001)
+            return np.format_float_positional(valor, trim="-")
+        if isinstance(valor, (datetime, date, time)):
+            # Fechas y horas ya interpretadas: sus dígitos en el orden de los bloques de la máscara
+            formatos = {"dia": "%d", "mes": "%m", "anio": "%Y"}
+            plan_fecha = self.plan.plan_fecha if self.tipo_validacion == "momento" else self.plan
+            formato = "".join(formatos.get(rol, "") for rol in plan_fecha.roles)
+            if self.tipo_validacion == "hora":
+                formato = "%H%M"
+            elif self.tipo_validacion == "momento":
+                formato += " %H%M"
+            return valor.strftime(formato)
+        return str(valor)
+
+    def procesar_lote(self, valores, estricto=True):
+        """
+        Formatea y valida una colección de textos sin crear widgets.
+
+        Cada valor distinto se evalúa una sola vez y el resultado se reparte a todas sus filas,
+        de modo que las columnas con valores repetidos (fechas, códigos) se procesan en el tiempo
+        de sus valores únicos.
+
+        Args:
+            valores (iterable | pd.Series): Textos tal como se escribirían en el control. Los
+                valores nulos (None, NaN) se marcan con el error "vacio".
+            estricto (bool): Ver evaluar(). Por defecto True, adecuado para importaciones.
+
+        Returns:
+            pd.DataFrame: Con el índice de la Serie de entrada y las columnas "formateado",
+                "valor" (datetime64 en fecha y momento, Int64 en int, float64 en float) y
+                "error" (código de MotorMascara.ERRORES, nulo si el dato es válido).
+        """
+        serie = valores if isinstance(valores, pd.Series) else pd.Series(list(valores), dtype=object)
+        codigos, unicos = pd.factorize(serie)
+        resultados = [self.evaluar(self._como_texto(valor), estricto) for valor in unicos]
+
+        # El código -1 de los nulos selecciona la última posición, reservada para ellos
+        formateados = np.array([r.formateado for r in resultados] + [None], dtype=object)
+        valores_interpretados = np.array([r.valor for r in resultados] + [None], dtype=object)
+        errores = np.array([r.error for r in resultados] + ["vacio"], dtype=object)
+
+        resultado = pd.DataFrame({
+            "formateado": formateados[codigos],
+            "valor": valores_interpretados[codigos],
+            "error": errores[codigos],
+        }, index=serie.index)
+        if self.tipo_validacion in ("fecha", "momento"):
+            resultado["valor"] = pd.to_datetime(resultado["valor"])
+        elif self.tipo_validacion == "int":
+            resultado["valor"] = resultado["valor"].astype("Int64")
+        elif self.tipo_validacion == "float":
+            resultado["valor"] = resultado["valor"].astype("float64")
+        return resultado
+
+def procesar_lote(valores, config):
+    """
+    Formatea y valida textos importados con las reglas de una ConfiguracionTextbox.
+
+    Args:
+        valores (iterable | pd.Series): Textos a validar.
+        config (ConfiguracionTextbox): Configuración del campo.
+
+    Returns:
+        pd.DataFrame: Columnas "formateado", "valor" y "error" (ver MotorMascara.procesar_lote).
+    """
+    return MotorMascara.desde_configuracion(config).procesar_lote(valores)
+
+@functools.lru_cache(maxsize=256)
+def _patrones_bloques(plan, formatos):
+    """
+    Patrones para validar en bloque una máscara de fecha u hora: el texto se normaliza con
+    un guion entre grupos de dígitos, o se toma como dígitos seguidos.
+
+    Args:
+        plan (PlanMascara): Plan de la máscara.
+        formatos (tuple): Directiva strftime de cada bloque (en el orden de la máscara).
+
+    Returns:
+        tuple: (patrón exacto, patrón con bloques cortos, formato con guiones, formato compacto).
+    """
+    exacto = "-".join(r"\d{4}" if tam == 4 else rf"\d{{1,{tam}}}" for tam in plan.anchos)
+    corto = "-".join(rf"\d{{1,{tam}}}" for tam in plan.anchos)
+    return re.compile(exacto), re.compile(corto), "-".join(formatos), "".join(formatos)
 
-        if event.keysym in ('Up', 'Down', 'Left', 'Right', 'Escape'):
-            return
+@dataclass(frozen=True, eq=False)
+class ResultadoValidacion:
+    """
+    Resultado de validar un DataFrame con ValidadorDataFrame. Ambos DataFrames tienen el índice
+    del DataFrame validado y una columna por campo.
+    """
+    validos: pd.DataFrame  # True donde el valor del campo es válido
+    errores: pd.DataFrame  # código de error (ver MotorMascara.ERRORES), nulo donde el valor es válido
 
-    def reset_buffer(self, widget, valor=""):
-        """
-        Permite resetear el buffer de un widget (por ejemplo, al hacer set() desde el control).
-        Es útil para mantener sincronizado el buffer interno con el valor real del widget.
+    @property
+    def filas_validas(self):
+        """Serie booleana: True en las filas con todos sus campos válidos."""
+        return self.validos.all(axis=1)
+
+class ValidadorDataFrame:
+    """
+    Valida columnas de un DataFrame con las reglas de sus ConfiguracionTextbox usando operaciones
+    vectorizadas de pandas (pd.to_datetime con formato explícito, conversión numérica y expresiones
+    regulares compiladas) en lugar de evaluar fila a fila. Da el mismo veredicto que
+    MotorMascara.procesar_lote, con sus códigos de error.
+
+    Cada columna se valida sobre sus valores distintos y el resultado se reparte a las filas.
+    """
+    PATRON_ENTERO = re.compile(r"\s*\+*(\d+)\s*")
+    PATRON_DECIMAL = re.compile(r"\s*\+*(?=[.,]?\d)(\d*)[.,]?(\d*)\s*")
+    PATRON_ALFANUMERICO = re.compile(r"[^\W_]")
 
+    def __init__(self, configuraciones):
+        """
         Args:
-            widget: El widget de Tkinter cuyo buffer se va a resetear.
-            valor (str): El nuevo valor a establecer en el buffer.
+            configuraciones (dict): Nombre de columna -> ConfiguracionTextbox del campo.
         """
-        self.buffers[widget] = valor
+        self.motores = {columna: MotorMascara.desde_configuracion(config)
+                        for columna, config in configuraciones.items()}
 
-    def _es_dataframe(self, obj):
+    def validar(self, df):
         """
-        Determina si el objeto proporcionado es un DataFrame de pandas.
+        Valida las columnas configuradas del DataFrame.
 
         Args:
-            obj: Objeto a comprobar.
+            df (pd.DataFrame): Datos a validar (por ejemplo, un CSV importado).
 
         Returns:
-            bool: True si es un DataFrame, False en caso contrario.
-        """
-        
-        try:
-            import pandas as pd
-            return isinstance(obj, pd.DataFrame)
-        except ImportError:
-            return False
+            ResultadoValidacion: Máscara booleana y código de error por campo.
+        """
+        faltan = [columna for columna in self.motores if columna not in df.columns]
+        if faltan:
+            raise ValueError(f"Columnas no encontradas en el DataFrame: {faltan}")
+        errores = pd.DataFrame({columna: self._errores_columna(df[columna], motor)
+                                for columna, motor in self.motores.items()}, index=df.index)
+        return ResultadoValidacion(validos=errores.isna(), errores=errores)
+
+    def _errores_columna(self, serie, motor):
+        """Código de error de cada valor de una columna (nulo si es válido)."""
+        codigos, unicos = pd.factorize(serie)
+        errores = self._errores_valores(pd.Series(unicos), motor)
+        # El código -1 de los nulos selecciona la última posición, reservada para ellos
+        errores = np.append(errores.to_numpy(dtype=object), "vacio")
+        return pd.Series(errores[codigos], index=serie.index, dtype=object)
+
+    def _errores_valores(self, valores, motor):
+        """Código de error de cada valor (no nulo) de una Serie."""
+        errores = pd.Series(None, index=valores.index, dtype=object)
+
+        def marcar(condicion, codigo):
+            # Cada valor conserva el primer error encontrado
+            errores[condicion.fillna(False).astype(bool) & errores.isna()] = codigo
+
+        tipo = motor.tipo_validacion
+        if tipo in ("int", "float") and pd.api.types.is_numeric_dtype(valores):
+            self._errores_numero(valores.astype("float64"), motor, marcar)
+            return errores
+        if tipo in ("fecha", "momento") and pd.api.types.is_datetime64_any_dtype(valores):
+            self._errores_rango_fecha(valores, motor, marcar)
+            return errores
+
+        texto = valores.astype("string")
+        if tipo in ("fecha", "hora"):
+            marcar(self._excede_bloques(texto, motor.plan), "longitud")
+            self._errores_bloques(texto, motor.plan, motor, marcar)
+        elif tipo == "momento":
+            partes = texto.str.strip().str.split(n=1, expand=True).reindex(columns=[0, 1])
+            fecha, hora = partes[0].astype("string"), partes[1].astype("string")
+            marcar(self._excede_bloques(fecha, motor.plan.plan_fecha), "longitud")
+            marcar(self._excede_bloques(hora, motor.plan.plan_hora), "longitud")
+            if " " not in motor.plan.mascara:
+                # Máscara de momento sin parte de hora: nunca se completa
+                marcar(texto.notna(), "incompleto")
+            # Sin hora, los bloques de la fecha se llenan con sus dígitos seguidos, como al teclear
+            fecha = fecha.where(hora.notna(), fecha.str.replace(r"\D+", "", regex=True))
+            self._errores_bloques(fecha, motor.plan.plan_fecha, motor, marcar)
+            marcar(hora.isna(), "incompleto")
+            self._errores_bloques(hora, motor.plan.plan_hora, motor, marcar, tipo="hora")
+        elif tipo in ("int", "float"):
+            self._errores_texto_numero(texto, motor, marcar)
+        elif tipo == "str" and motor.plan.posiciones_comodin:
+            # Como al teclear, solo cuentan los caracteres alfanuméricos
+            escritos = texto.str.count(self.PATRON_ALFANUMERICO)
+            longitud = len(motor.plan.posiciones_comodin)
+            marcar(escritos > longitud, "longitud")
+            marcar((escritos > 0) & (escritos < longitud), "incompleto")
+        elif tipo == "str" and motor.plan.solo_almohadillas:
+            marcar(~texto.str.fullmatch(re.compile(rf"[^\W_]{{{len(motor.plan.mascara)}}}")), "incompleto")
+        elif tipo == "str":
+            marcar(texto.str.len() > motor.restricciones.get("length", float("inf")), "longitud")
+        elif tipo == "email":
+            normalizado = texto.str.strip().str.lower().str.replace(" ", "", regex=False)
+            marcar(~normalizado.str.match(MotorMascara.PATRON_EMAIL), "email_invalido")
+        return errores
 
-    def _procesar_dataframe(self, df):
+    @staticmethod
+    def _grupos_bloques(texto, plan):
         """
-        Procesa un DataFrame de pandas para extraer una lista de tuplas (id, valor) para la búsqueda.
+        Normaliza fechas u horas escritas: grupos de dígitos unidos por guiones, los dígitos
+        seguidos y si el texto trae un grupo por bloque de la máscara.
+        """
+        separado = texto.str.replace(r"\D+", "-", regex=True).str.strip("-")
+        digitos = separado.str.replace("-", "", regex=False)
+        grupos = separado.str.count("-") + (separado.str.len() > 0)
+        return separado, digitos, (grupos == len(plan.anchos)) & (len(plan.anchos) > 1)
 
-        Args:
-            df: DataFrame de pandas.
+    def _excede_bloques(self, texto, plan):
+        """Fechas u horas con un grupo más largo que su bloque o más dígitos que la máscara."""
+        separado, digitos, por_grupos = self._grupos_bloques(texto, plan)
+        _, corto, _, _ = _patrones_bloques(plan, ("",) * len(plan.anchos))
+        return ((por_grupos & ~separado.str.fullmatch(corto))
+                | (~por_grupos & (digitos.str.len() > sum(plan.anchos))))
 
-        Returns:
-            list: Lista de tuplas (id, valor) extraídas del DataFrame.
+    def _errores_bloques(self, texto, plan, motor, marcar, tipo=None):
         """
-        try:
-            if self.df_columna_id:
-                id_col = self.df_columna_id
-            else:
-                if 'id' in df.columns:
-                    id_col = 'id'
-                elif 'ID' in df.columns:
-                    id_col = 'ID'
-                elif 'Id' in df.columns:
-                    id_col = 'Id'
-                else:
-                    id_col = None
-            if self.df_columna_valor:
-                valor_col = self.df_columna_valor
-            else:
-                columnas_preferidas = ['nombre', 'descripcion', 'valor', 'texto', 'label', 'etiqueta']
-                valor_col = None
-                for col_pref in columnas_preferidas:
-                    if col_pref in df.columns:
-                        valor_col = col_pref
-                        break
-                if valor_col is None:
-                    for col in df.columns:
-                        if df[col].dtype == 'object':
-                            valor_col = col
-                            break
-                if valor_col is None:
-                    valor_col = df.columns[0]
-            datos_procesados = []
-            for index, row in df.iterrows():
-                if id_col and id_col in df.columns:
-                    identificador = str(row[id_col])
-                else:
-                    identificador = str(index)
-                valor = str(row[valor_col])
-                datos_procesados.append((identificador, valor))
-            return datos_procesados
-        except Exception:
-            return []
+        Valida una fecha u hora con pd.to_datetime y el formato explícito de su máscara. Los
+        grupos de dígitos separados se completan con ceros; sin separadores, cada bloque toma
+        sus dígitos en orden.
+        """
+        tipo = tipo or plan.tipo_validacion
+        if tipo == "hora":
+            if len(plan.anchos) != 2:
+                marcar(texto.notna(), "incompleto")
+                return
+            formatos = ("%H", "%M")
+        else:
+            directivas = {"dia": "%d", "mes": "%m", "anio": "%Y"}
+            if None in (plan.indice_dia, plan.indice_mes, plan.indice_anio):
+                marcar(texto.notna(), "mascara")
+                return
+            formatos = tuple(directivas.get(rol, "") for rol in plan.roles)
+        exacto, _, formato, formato_compacto = _patrones_bloques(plan, formatos)
+
+        separado, digitos, por_grupos = self._grupos_bloques(texto, plan)
+        capacidad = sum(plan.anchos)
+        ultimo = plan.anchos[-1]
+        # Como al teclear, el último bloque escrito a medias se rellena con ceros (salvo el año)
+        minimo = capacidad if ultimo == 4 else capacidad - ultimo + 1
+        longitud = digitos.str.len()
+        if minimo < capacidad:
+            digitos = digitos.str[:capacidad - ultimo] + digitos.str[capacidad - ultimo:].str.pad(ultimo, fillchar="0")
+        forma_separada = (por_grupos & separado.str.fullmatch(exacto)).fillna(False).astype(bool)
+        forma_compacta = (~por_grupos & (longitud >= minimo) & (longitud <= capacidad)).fillna(False).astype(bool)
+        marcar(~forma_separada & ~forma_compacta, "incompleto")
+
+        valores = pd.Series(pd.NaT, index=texto.index, dtype="datetime64[s]")  # años 1-9999, como datetime
+        valores[forma_separada] = pd.to_datetime(separado[forma_separada], format=formato, errors="coerce")
+        valores[forma_compacta] = pd.to_datetime(digitos[forma_compacta], format=formato_compacto, errors="coerce")
+        marcar(valores.isna(), "hora_invalida" if tipo == "hora" else "fecha_invalida")
+        if tipo != "hora":
+            self._errores_rango_fecha(valores, motor, marcar)
+
+    def _errores_rango_fecha(self, valores, motor, marcar):
+        """Compara las fechas (sin hora) con los límites "min" y "max" de las restricciones."""
+        dias = valores.dt.normalize()
+        min_fecha = motor.restricciones.get("min")
+        max_fecha = motor.restricciones.get("max")
+        if min_fecha:
+            marcar(dias < pd.Timestamp(min_fecha), "fuera_de_rango")
+        if max_fecha:
+            marcar(dias > pd.Timestamp(max_fecha), "fuera_de_rango")
+
+    def _errores_texto_numero(self, texto, motor, marcar):
+        """Valida números escritos como texto: forma, dígitos que caben en la máscara y rango."""
+        patron = self.PATRON_ENTERO if motor.tipo_validacion == "int" else self.PATRON_DECIMAL
+        partes = texto.str.extract(rf"^(?:{patron.pattern})$")
+        entera = partes[0]
+        decimal = partes[1] if motor.tipo_validacion == "float" else None
+        marcar(entera.isna(), "numero_invalido")
+
+        # Los ceros a la izquierda de la parte entera y a la derecha de la decimal no ocupan sitio
+        plan = motor.plan
+        if motor.tipo_validacion == "int":
+            marcar(entera.str.lstrip("0").str.len() > len(plan.posiciones_comodin), "longitud")
+        else:
+            marcar(entera.str.lstrip("0").str.len() > plan.longitud_entera, "longitud")
+            marcar(decimal.str.rstrip("0").str.len() > plan.longitud_decimal, "longitud")
+        numeros = entera if decimal is None else entera.str.cat(decimal, sep=".")
+        self._errores_rango(pd.to_numeric(numeros, errors="coerce"), motor, marcar)
+
+    def _errores_numero(self, valores, motor, marcar):
+        """Valida una columna ya numérica: signo, decimales, dígitos que caben en la máscara y rango."""
+        plan = motor.plan
+        marcar(valores < 0, "numero_invalido")
+        if motor.tipo_validacion == "int":
+            marcar(valores != np.floor(valores), "numero_invalido")
+            marcar(valores >= 10.0 ** len(plan.posiciones_comodin), "longitud")
+        else:
+            escalados = valores * 10.0 ** plan.longitud_decimal
+            marcar(valores >= 10.0 ** plan.longitud_entera, "longitud")
+            marcar((escalados - escalados.round()).abs() > 1e-6, "longitud")
+        self._errores_rango(valores, motor, marcar)
+
+    def _errores_rango(self, valores, motor, marcar):
+        """Compara valores numéricos con los límites "min" y "max" de las restricciones."""
+        marcar(~valores.between(motor.restricciones.get("min", float("-inf")),
+                                motor.restricciones.get("max", float("inf"))), "fuera_de_rango")
+
+def validar_dataframe(df, configuraciones):
+    """
+    Valida las columnas de un DataFrame con sus ConfiguracionTextbox (ver ValidadorDataFrame).
+
+    Args:
+        df (pd.DataFrame): Datos a validar.
+        configuraciones (dict): Nombre de columna -> ConfiguracionTextbox del campo.
+
+    Returns:
+        ResultadoValidacion: Máscara booleana y código de error por campo.
+    """
+    return ValidadorDataFrame(configuraciones).validar(df)
+
+def _clave_historial(control, config):
+    """
+    Clave de un control en el HistorialUso: la indicada en la configuración o, por defecto, su
+    título junto con la ruta del widget en Tk, que distingue los controles con el mismo título
+    (y normalmente otra fuente) y se repite entre ejecuciones si el formulario se construye igual.
+    Para compartir el historial entre controles, o conservarlo aunque cambie el formulario,
+    debe indicarse clave_historial.
+    """
+    return getattr(config, "clave_historial", None) or f"{getattr(config, 'titulo_control', '')}@{control}"
 
 class Textbox(tk.Frame):
     """
     Clase Textbox que representa un campo de entrada de texto con enmascaramiento, validación y búsqueda.
+
+    Una lista o DataFrame usado como fuente_datos se lee una vez: si va a cambiar con el
+    formulario abierto, debe pasarse como ListaObservable o DataFrameObservable.
     """
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent)
@@ -1193,18 +5177,9 @@ class Textbox(tk.Frame):
         self.caracteres_fijos = config.caracteres_fijos
 
         # 2. Detección robusta del carácter comodín
-        if hasattr(config, "caracter_comodin") and config.caracter_comodin not in (None, "", " "):
-            self.caracter_comodin = config.caracter_comodin
-        else:
-            # Inicializar con valor predeterminado
-            self.caracter_comodin = ' '
-            
-            # Busca el primer carácter de la máscara que NO sea fijo NI espacio
-            for c in self.mascara:
-                if c not in self.caracteres_fijos and c != ' ':
-                    self.caracter_comodin = c
-                    break
-                
+        self.caracter_comodin = _detectar_caracter_comodin(self.mascara, self.caracteres_fijos,
+                                                           getattr(config, "caracter_comodin", None))
+
         # 3. Mapear otros parámetros
         self.tipo_validacion = config.tipo_validacion
         self.fuente_datos = getattr(config, "fuente_datos", None)
@@ -1212,6 +5187,8 @@ class Textbox(tk.Frame):
         self.mascara_color = getattr(config, "mascara_color", None)
         self.texto_color = getattr(config, "texto_color", None)
         self.restricciones = getattr(config, "restricciones", {})
+        self._motor = None  # MotorMascara en caché (ver la propiedad motor)
+        self._restricciones_motor = None
 
         # 4. Inicializar variables internas
         self.texto_ingresado = ""
@@ -1227,22 +5204,9 @@ class Textbox(tk.Frame):
         self._tecla_muerta = ""
         self.buffer_usuario = ""
 
-        # 5. Definir separadores robustos según tipo y cantidad de caracteres fijos
-        if self.tipo_validacion == "momento":
-            partes_fijos = self.caracteres_fijos.split(" ") if self.caracteres_fijos else []
-            if len(partes_fijos) >= 2:
-                self.separador_fecha = partes_fijos[0]
-                self.separador_hora = partes_fijos[1]
-            elif len(partes_fijos) == 1:
-                self.separador_fecha = partes_fijos[0]
-                self.separador_hora = ":"
-            else:
-                self.separador_fecha = "/"
-                self.separador_hora = ":"
-        elif self.tipo_validacion == "fecha":
-            self.separador_fecha = self.caracteres_fijos[0] if self.caracteres_fijos else "/"
-        elif self.tipo_validacion == "hora":
-            self.separador_hora = self.caracteres_fijos[0] if self.caracteres_fijos else ":"
+        # 5. Separadores de fecha y hora según tipo y caracteres fijos (resueltos al compilar la máscara)
+        self.separador_fecha = self.plan.separador_fecha
+        self.separador_hora = self.plan.separador_hora
 
         # 6. Crear widgets visuales
         if config.titulo_control:
@@ -1251,15 +5215,26 @@ class Textbox(tk.Frame):
         
         self.textbox = tk.Text(self, height=1, width=self.ancho)
         self.textbox.grid(row=0, column=1)
+        # Los colores se configuran una sola vez; "texto" tiene prioridad sobre "mascara"
+        self.textbox.tag_config("mascara", foreground=self.mascara_color)
+        self.textbox.tag_config("texto", foreground=self.texto_color)
+        self.textbox.tag_raise("texto", "mascara")
+        # Último contenido enviado a Tk, para enviar solo las diferencias (None = desconocido)
+        self._texto_mostrado = ""
+        self._limite_oscuro = 0
+        self._fondo = None
+        for evento in ("<<Paste>>", "<<PasteSelection>>", "<<Cut>>", "<<Clear>>"):
+            self.textbox.bind(evento, self._invalidar_render, add="+")
 
         # 7. Estado inicial según configuración
         if hasattr(config, "habilitado") and not config.habilitado:
-            self.textbox.config(state="disabled")
+            self._estado_widget = "disabled"
         else:
-            self.textbox.config(state="normal")
+            self._estado_widget = "normal"
+        self.textbox.config(state=self._estado_widget)
 
         # 8. Configurar eventos según el tipo de validación
-        if self.tipo_validacion == "str" and isinstance(self.fuente_datos, (pd.DataFrame, list, tuple)):
+        if self.tipo_validacion == "str" and isinstance(self.fuente_datos, (pd.DataFrame, list, tuple, FuenteDatos, FuenteObservable)):
             # Usar BuscadorCadena para autocompletado
             self.buscador = BuscadorCadena(
                 fuente_datos=self.fuente_datos,
@@ -1267,7 +5242,13 @@ class Textbox(tk.Frame):
                 permite_agregar=getattr(config, "permite_agregar", False),
                 sensible_mayusculas=getattr(config, "sensible_mayusculas", False),
                 df_columna_id=getattr(config, "df_columna_id", None),
-                df_columna_valor=getattr(config, "df_columna_valor", None)
+                df_columna_valor=getattr(config, "df_columna_valor", None),
+                ruta_cache=getattr(config, "ruta_cache", None),
+                indice_compacto=getattr(config, "indice_compacto", False),
+                df_columnas_busqueda=getattr(config, "df_columnas_busqueda", None),
+                orden_resultados=getattr(config, "orden_resultados", None),
+                historial_uso=getattr(config, "historial_uso", None),
+                clave_historial=_clave_historial(self, config)
             )
             self.textbox.bind("<KeyPress>", lambda e: self.buscador.on_keypress(self.textbox, e, "text"))
         else:
@@ -1279,10 +5260,7 @@ class Textbox(tk.Frame):
         self.aplicar_mascara()
         
         # 10. Estado inicial según configuración
-        if hasattr(config, "habilitado") and not config.habilitado:
-            self.textbox.config(state="disabled")
-        else:
-            self.textbox.config(state="normal")
+        self.textbox.config(state=self._estado_widget)
         
         # 11. Asegura que los colores estén correctos según el estado inicial
         self.actualizar_colores()
@@ -1365,6 +5343,12 @@ class Textbox(tk.Frame):
         """
         return self.textbox
 
+    def destroy(self):
+        """Libera el índice de búsqueda compartido antes de destruir el control."""
+        if hasattr(self, 'buscador'):
+            self.buscador.liberar()
+        super().destroy()
+
     def set_estado(self, estado):
         """
         Cambia el estado del textbox (habilitado o deshabilitado) y actualiza los colores del control.
@@ -1382,6 +5366,7 @@ class Textbox(tk.Frame):
         """
         if isinstance(self.textbox, (tk.Text, tk.Entry)):
             self.textbox.config(state=estado)
+            self._estado_widget = estado
         self.actualizar_colores()
 
     def aplicar_mascara(self, event=None):
@@ -1395,11 +5380,7 @@ class Textbox(tk.Frame):
             self.textbox.see("insert")
             return
 
-        self.textbox.delete("1.0", tk.END)
-        if self.mascara:
-            self.textbox.insert("1.0", self.mascara)
-        else:
-            self.textbox.insert("1.0", "")
+        self._mostrar_texto(self.mascara or "")
 
         self.actualizar_colores()
         posicion_inicial = self.calcular_primera_posicion_editable()
@@ -1430,9 +5411,9 @@ class Textbox(tk.Frame):
                 return
 
         if self.tipo_validacion == "float":
-            separador_decimal = "." if "." in self.mascara else ("," if "," in self.mascara else ".")
-            partes_mascara = self.mascara.split(separador_decimal)
-            longitud_entera = partes_mascara[0].count(self.caracter_comodin)
+            plan = self.plan
+            separador_decimal = plan.separador_decimal
+            longitud_entera = plan.longitud_entera
 
             # Solo permitir dígitos y el separador decimal
             if not (tecla_presionada.isdigit() or tecla_presionada in (".", ",")):
@@ -1536,9 +5517,9 @@ class Textbox(tk.Frame):
 
         # --- Lógica para tipo float ---
         if self.tipo_validacion == "float":
-            separador_decimal = "." if "." in self.mascara else ("," if "," in self.mascara else ".")
-            partes_mascara = self.mascara.split(separador_decimal)
-            longitud_entera = partes_mascara[0].count(self.caracter_comodin)
+            plan = self.plan
+            separador_decimal = plan.separador_decimal
+            longitud_entera = plan.longitud_entera
 
             # Solo permitir dígitos y el separador decimal
             if not (tecla_presionada.isdigit() or tecla_presionada in (".", ",")):
@@ -1588,435 +5569,86 @@ class Textbox(tk.Frame):
             tipo_separador (str): Tipo de separador a manejar ('fecha_auto', 'fecha_manual', 'hora_manual')
             digitos (str, optional): Dígitos extraídos del texto ingresado. Necesario para 'fecha_auto'.
         """
-        # Determinar el separador correcto según el contexto
-        if tipo_separador.startswith('fecha'):
-            sep = self.separador_fecha
-        elif tipo_separador.startswith('hora'):
-            sep = self.separador_hora
-        else:
-            sep = self.separador  # Solo si tienes un caso general, si no, puedes omitir esto
-
-        if tipo_separador == 'fecha_auto' and digitos:
-            # Manejo automático de separadores para fechas
-            if self.tipo_validacion == "fecha":
-                if len(digitos) == 2 and self.texto_ingresado.count(sep) == 0:
-                    self.texto_ingresado += sep
-                elif len(digitos) == 4 and self.texto_ingresado.count(sep) == 1:
-                    self.texto_ingresado += sep
-            elif self.tipo_validacion == "momento":
-                if self.separador_momento not in self.texto_ingresado:
-                    # Estamos en la parte de fecha del momento
-                    if len(digitos) == 2 and self.texto_ingresado.count(self.separador_fecha) == 0:
-                        self.texto_ingresado += self.separador_fecha
-                    elif len(digitos) == 4 and self.texto_ingresado.count(self.separador_fecha) == 1:
-                        self.texto_ingresado += self.separador_fecha
-                    elif len(digitos) == 8 and self.texto_ingresado.count(self.separador_fecha) == 2:
-                        self.texto_ingresado += self.separador_momento  # Espacio entre fecha y hora
-                else:
-                    # Estamos en la parte de hora del momento
-                    partes = self.texto_ingresado.split(self.separador_momento)
-                    parte_hora = partes[1] if len(partes) > 1 else ""
-                    digitos_hora = ''.join(c for c in parte_hora if c.isdigit())
-                    if len(digitos_hora) == 2 and self.separador_hora not in parte_hora:
-                        self.texto_ingresado += self.separador_hora
-
-        elif tipo_separador == 'fecha_manual':
-            # Manejo manual de separadores para fechas
-            if self.tipo_validacion == "fecha":
-                partes = self.texto_ingresado.split(sep)
-                bloque_actual = partes[-1]
-                # Si el bloque actual tiene un solo dígito, rellenarlo con cero
-                if len(bloque_actual) == 1 and bloque_actual.isdigit():
-                    partes[-1] = "0" + bloque_actual
-                    self.texto_ingresado = sep.join(partes) + sep
-                else:
-                    self.texto_ingresado += sep
-            elif self.tipo_validacion == "momento":
-                partes = self.texto_ingresado.split(self.separador_fecha)
-                bloque_actual = partes[-1]
-                if len(bloque_actual) == 1 and bloque_actual.isdigit():
-                    partes[-1] = "0" + bloque_actual
-                    self.texto_ingresado = self.separador_fecha.join(partes) + self.separador_fecha
-                else:
-                    self.texto_ingresado += self.separador_fecha
-
-        elif tipo_separador == 'hora_manual':
-            # Manejo manual de separadores para horas
-            if self.tipo_validacion == "momento":
-                partes = self.texto_ingresado.split(self.separador_momento)
-                parte_hora = partes[1] if len(partes) > 1 else ""
-                # Si la parte de hora tiene un solo dígito, rellenarla con cero
-                if len(parte_hora) == 1 and parte_hora.isdigit():
-                    partes[1] = "0" + parte_hora
-                    self.texto_ingresado = self.separador_momento.join(partes) + self.separador_hora
-                else:
-                    self.texto_ingresado += self.separador_hora
-            else:
-                # Para el tipo hora
-                if len(self.texto_ingresado) == 1 and self.texto_ingresado.isdigit():
-                    self.texto_ingresado = "0" + self.texto_ingresado + sep
-                else:
-                    self.texto_ingresado += sep
-
-    def formatear_texto(self, texto=None):
-        if texto is None:
-            texto = self.texto_ingresado
-            
-
-        # --- TV FECHA y TV HORA ---
-        if self.tipo_validacion in ("fecha", "hora"):
-            digitos = ''.join(c for c in texto if c.isdigit())
-            bloques = []
-            bloque_actual = ""
-            separadores = []
-            for char in self.mascara:
-                if char in self.caracteres_fijos:
-                    if bloque_actual:
-                        bloques.append(bloque_actual)
-                        bloque_actual = ""
-                    separadores.append(char)
-                else:
-                    bloque_actual += char
-            if bloque_actual:
-                bloques.append(bloque_actual)
+        self.texto_ingresado = self.motor.aplicar_separador(self.texto_ingresado, tipo_separador, digitos)
 
-            resultado = ""
-            idx = 0
-            for i, bloque in enumerate(bloques):
-                tam = len(bloque)
-                parte_digitos = digitos[idx:idx+tam]
-                if parte_digitos:
-                    if len(bloque) == 4:  # Año: rellenar izquierda a derecha con la letra de la máscara
-                        parte = parte_digitos.ljust(tam, bloque[0])
-                    else:  # Día, mes, hora, minuto: rellenar con ceros a la izquierda
-                        parte = parte_digitos.rjust(tam, "0")
-                else:
-                    parte = bloque
-                resultado += parte
-                idx += len(parte_digitos)
-                if i < len(separadores):
-                    resultado += separadores[i]
-            return resultado
-
-        # --- TV MOMENTO ---
-        if self.tipo_validacion == "momento":
-            if " " in self.mascara:
-                mascara_fecha, mascara_hora = self.mascara.split(" ", 1)
-            else:
-                mascara_fecha, mascara_hora = self.mascara, ""
-            partes = texto.split(" ", 1)
-            fecha_txt = partes[0] if len(partes) > 0 else ""
-            hora_txt = partes[1] if len(partes) > 1 else ""
-            # Formatear fecha
-            self.tipo_validacion = "fecha"
-            self.mascara = mascara_fecha
-            fecha_formateada = self.formatear_texto(fecha_txt)
-            # Formatear hora
-            self.tipo_validacion = "hora"
-            self.mascara = mascara_hora
-            hora_formateada = self.formatear_texto(hora_txt)
-            # Restaurar tipo y máscara
-            self.tipo_validacion = "momento"
-            self.mascara = mascara_fecha + (" " + mascara_hora if mascara_hora else "")
-            resultado = f"{fecha_formateada} {hora_formateada}".strip()
-            return resultado
-
-        # --- TV FLOAT ---
-        if self.tipo_validacion == "float":
-            separador_mascara = "." if "." in self.mascara else ("," if "," in self.mascara else ".")
-            partes_mascara = self.mascara.split(separador_mascara)
-            longitud_entera = partes_mascara[0].count(self.caracter_comodin)
-            longitud_decimal = partes_mascara[1].count(self.caracter_comodin) if len(partes_mascara) > 1 else 0
-
-            texto_normalizado = texto.replace(",", ".")
-            
-            # Determinar si estamos en modo decimal por la presencia del separador
-            modo_decimal = "." in texto_normalizado
-            digitos = ''.join(c for c in texto_normalizado if c.isdigit())
-
-            # Parte entera
-            if modo_decimal:
-                parte_entera_txt = texto_normalizado.split(".", 1)[0]
-                digitos_entera = ''.join(c for c in parte_entera_txt if c.isdigit())[:longitud_entera]
-            else:
-                digitos_entera = digitos[:longitud_entera]
-            parte_entera = digitos_entera.rjust(longitud_entera, "0")
-
-            # Parte decimal
-            if modo_decimal:
-                parte_decimal_txt = texto_normalizado.split(".", 1)[1]
-                decimales = ''.join(c for c in parte_decimal_txt if c.isdigit())
-            else:
-                decimales = digitos[longitud_entera:]
-
-            if len(decimales) == 0:
-                parte_decimal = "0" * longitud_decimal
-                buffer_decimal = ""
-            else:
-                # Mantener todos los decimales que quepan en la máscara
-                if len(decimales) <= longitud_decimal:
-                    parte_decimal = decimales.ljust(longitud_decimal, "0")
-                    buffer_decimal = decimales
-                else:
-                    # Si hay más decimales que los permitidos, mantener todos menos el último que se reemplaza
-                    parte_decimal = decimales[:longitud_decimal-1] + decimales[-1]
-                    buffer_decimal = parte_decimal
-
-            # Siempre incluir el separador y la parte decimal si la máscara lo requiere
-            resultado = parte_entera + separador_mascara + parte_decimal
-
-            # Actualiza el buffer: mantener el separador si estamos en modo decimal
-            if modo_decimal:
-                self.texto_ingresado = digitos_entera + separador_mascara + buffer_decimal
-            else:
-                self.texto_ingresado = digitos_entera + buffer_decimal
-
-            return resultado
-
-        # --- TV INT ---
-        if self.tipo_validacion == "int":
-            longitud = self.mascara.count(self.caracter_comodin)
-            digitos = ''.join(c for c in texto if c.isdigit())
-            if len(digitos) > longitud:
-                # Mantener los primeros (N-1) y el último
-                digitos = digitos[:longitud-1] + digitos[-1]
-            resultado = digitos.rjust(longitud, '0')
-            self.texto_ingresado = digitos
-            return resultado
-
-        # --- TV STR con máscara de comodín (CP) ---
-        if self.tipo_validacion == "str" and self.caracter_comodin in self.mascara:
-            longitud = self.mascara.count(self.caracter_comodin)
-            caracteres = ''.join(c for c in texto if c.isalnum())
-            if len(caracteres) > longitud:
-                # Mantener los primeros (N-1) y el último
-                caracteres = caracteres[:longitud-1] + caracteres[-1]
-            resultado = ""
-            indice_caracter = 0
-            for char in self.mascara:
-                if char == self.caracter_comodin:
-                    if indice_caracter < len(caracteres):
-                        resultado += caracteres[indice_caracter]
-                        indice_caracter += 1
-                    else:
-                        resultado += self.caracter_comodin
-                else:
-                    resultado += char
-            self.texto_ingresado = caracteres
-            return resultado
-
-        # --- TV STR sin máscara ---
-        if self.tipo_validacion == "str":
-            self.texto_ingresado = texto
-            return texto
-
-        # --- TV EMAIL ---
-        if self.tipo_validacion == "email":
-            # Eliminar espacios al inicio y final
-            texto_limpio = texto.strip()
-            # Convertir a minúsculas
-            texto_limpio = texto_limpio.lower()
-            # Eliminar espacios en medio
-            texto_limpio = texto_limpio.replace(" ", "")
-            self.texto_ingresado = texto_limpio
-            return texto_limpio
-
-        # --- Por defecto ---
-        self.texto_ingresado = texto
-        return texto
+    @property
+    def plan(self):
+        """PlanMascara de la configuración actual, compartido con los Textbox de la misma máscara."""
+        return compilar_mascara(self.mascara, self.caracteres_fijos, self.tipo_validacion, self.caracter_comodin)
 
-    def _determinar_parte_oscura(self):
+    @property
+    def motor(self):
         """
-        Determina qué parte del texto formateado debe mostrarse en color oscuro,
-        según el tipo de validación (fecha, hora, momento, int, float, str con máscara).
+        MotorMascara con la máscara y las restricciones actuales del control. Se reutiliza
+        mientras no cambien la máscara, el tipo de validación ni las restricciones.
         """
-        if not self.texto_ingresado:
-            return ""
-
-        texto = self.texto_ingresado
-        digitos = ''.join(c for c in texto if c.isalnum())
-
-        # --- TV FECHA y TV HORA ---
-        if self.tipo_validacion in ("fecha", "hora"):
-            bloques = []
-            bloque_actual = ""
-            separadores = []
-            for char in self.mascara:
-                if char in self.caracteres_fijos:
-                    if bloque_actual:
-                        bloques.append(bloque_actual)
-                        bloque_actual = ""
-                    separadores.append(char)
-                else:
-                    bloque_actual += char
-            if bloque_actual:
-                bloques.append(bloque_actual)
-
-            parte_oscura = ""
-            idx = 0
-            for i, bloque in enumerate(bloques):
-                tam = len(bloque)
-                parte_digitos = digitos[idx:idx+tam]
-                if parte_digitos:
-                    if len(bloque) == 4:  # Año: solo los dígitos ingresados en oscuro
-                        parte = parte_digitos
-                    else:  # Día, mes, hora, minuto: ceros de relleno y dígitos en oscuro
-                        faltan = tam - len(parte_digitos)
-                        parte = "0" * faltan + parte_digitos
-                else:
-                    parte = ""
-                parte_oscura += parte
-                # Solo avanza al siguiente bloque si el bloque actual está completo
-                if len(parte_digitos) == tam:
-                    idx += tam
-                else:
-                    break  # No avanzar más, el usuario aún no ha completado este bloque
-                # Añade el separador si el bloque está completo
-                if i < len(separadores):
-                    parte_oscura += separadores[i]
-            return parte_oscura
-
-        # --- TV MOMENTO ---
-        if self.tipo_validacion == "momento":
-            if " " not in self.texto_ingresado:
-                self.tipo_validacion = "fecha"
-                parte_oscura = self._determinar_parte_oscura()
-                self.tipo_validacion = "momento"
-                return parte_oscura
-            else:
-                partes = self.texto_ingresado.split(" ")
-                parte_fecha = partes[0]
-                parte_hora = partes[1] if len(partes) > 1 else ""
-                self.tipo_validacion = "fecha"
-                self.texto_ingresado = parte_fecha
-                oscura_fecha = self._determinar_parte_oscura()
-                self.tipo_validacion = "hora"
-                self.texto_ingresado = parte_hora
-                oscura_hora = self._determinar_parte_oscura()
-                self.tipo_validacion = "momento"
-                self.texto_ingresado = texto
-                return oscura_fecha + (" " if oscura_hora else "") + oscura_hora
-
-        # --- TV FLOAT ---
-        if self.tipo_validacion == "float":
-            separador_decimal = "." if "." in self.mascara else ("," if "," in self.mascara else ".")
-            partes_mascara = self.mascara.split(separador_decimal)
-            longitud_entera = partes_mascara[0].count(self.caracter_comodin)
-            longitud_decimal = partes_mascara[1].count(self.caracter_comodin) if len(partes_mascara) > 1 else 0
-            
-            # Normalizar el texto ingresado para usar el separador de la máscara
-            texto_normalizado = texto.replace(".", separador_decimal).replace(",", separador_decimal)
-                        
-            # Determinar si estamos en modo decimal
-            modo_decimal = separador_decimal in texto_normalizado
-            
-            # Si hay separador en el texto ingresado, incluirlo en la parte oscura
-            if modo_decimal:
-                parte_entera_txt, parte_decimal_txt = texto_normalizado.split(separador_decimal, 1)
-                
-                digitos_entera = ''.join(c for c in parte_entera_txt if c.isdigit())[:longitud_entera]
-                digitos_decimal = ''.join(c for c in parte_decimal_txt if c.isdigit())
-                
-                # Formatear parte entera y separador (siempre incluir el separador si está presente)
-                parte_entera = digitos_entera.rjust(longitud_entera, "0")
-                parte_oscura = parte_entera + separador_decimal
-                
-                # Formatear parte decimal si existe
-                if digitos_decimal:
-                    # Mantener todos los decimales que quepan en la máscara
-                    if len(digitos_decimal) <= longitud_decimal:
-                        parte_decimal = digitos_decimal.ljust(longitud_decimal, "0")
-                    else:
-                        # Si hay más decimales que los permitidos, mantener todos menos el último que se reemplaza
-                        parte_decimal = digitos_decimal[:longitud_decimal-1] + digitos_decimal[-1]
-                    parte_oscura += parte_decimal
-            else:
-                # Si no hay separador, solo formatear la parte entera
-                digitos = ''.join(c for c in texto_normalizado if c.isdigit())
-                digitos_entera = digitos[:longitud_entera]
-                parte_entera = digitos_entera.rjust(longitud_entera, "0")
-                parte_oscura = parte_entera
-            
-            return parte_oscura
-
-        # --- TV INT ---
-        if self.tipo_validacion == "int":
-            longitud = self.mascara.count(self.caracter_comodin)
-            digitos = ''.join(c for c in texto if c.isdigit())
-            if len(digitos) > longitud:
-                digitos = digitos[:longitud-1] + digitos[-1]
-            parte_oscura = digitos.rjust(longitud, '0')
-            return parte_oscura
+        plan = self.plan
+        if self._motor is None or self._motor.plan is not plan or self._restricciones_motor != self.restricciones:
+            self._motor = MotorMascara(plan, self.restricciones)
+            self._restricciones_motor = dict(self.restricciones or {})
+        return self._motor
 
-        # --- TV STR con máscara de comodín (CP, teléfono, etc) ---
-        if self.tipo_validacion == "str" and self.caracter_comodin in self.mascara:
-            longitud = self.mascara.count(self.caracter_comodin)
-            caracteres = ''.join(c for c in texto if c.isalnum())
-            if len(caracteres) > longitud:
-                caracteres = caracteres[:longitud-1] + caracteres[-1]
-            parte_oscura = ""
-            indice_caracter = 0
-            for char in self.mascara:
-                if char == self.caracter_comodin:
-                    if indice_caracter < len(caracteres):
-                        parte_oscura += caracteres[indice_caracter]
-                        indice_caracter += 1
-                    else:
-                        break
-                else:
-                    parte_oscura += char
-            return parte_oscura
+    def renderizar(self, texto=None):
+        """
+        Calcula lo que debe mostrar el control para el texto escrito (ver MotorMascara.renderizar).
+        No modifica el estado del control.
 
-        # --- TV STR sin máscara ---
-        if self.tipo_validacion == "str":
-            return texto
+        Args:
+            texto (str, optional): Texto escrito por el usuario. Por defecto, texto_ingresado.
 
-        # --- TV EMAIL ---
-        if self.tipo_validacion == "email":
-            return texto
+        Returns:
+            EstadoRender: Estado que la capa del widget aplica al tk.Text.
+        """
+        return self.motor.renderizar(self.texto_ingresado if texto is None else texto)
 
-        # --- Por defecto ---
-        return texto
+    def formatear_texto(self, texto=None):
+        """
+        Devuelve el texto formateado según la máscara. Salvo en fechas y horas, normaliza
+        además texto_ingresado (solo dígitos, recorte a la longitud de la máscara...).
+        """
+        estado = self.renderizar(texto)
+        if self.tipo_validacion not in ("fecha", "hora", "momento"):
+            self.texto_ingresado = estado.texto_ingresado
+        return estado.texto
 
-    def actualizar_colores(self):
+    def actualizar_colores(self, estado=None):
         """
         Fondo blanco si habilitado, gris claro si deshabilitado.
         Letras oscuras para parte editada, claras para la máscara.
+
+        Args:
+            estado (EstadoRender, optional): Estado ya calculado por renderizar(). Si no se indica,
+                se calcula para el texto actual y se coloca también el cursor.
         """
         COLOR_FONDO_HABILITADO = "#ffffff"
         COLOR_FONDO_DESHABILITADO = "#f0f0f0"
-
-        # Limpiar etiquetas previas
-        self.textbox.tag_remove("texto", "1.0", tk.END)
-        self.textbox.tag_remove("mascara", "1.0", tk.END)
-
-        parte_oscura = self._determinar_parte_oscura()
-
-        # Fondo según estado habilitado/deshabilitado
-        if self.textbox['state'] != 'normal':
-            self.textbox.config(bg=COLOR_FONDO_DESHABILITADO)
-            self.textbox.tag_add("mascara", "1.0", tk.END)
-            self.textbox.tag_config("mascara", foreground=self.mascara_color)
-            return  # <-- IMPORTANTE: salir aquí para no sobrescribir el fondo   
-        else:
-            self.textbox.config(bg=COLOR_FONDO_HABILITADO)
-
-        # Aplica colores a texto y máscara (como ya tienes)
-        if parte_oscura:
-            self.textbox.tag_add("texto", "1.0", f"1.{len(parte_oscura)}")
-            self.textbox.tag_add("mascara", f"1.{len(parte_oscura)}", tk.END)
-            self.textbox.tag_config("texto", foreground=self.texto_color)
-            self.textbox.tag_config("mascara", foreground=self.mascara_color)
+        colocar_cursor = estado is None
+        if estado is None:
+            estado = self.renderizar()
+
+        longitud_oscura = estado.longitud_oscura
+
+        # Fondo según estado habilitado/deshabilitado (solo se envía a Tk si cambia)
+        habilitado = self._estado_widget == "normal"
+        fondo = COLOR_FONDO_HABILITADO if habilitado else COLOR_FONDO_DESHABILITADO
+        if fondo != self._fondo:
+            self.textbox.config(bg=fondo)
+            self._fondo = fondo
+        if not habilitado:
+            self._mover_limite_oscuro(0)
+            return  # <-- IMPORTANTE: salir aquí para no colocar el cursor
+
+        # Aplica colores a texto y máscara
+        self._mover_limite_oscuro(longitud_oscura)
+        if longitud_oscura:
             # Posicionar el cursor correctamente
-            if self.tipo_validacion == "str" and "#" in self.mascara:
-                texto_formateado = self.formatear_texto()
-                posicion_cursor = self.calcular_posicion_cursor(texto_formateado, self.texto_ingresado)
+            if colocar_cursor:
+                if self.tipo_validacion == "str" and "#" in self.mascara:
+                    posicion_cursor = estado.cursor
+                else:
+                    posicion_cursor = longitud_oscura
                 self.textbox.mark_set("insert", f"1.{posicion_cursor}")
-            else:
-                self.textbox.mark_set("insert", f"1.{len(parte_oscura)}")
-        else:
-            self.textbox.tag_add("mascara", "1.0", tk.END)
-            self.textbox.tag_config("mascara", foreground=self.mascara_color)
+        elif colocar_cursor:
             self.textbox.mark_set("insert", "1.0")
 
     def manejar_retroceso(self, event=None):
@@ -2129,7 +5761,7 @@ class Textbox(tk.Frame):
                     self.texto_ingresado = ""
             
             # --- TV STR con máscara de comodín (como teléfono) ---
-            elif self.tipo_validacion == "str" and "#" in self.mascara:
+            elif self.tipo_validacion == "str" and self.plan.huecos_retroceso:
                 # Obtener solo los dígitos ingresados
                 digitos = ''.join(c for c in self.texto_ingresado if c.isdigit())
                 
@@ -2137,26 +5769,18 @@ class Textbox(tk.Frame):
                     # Eliminar el último dígito
                     digitos = digitos[:-1]
                     
-                    # Reconstruir el texto ingresado con los caracteres fijos
-                    nuevo_texto = ""
-                    indice_mascara = 0
-                    indice_digito = 0
-                    
-                    while indice_mascara < len(self.mascara) and indice_digito < len(digitos):
-                        char_mascara = self.mascara[indice_mascara]
-                        
-                        if char_mascara == '#':
-                            # Si es un comodín y hay dígitos, agregar el dígito
-                            nuevo_texto += digitos[indice_digito]
-                            indice_digito += 1
-                        elif char_mascara in self.caracteres_fijos:
-                            # Si es un carácter fijo, agregarlo
-                            nuevo_texto += char_mascara
-                        
-                        indice_mascara += 1
+                    # Reconstruir el texto ingresado con los caracteres fijos hasta el último dígito
+                    plan = self.plan
+                    huecos = plan.huecos_retroceso
+                    nuevo_texto = []
+                    if digitos:
+                        ultimo = huecos[len(digitos) - 1] if len(digitos) <= len(huecos) else len(plan.plantilla_retroceso) - 1
+                        nuevo_texto = list(plan.plantilla_retroceso[:ultimo + 1])
+                        for hueco, digito in zip(huecos, digitos):
+                            nuevo_texto[hueco] = digito
                     
                     # Actualizar el texto ingresado
-                    self.texto_ingresado = nuevo_texto
+                    self.texto_ingresado = "".join(nuevo_texto)
                 else:
                     # Si no quedan dígitos, limpiar el texto ingresado
                     self.texto_ingresado = ""
@@ -2174,263 +5798,142 @@ class Textbox(tk.Frame):
         Actualiza el contenido del Textbox con el texto formateado.
         Mantiene la posición del cursor en la posición correcta.
         """
-        texto_ingresado = self.texto_ingresado
-        texto_formateado = self.formatear_texto(texto_ingresado)  # Solo texto
-        posicion_cursor = self.calcular_posicion_cursor(texto_formateado, texto_ingresado)  # Solo posición
-
-        self.textbox.delete("1.0", tk.END)
-        self.textbox.insert("1.0", texto_formateado)
-        self.actualizar_colores()
-        self.textbox.mark_set("insert", f"1.{posicion_cursor}")
-        self.textbox.see("insert")
-
-    def validar_dato(self):
-
-        # --- TV FECHA ---
-        if self.tipo_validacion == "fecha":
-            texto_formateado = self.formatear_texto()
-            bloques = []
-            separadores = []
-            bloque_actual = ""
-            for char in self.mascara:
-                if char not in self.caracteres_fijos:
-                    bloque_actual += char
-                else:
-                    if bloque_actual:
-                        bloques.append(bloque_actual)
-                        bloque_actual = ""
-                    separadores.append(char)
-            if bloque_actual:
-                bloques.append(bloque_actual)
-            patron = '|'.join(map(re.escape, separadores))
-            valores = re.split(patron, texto_formateado)
-            valores = [v for v in valores if v]
-
-            # Identificar bloques por longitud y contenido
-            idx_anio = idx_mes = idx_dia = None
-            for idx, bloque in enumerate(bloques):
-                if len(bloque) == 4:
-                    idx_anio = idx
-                elif len(bloque) == 2:
-                    if 'M' in bloque.upper():
-                        idx_mes = idx
-                    elif 'D' in bloque.upper():
-                        idx_dia = idx
-
-            # Si no se identifican por letra, usar heurística por posición
-            if None in (idx_anio, idx_mes, idx_dia):
-                # Si el año no se identificó pero hay un bloque de 4 dígitos
-                for idx, bloque in enumerate(bloques):
-                    if len(bloque) == 4:
-                        idx_anio = idx
-                        break
-
-                # Los otros dos bloques son día y mes
-                otros_indices = [i for i in range(len(bloques)) if i != idx_anio]
-                if len(otros_indices) == 2:
-                    # Por defecto, asumimos formato DD/MM/AAAA
-                    idx_dia, idx_mes = otros_indices
-                    # A menos que la máscara indique lo contrario
-                    if bloques[otros_indices[0]].upper().startswith('M'):
-                        idx_mes, idx_dia = otros_indices
-
-            if None in (idx_anio, idx_mes, idx_dia):
-                print("[DEBUG validar_dato FECHA] Error: No se pudieron identificar los bloques de fecha")
-                return False
-
-            try:
-                anio = valores[idx_anio]
-                mes = valores[idx_mes]
-                dia = valores[idx_dia]
-            except IndexError:
-                print("[DEBUG validar_dato FECHA] Error: Valores incompletos")
-                return False
-
-            # Validaciones intermedias para mejor feedback
-            if not (dia.isdigit() and len(dia) == 2):
-                print(f"[DEBUG validar_dato FECHA] Error: Día inválido '{dia}'")
-                return False
-            if not (mes.isdigit() and len(mes) == 2):
-                print(f"[DEBUG validar_dato FECHA] Error: Mes inválido '{mes}'")
-                return False
-            if not (anio.isdigit() and len(anio) == 4):
-                print(f"[DEBUG validar_dato FECHA] Error: Año inválido '{anio}'")
-                return False
-
-            # Validaciones de rango básicas antes de crear el objeto datetime
-            dia_int = int(dia)
-            mes_int = int(mes)
-            anio_int = int(anio)
-
-            if not (1 <= mes_int <= 12):
-                print(f"[DEBUG validar_dato FECHA] Error: Mes fuera de rango (1-12): {mes_int}")
-                return False
-
-            # Días por mes (considerando años bisiestos)
-            dias_por_mes = [0, 31, 29 if anio_int % 4 == 0 and (anio_int % 100 != 0 or anio_int % 400 == 0) else 28,
-                          31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
-
-            if not (1 <= dia_int <= dias_por_mes[mes_int]):
-                print(f"[DEBUG validar_dato FECHA] Error: Día fuera de rango (1-{dias_por_mes[mes_int]}): {dia_int}")
-                return False
+        estado = self.renderizar()
+        self.texto_ingresado = estado.texto_ingresado
+        self._aplicar_render(estado)
 
-            try:
-                fecha_obj = datetime(anio_int, mes_int, dia_int)
-                print(f"[DEBUG validar_dato FECHA] Fecha válida: {fecha_obj.strftime('%Y-%m-%d')}")
-            except ValueError as e:
-                print(f"[DEBUG validar_dato FECHA] Error al crear objeto datetime: {str(e)}")
-                return False
-
-            # Validar restricciones de rango si existen
-            fecha_iso = fecha_obj.strftime("%Y-%m-%d")
-            min_fecha = self.restricciones.get("min")
-            max_fecha = self.restricciones.get("max")
-            
-            if min_fecha and fecha_iso < min_fecha:
-                print(f"[DEBUG validar_dato FECHA] Error: Fecha menor que el mínimo permitido ({min_fecha})")
-                return False
-            if max_fecha and fecha_iso > max_fecha:
-                print(f"[DEBUG validar_dato FECHA] Error: Fecha mayor que el máximo permitido ({max_fecha})")
-                return False
+    def _aplicar_render(self, estado):
+        """Muestra en el tk.Text un EstadoRender: texto, colores y cursor."""
+        self._mostrar_texto(estado.texto, estado.longitud_oscura)
+        self.actualizar_colores(estado)
+        self.textbox.mark_set("insert", f"1.{estado.cursor}")
+        if len(estado.texto) >= self.ancho:
+            self.textbox.see("insert")
 
-            return texto_formateado
+    def _mostrar_texto(self, texto, limite=None):
+        """
+        Sustituye el contenido del tk.Text enviando a Tk solo el tramo que cambia.
 
-        # --- TV HORA ---
-        if self.tipo_validacion == "hora":
-            texto_formateado = self.formatear_texto()
-            bloques = []
-            separadores = []
-            bloque_actual = ""
-            for char in self.mascara:
-                if char not in self.caracteres_fijos:
-                    bloque_actual += char
-                else:
-                    if bloque_actual:
-                        bloques.append(bloque_actual)
-                        bloque_actual = ""
-                    separadores.append(char)
-            if bloque_actual:
-                bloques.append(bloque_actual)
-            patron = '|'.join(map(re.escape, separadores))
-            valores = re.split(patron, texto_formateado)
-            valores = [v for v in valores if v]
-            if len(valores) != 2:
-                return False
-            hora, minuto = valores
-            if not (hora.isdigit() and minuto.isdigit()):
-                return False
-            if 0 <= int(hora) <= 23 and 0 <= int(minuto) <= 59:
-                return texto_formateado
-            return False
+        Conserva el prefijo y el sufijo comunes con el último texto mostrado y sustituye el
+        tramo intermedio con un único replace. Los caracteres nuevos llevan la etiqueta
+        "mascara" y, si quedan antes del límite, también "texto".
 
-        # --- TV MOMENTO ---
-        if self.tipo_validacion == "momento":
-            texto_formateado = self.formatear_texto()
-            partes = texto_formateado.split(" ", 1)
-            if len(partes) != 2:
-                return False
-            fecha_parte, hora_parte = partes
-            tipo_original = self.tipo_validacion
-            texto_original = self.texto_ingresado
-            mascara_original = self.mascara
-            caracteres_fijos_original = self.caracteres_fijos
-
-            # Validar fecha
-            self.tipo_validacion = "fecha"
-            self.mascara = mascara_original.split(" ", 1)[0] if " " in mascara_original else "DD/MM/AAAA"
-            self.caracteres_fijos = self.separador_fecha
-            self.texto_ingresado = fecha_parte
-            resultado_fecha = self.validar_dato()
-
-            # Validar hora
-            self.tipo_validacion = "hora"
-            self.mascara = mascara_original.split(" ", 1)[1] if " " in mascara_original else "HH:MM"
-            self.caracteres_fijos = self.separador_hora
-            self.texto_ingresado = hora_parte
-            resultado_hora = self.validar_dato()
-
-            # Restaurar estado original
-            self.tipo_validacion = tipo_original
-            self.texto_ingresado = texto_original
-            self.mascara = mascara_original
-            self.caracteres_fijos = caracteres_fijos_original
-
-            if resultado_fecha and resultado_hora:
-                return texto_formateado
-            return False
+        Args:
+            texto (str): Texto que debe mostrar el control.
+            limite (int, optional): Caracteres iniciales que se muestran como texto escrito.
+                Si no se indica, la frontera de colores queda pendiente de actualizar_colores().
+        """
+        if self._estado_widget != "normal":
+            # Tk ignora los cambios de contenido de un tk.Text deshabilitado
+            texto = self._texto_mostrado
+            limite = None if limite is None else 0
+        anterior = self._texto_mostrado
+        if texto is None or anterior is None or hasattr(self, "buscador"):
+            if texto is not None:
+                self.textbox.delete("1.0", tk.END)
+                self.textbox.insert("1.0", texto, "mascara")
+                self._texto_mostrado = None if hasattr(self, "buscador") else texto
+            self._limite_oscuro = None
+            if limite is not None:
+                self._mover_limite_oscuro(limite)
+            return
 
-        # --- TV FLOAT ---
-        if self.tipo_validacion == "float":
-            texto_formateado = self.formatear_texto()
-            texto_formateado = texto_formateado.replace(",", ".")
-            try:
-                valor = float(texto_formateado)
-            except ValueError:
-                return False
-            min_valor = self.restricciones.get("min", float("-inf"))
-            max_valor = self.restricciones.get("max", float("inf"))
-            if min_valor <= valor <= max_valor:
-                return valor
-            return False
+        maximo = min(len(anterior), len(texto))
+        comunes_inicio = 0
+        while comunes_inicio < maximo and anterior[comunes_inicio] == texto[comunes_inicio]:
+            comunes_inicio += 1
+        comunes_fin = 0
+        while (comunes_fin < maximo - comunes_inicio
+               and anterior[-1 - comunes_fin] == texto[-1 - comunes_fin]):
+            comunes_fin += 1
+        fin_anterior = len(anterior) - comunes_fin
+        fin_nuevo = len(texto) - comunes_fin
+
+        if fin_nuevo > comunes_inicio:
+            corte = comunes_inicio if limite is None else min(max(limite, comunes_inicio), fin_nuevo)
+            tramos = []
+            if corte > comunes_inicio:
+                tramos += [texto[comunes_inicio:corte], ("mascara", "texto")]
+            if fin_nuevo > corte:
+                tramos += [texto[corte:fin_nuevo], ("mascara",)]
+            self.textbox.replace(f"1.{comunes_inicio}", f"1.{fin_anterior}", *tramos)
+        elif fin_anterior > comunes_inicio:
+            self.textbox.delete(f"1.{comunes_inicio}", f"1.{fin_anterior}")
+        self._texto_mostrado = texto
+
+        if limite is None:
+            self._limite_oscuro = None
+        elif fin_anterior > comunes_inicio or fin_nuevo > comunes_inicio:
+            self._mover_limite_oscuro(limite, comunes_inicio, fin_nuevo, fin_nuevo - fin_anterior)
+        else:
+            self._mover_limite_oscuro(limite)
 
-        # --- TV INT ---
-        if self.tipo_validacion == "int":
-            texto_formateado = self.formatear_texto()
-            try:
-                valor = int(texto_formateado)
-            except ValueError:
-                return False
-            min_valor = self.restricciones.get("min", float("-inf"))
-            max_valor = self.restricciones.get("max", float("inf"))
-            if min_valor <= valor <= max_valor:
-                return valor
-            return False
+    def _mover_limite_oscuro(self, limite, inicio=None, fin=None, desplazamiento=0):
+        """
+        Lleva la frontera de la etiqueta "texto" hasta limite con como mucho un tag_add y un tag_remove.
 
-        # --- TV STR con máscara de comodín (CP, teléfono, etc) ---
-        if self.tipo_validacion == "str" and self.caracter_comodin in self.mascara:
-            # Obtener el texto formateado completo
-            texto_formateado = self.formatear_texto(self.texto_ingresado)
-            
-            # Extraer caracteres editables usando la máscara como guía
-            caracteres_editables = ""
-            for i, char in enumerate(texto_formateado):
-                # Solo considerar posiciones existentes en la máscara
-                if i < len(self.mascara):
-                    # Solo agregar caracteres de posiciones editables
-                    if self.mascara[i] not in self.caracteres_fijos:
-                        caracteres_editables += char
-            
-            # Contar comodines en la máscara
-            num_comodines = sum(1 for char in self.mascara if char not in self.caracteres_fijos)
-            
-            if len(caracteres_editables) == num_comodines:
-                return texto_formateado
-            return False
+        Todos los caracteres llevan la etiqueta "mascara"; los anteriores a la frontera llevan
+        además "texto", que tiene prioridad. Tras un replace, los caracteres de [inicio, fin)
+        ya tienen su etiqueta correcta y los posteriores se han desplazado desplazamiento posiciones.
 
-        if self.tipo_validacion == "str" and "#" in self.mascara and all(char == "#" for char in self.mascara):
-            texto_formateado = self.formatear_texto()
-            longitud = self.mascara.count("#")
-            if texto_formateado.isalnum() and len(texto_formateado) == longitud:
-                return texto_formateado
-            return False
+        Args:
+            limite (int): Nueva frontera entre texto escrito y máscara.
+            inicio (int, optional): Inicio del tramo recién sustituido.
+            fin (int, optional): Fin del tramo recién sustituido.
+            desplazamiento (int): Diferencia de longitud introducida por el tramo sustituido.
+        """
+        anterior = self._limite_oscuro
+        if anterior is None or hasattr(self, "buscador"):
+            self.textbox.tag_remove("texto", "1.0", tk.END)
+            self.textbox.tag_add("mascara", "1.0", tk.END)
+            if limite:
+                self.textbox.tag_add("texto", "1.0", f"1.{limite}")
+            self._limite_oscuro = limite
+            return
+        if inicio is None:
+            inicio = fin = max(anterior, limite)
+
+        # Antes del tramo la frontera estaba en anterior; después, en anterior + desplazamiento
+        anterior_sufijo = anterior + desplazamiento
+        agregar = []
+        quitar = []
+        if anterior < min(limite, inicio):
+            agregar.append((anterior, min(limite, inicio)))
+        if limite < min(anterior, inicio):
+            quitar.append((limite, min(anterior, inicio)))
+        if max(fin, anterior_sufijo) < limite:
+            agregar.append((max(fin, anterior_sufijo), limite))
+        if max(fin, limite) < anterior_sufijo:
+            quitar.append((max(fin, limite), anterior_sufijo))
+
+        # Los tramos a agregar quedan antes del límite y los de quitar después: basta su envolvente
+        if agregar:
+            self.textbox.tag_add("texto", f"1.{min(a for a, _ in agregar)}", f"1.{max(b for _, b in agregar)}")
+        if quitar:
+            self.textbox.tag_remove("texto", f"1.{min(a for a, _ in quitar)}", f"1.{max(b for _, b in quitar)}")
+        self._limite_oscuro = limite
+
+    def _invalidar_render(self, event=None):
+        """Marca como desconocido el contenido del tk.Text tras un cambio hecho fuera de Textbox."""
+        self._texto_mostrado = None
+        self._limite_oscuro = None
 
-        # --- TV STR sin máscara ---
-        if self.tipo_validacion == "str":
-            max_length = self.restricciones.get('length', float('inf'))
-            if len(self.texto_ingresado) <= max_length:
-                return self.texto_ingresado
-            return False
+    def validar_dato(self):
+        """
+        Valida el texto ingresado con el MotorMascara del control. En float, int y máscaras de
+        comodín deja además normalizado texto_ingresado.
 
-        # --- TV EMAIL ---
-        if self.tipo_validacion == "email":
-            # Expresión regular para validar email
-            patron_email = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-            if re.match(patron_email, self.texto_ingresado):
-                return self.texto_ingresado
+        Returns:
+            Any: El valor (int o float) o el texto formateado si es válido; False en caso contrario.
+        """
+        resultado = self.motor.evaluar(self.texto_ingresado)
+        if self.tipo_validacion in ("float", "int") or (self.tipo_validacion == "str" and self.plan.posiciones_comodin):
+            self.texto_ingresado = resultado.texto_ingresado
+        if resultado.error:
+            if self.tipo_validacion in ("fecha", "momento"):
+                logger.debug("validar_dato %s: %s", self.tipo_validacion, MotorMascara.ERRORES[resultado.error])
             return False
-
-        # --- Por defecto ---
-        return self.texto_ingresado
+        return resultado.valor if self.tipo_validacion in ("float", "int") else resultado.formateado
 
     def manejar_suprimir(self, event):
         if self.texto_ingresado:
@@ -2443,150 +5946,34 @@ class Textbox(tk.Frame):
         Genera el texto final combinando la máscara con los datos ingresados por el usuario.
         Rellena los espacios vacíos con el carácter comodín y respeta los caracteres fijos.
         """
-        nuevo_texto = ''
-        indice_ingresado = 0
-        for char in self.mascara:
-            if char in self.caracteres_fijos:
-                nuevo_texto += char
-            elif indice_ingresado < len(self.texto_ingresado):
-                nuevo_texto += self.texto_ingresado[indice_ingresado]
-                indice_ingresado += 1
-            else:
-                nuevo_texto += char
-        return nuevo_texto
+        plan = self.plan
+        nuevo_texto = list(plan.mascara)
+        for posicion, caracter in zip(plan.posiciones_editables, self.texto_ingresado):
+            nuevo_texto[posicion] = caracter
+        return "".join(nuevo_texto)
 
     def calcular_primera_posicion_editable(self):
         """
         Calcula la primera posición editable en función de la máscara.
         Salta automáticamente los caracteres fijos iniciales.
         """
-        for i, char in enumerate(self.mascara):
-            if char not in self.caracteres_fijos:
-                return i
-        return len(self.mascara)  # Si solo hay caracteres fijos, coloca el cursor al final
+        # Si solo hay caracteres fijos, la primera posición editable es el final
+        return self.plan.primera_editable
 
     def calcular_posicion_cursor(self, texto_formateado, texto_ingresado):
         """
         Calcula la posición del cursor en el texto formateado,
         considerando el tipo de validación y la máscara.
         Compatible con cualquier carácter comodín.
+        El texto formateado se supone el de texto_ingresado; la posición sale de renderizar().
         """
-        # --- TV FECHA y TV HORA ---
-        if self.tipo_validacion in ("fecha", "hora"):
-            digitos = ''.join(c for c in texto_ingresado if c.isdigit())
-            indice_digito = 0
-            for i, char in enumerate(texto_formateado):
-                if char in self.caracteres_fijos:
-                    continue
-                if indice_digito < len(digitos):
-                    indice_digito += 1
-                else:
-                    return i
-            return len(texto_formateado)
-
-        # --- TV MOMENTO ---
-        if self.tipo_validacion == "momento":
-            if " " in texto_formateado:
-                mascara_fecha, mascara_hora = self.mascara.split(" ", 1)
-                partes_formateado = texto_formateado.split(" ", 1)
-                partes_ingresado = texto_ingresado.split(" ", 1)
-                fecha_formateada = partes_formateado[0]
-                hora_formateada = partes_formateado[1] if len(partes_formateado) > 1 else ""
-                fecha_ingresada = partes_ingresado[0]
-                hora_ingresada = partes_ingresado[1] if len(partes_ingresado) > 1 else ""
-                self.tipo_validacion = "fecha"
-                self.mascara = mascara_fecha
-                pos_fecha = self.calcular_posicion_cursor(fecha_formateada, fecha_ingresada)
-                if texto_ingresado.strip().endswith(" ") or hora_ingresada:
-                    self.tipo_validacion = "hora"
-                    self.mascara = mascara_hora
-                    pos_hora = self.calcular_posicion_cursor(hora_formateada, hora_ingresada)
-                    self.tipo_validacion = "momento"
-                    self.mascara = mascara_fecha + " " + mascara_hora
-                    return len(fecha_formateada) + 1 + pos_hora
-                else:
-                    self.tipo_validacion = "momento"
-                    self.mascara = mascara_fecha + " " + mascara_hora
-                    return pos_fecha
-            else:
-                self.tipo_validacion = "fecha"
-                pos_fecha = self.calcular_posicion_cursor(texto_formateado, texto_ingresado)
-                self.tipo_validacion = "momento"
-                return pos_fecha
-
-        # --- TV STR con máscara de comodín (incluye teléfono, CP, etc) ---
-        if self.tipo_validacion == "str" and self.caracter_comodin in self.mascara:
-            caracteres = ''.join(c for c in texto_ingresado if c.isalnum())
-            count = 0
-            for i, char in enumerate(self.mascara):
-                if char == self.caracter_comodin:
-                    if count < len(caracteres):
-                        count += 1
-                    else:
-                        return i
-            return len(self.mascara)
-
-        # --- TV FLOAT ---
-        if self.tipo_validacion == "float":
-            separador_decimal = "." if "." in self.mascara else ("," if "," in self.mascara else ".")
-            partes_mascara = self.mascara.split(separador_decimal)
-            longitud_entera = partes_mascara[0].count(self.caracter_comodin)
-            
-            # Normalizar el texto ingresado para usar el separador de la máscara
-            texto_ingresado_norm = texto_ingresado.replace(".", separador_decimal).replace(",", separador_decimal)
-            
-            # Obtener posición del separador decimal en el texto formateado
-            pos_separador = texto_formateado.find(separador_decimal)
-            
-            # Si hay separador en el texto ingresado, estamos en modo decimal
-            if separador_decimal in texto_ingresado_norm:
-                parte_decimal = texto_ingresado_norm.split(separador_decimal, 1)[1]
-                digitos_decimal = ''.join(c for c in parte_decimal if c.isdigit())
-                
-                if digitos_decimal:  # Si hay dígitos decimales
-                    # Posicionar después del último dígito decimal ingresado
-                    pos_cursor = pos_separador + 1 + len(digitos_decimal)
-                    return pos_cursor
-                # Si no hay dígitos decimales o acabamos de ingresar el separador
-                return pos_separador + 1
-            else:  # Si no hay separador, estamos en modo entero
-                # Posicionar justo antes del separador decimal
-                return pos_separador
-
-        # --- TV INT ---
-        if self.tipo_validacion == "int":
-            pos = len(texto_formateado)
-            return pos
-
-        # --- TV STR sin máscara ---
-        if self.tipo_validacion == "str":
-            pos = len(texto_ingresado)
-            return pos
-
-        # --- Por defecto ---
-        pos = len(texto_formateado)
-        return pos
+        return self.renderizar(texto_ingresado).cursor
   
     def _aplicar_separador_miles(self, texto, separador):
         """
         Aplica el separador de miles al texto formateado.
         """
-        partes = texto.split(separador)
-        parte_entera = partes[0]
-        parte_decimal = partes[1] if len(partes) > 1 else ""
-        
-        # Aplicar separador de miles a la parte entera
-        parte_entera_con_separadores = ""
-        for i, char in enumerate(reversed(parte_entera)):
-            if i > 0 and i % 3 == 0:
-                parte_entera_con_separadores = separador + parte_entera_con_separadores
-            parte_entera_con_separadores = char + parte_entera_con_separadores
-        
-        # Reconstruir el texto con los separadores de miles
-        if parte_decimal:
-            return f"{parte_entera_con_separadores}{separador}{parte_decimal}"
-        else:
-            return parte_entera_con_separadores
+        return MotorMascara.aplicar_separador_miles(texto, separador)
 
     def validar_y_formatear(self):
         """
@@ -2600,8 +5987,7 @@ class Textbox(tk.Frame):
         
         # Usar formatear_texto en lugar de formatear_con_mascara
         texto_formateado = self.formatear_texto()
-        self.textbox.delete("1.0", tk.END)
-        self.textbox.insert("1.0", texto_formateado)
+        self._mostrar_texto(texto_formateado)
         self.actualizar_colores()
         
         return True
@@ -2645,6 +6031,7 @@ class Textbox(tk.Frame):
     def set(self, valor):
         self.textbox.delete("1.0", tk.END)
         self.textbox.insert("1.0", valor)
+        self._invalidar_render()
         if hasattr(self, 'buscador'):
             self.buscador.reset_buffer(self.textbox, valor)
 
@@ -2985,6 +6372,9 @@ class OptionGroup(tk.Frame):
 class Combobox(tk.Frame):
     """
     Clase Combobox que representa un campo de selección desplegable con búsqueda.
+
+    Una lista o DataFrame usado como fuente_datos se lee una vez: si va a cambiar con el
+    formulario abierto, debe pasarse como ListaObservable o DataFrameObservable.
     """
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent)
@@ -3000,6 +6390,11 @@ class Combobox(tk.Frame):
         self.valores = config.valores
         self.estado = config.estado
         self.buffer_usuario = ""
+        # Carga diferida: el desplegable solo recibe las coincidencias actuales al abrirse. Las
+        # FuenteDatos y funciones siempre la usan: nunca se les piden todos sus elementos.
+        self.carga_diferida = (getattr(config, "carga_diferida", False)
+                               or FuenteDatos.desde(config.fuente_datos) is not None)
+        self.max_valores_desplegable = getattr(config, "max_valores_desplegable", 100)
         
         # Widgets
         self.label = ttk.Label(self, text=config.titulo_control)
@@ -3013,13 +6408,16 @@ class Combobox(tk.Frame):
         
         # Crear el buscador de cadenas si se proporcionan los parámetros
         if config.fuente_datos is not None:
+            datos = config.fuente_datos.datos if isinstance(config.fuente_datos, FuenteObservable) else config.fuente_datos
             # Si la fuente de datos es un DataFrame, lista o diccionario, actualizamos los valores
-            if isinstance(config.fuente_datos, pd.DataFrame):
-                self._actualizar_valores_desde_fuente(config.fuente_datos)
-            elif isinstance(config.fuente_datos, dict):
-                self._actualizar_valores_desde_fuente(config.fuente_datos)
-            elif isinstance(config.fuente_datos, list) and set(config.fuente_datos) != set(self.valores):
-                self._actualizar_valores_desde_fuente(config.fuente_datos)
+            if self.carga_diferida:
+                pass  # los valores se cargan en _cargar_valores_desplegable al abrir el desplegable
+            elif isinstance(datos, pd.DataFrame):
+                self._actualizar_valores_desde_fuente(datos)
+            elif isinstance(datos, dict):
+                self._actualizar_valores_desde_fuente(datos)
+            elif isinstance(datos, list) and set(datos) != set(self.valores):
+                self._actualizar_valores_desde_fuente(datos)
             
             # Modificar el estado para permitir la edición si se usa búsqueda
             if self.estado == "readonly":
@@ -3032,11 +6430,62 @@ class Combobox(tk.Frame):
                 modo_busqueda=config.modo_busqueda,
                 sensible_mayusculas=config.sensible_mayusculas,
                 df_columna_id=getattr(config, "df_columna_id", None),
-                df_columna_valor=getattr(config, "df_columna_valor", None)
+                df_columna_valor=getattr(config, "df_columna_valor", None),
+                limite_resultados=self.max_valores_desplegable if self.carga_diferida else None,
+                ruta_cache=getattr(config, "ruta_cache", None),
+                indice_compacto=getattr(config, "indice_compacto", False),
+                df_columnas_busqueda=getattr(config, "df_columnas_busqueda", None),
+                orden_resultados=getattr(config, "orden_resultados", None),
+                historial_uso=getattr(config, "historial_uso", None),
+                clave_historial=_clave_historial(self, config)
             )
+
+            if self.carga_diferida:
+                self.combobox.configure(postcommand=self._cargar_valores_desplegable)
+            self.combobox.bind("<<ComboboxSelected>>", self._al_seleccionar)
+            self.buscador.al_cambiar_fuente = self._aplicar_cambio_fuente
             
         if hasattr(self, 'buscador'):
             self.combobox.bind("<KeyPress>", lambda e: self.buscador.on_keypress(self.combobox, e, "combobox"))
+
+    def _cargar_valores_desplegable(self):
+        """
+        Rellena el desplegable justo antes de abrirse (carga diferida) con las coincidencias
+        del texto escrito, limitadas a max_valores_desplegable. Sin texto, muestra los
+        primeros valores de la fuente.
+        """
+        texto = self.buscador.buffers.get(self.combobox, "") or self.combobox.get()
+        if texto:
+            coincidencias = self.buscador.busca_cadena(
+                texto, max_resultados=self.max_valores_desplegable, widget=self.combobox)
+        else:
+            coincidencias = self.buscador.primeros_valores(self.max_valores_desplegable)
+        self.combobox['values'] = [valor for valor, _ in coincidencias]
+
+    def _aplicar_cambio_fuente(self, cambio):
+        """
+        Aplica al desplegable un cambio de una fuente observable. En carga diferida no hay
+        nada que hacer: los valores se piden a la fuente cada vez que se abre.
+        """
+        if self.carga_diferida:
+            return
+        if cambio.tipo == "recargar":
+            self._actualizar_valores_desde_fuente(self.buscador.fuente_datos)
+            return
+        valores = list(self.combobox['values'])
+        if cambio.tipo == "insertar":
+            valores.insert(cambio.posicion, self.buscador.valor_mostrado(cambio))
+        elif cambio.tipo == "actualizar":
+            valores[cambio.posicion] = self.buscador.valor_mostrado(cambio)
+        elif cambio.tipo == "eliminar":
+            del valores[cambio.posicion]
+        self.combobox['values'] = valores
+
+    def _al_seleccionar(self, event=None):
+        """Sincroniza el buffer de búsqueda con el valor elegido en el desplegable y lo anota como selección."""
+        valor = self.combobox.get()
+        self.buscador.reset_buffer(self.combobox, valor)
+        self.buscador.registrar_seleccion(valor)
     
     def _actualizar_valores(self, valores):
         """Actualiza los valores del combobox."""
@@ -3065,9 +6514,10 @@ class Combobox(tk.Frame):
             # Configurar el estado del combobox para permitir búsqueda
             if hasattr(self, 'buscador'):
                 self.combobox.configure(state="normal")
-        elif callable(fuente_datos):
+        elif FuenteDatos.desde(fuente_datos) is not None:
+            # Solo la primera página: una fuente externa puede no caber en el desplegable
             try:
-                valores = fuente_datos(obtener_todos=True)
+                valores = FuenteDatos.desde(fuente_datos).buscar("", limite=self.max_valores_desplegable)
                 if valores:
                     self.combobox['values'] = [valor for valor, _ in valores]
             except Exception as e:
@@ -3093,6 +6543,12 @@ class Combobox(tk.Frame):
         """Devuelve el widget interno (ttk.Combobox)."""
         return self.combobox
 
+    def destroy(self):
+        """Libera el índice de búsqueda compartido antes de destruir el control."""
+        if hasattr(self, 'buscador'):
+            self.buscador.liberar()
+        super().destroy()
+
     def _evento_keyrelease_usuario(self, event):
         if hasattr(self, 'buscador'):
             self.buscador.autocompletar_en_widget(self.combobox, self.combobox.get(), tipo_widget="combobox")
@@ -3100,7 +6556,12 @@ class Combobox(tk.Frame):
 class Listbox(tk.Frame):
     """
     Clase Listbox que representa una lista de selección con búsqueda.
+
+    Una lista o DataFrame usado como fuente_datos se lee una vez: si va a cambiar con el
+    formulario abierto, debe pasarse como ListaObservable o DataFrameObservable.
     """
+    PAGINA_FUENTE = 100  # elementos que se muestran sin filtrar de una FuenteDatos sin limite_resultados
+
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent)
         
@@ -3115,6 +6576,30 @@ class Listbox(tk.Frame):
         self.altura = config.altura
         self.seleccion_multiple = config.seleccion_multiple
         self.titulo_busqueda = config.titulo_busqueda
+        self.limite_resultados = getattr(config, "limite_resultados", None)
+        self.busqueda_asincrona = getattr(config, "busqueda_asincrona", False)
+        # Las consultas a fuentes de coste alto (p. ej. en red) nunca se hacen en el hilo de Tk
+        if getattr(FuenteDatos.desde(config.fuente_datos), "coste", None) == "alto":
+            self.busqueda_asincrona = True
+        self.retardo_busqueda_ms = getattr(config, "retardo_busqueda_ms", 150)
+
+        # Modo virtual: los datos viven en Python y el Listbox solo pinta las filas visibles
+        self.virtual = getattr(config, "virtual", False)
+        self.margen_virtual = getattr(config, "margen_virtual", 10)
+        self._datos = []            # valores mostrados (modo virtual)
+        self._seleccion = set()     # índices seleccionados sobre self._datos (modo virtual)
+        self._primera_visible = 0
+        self._inicio_render = 0
+        self._fin_render = 0
+        self._valores_mostrados = []  # filas presentes en el Listbox (modo normal)
+        self._lista_completa = False  # True si se muestra la fuente completa, sin filtrar
+        self._valores_registrados = set()  # selección ya anotada en el historial del buscador
+
+        # Estado de la búsqueda asíncrona: solo se aplica el resultado de la última generación
+        self._generacion_busqueda = 0
+        self._busqueda_programada = None
+        self._busqueda_en_curso = None
+        self._ejecutor_busqueda = None
         
         # Widgets
         self.label = ttk.Label(self, text=config.titulo_control)
@@ -3129,6 +6614,11 @@ class Listbox(tk.Frame):
         
         self.entry_busqueda = ttk.Entry(self.frame_busqueda, width=self.ancho)
         self.entry_busqueda.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        # Contador de resultados para búsquedas acotadas ("N+ resultados")
+        if self.limite_resultados:
+            self.label_resultados = ttk.Label(self.frame_busqueda, text="")
+            self.label_resultados.grid(row=0, column=2, padx=5, pady=5, sticky="w")
         
         # Listbox
         self.listbox = tk.Listbox(
@@ -3143,12 +6633,24 @@ class Listbox(tk.Frame):
         self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.listbox.yview)
         self.scrollbar.grid(row=2, column=2, sticky="ns")
         self.listbox.configure(yscrollcommand=self.scrollbar.set)
+
+        if self.virtual:
+            # La geometría de la barra se calcula sobre los datos completos, no sobre las filas pintadas
+            self.scrollbar.configure(command=self._desplazar_virtual)
+            self.listbox.configure(yscrollcommand=self._al_desplazar_listbox)
+            self.listbox.bind("<<ListboxSelect>>", self._sincronizar_seleccion_virtual)
+            self.listbox.bind("<MouseWheel>", self._rueda_virtual)
+            self.listbox.bind("<Button-4>", self._rueda_virtual)
+            self.listbox.bind("<Button-5>", self._rueda_virtual)
+            self.listbox.bind("<Up>", lambda e: self._mover_activo_virtual(-1))
+            self.listbox.bind("<Down>", lambda e: self._mover_activo_virtual(1))
         
         # Crear el buscador de cadenas si se proporcionan los parámetros
         if config.fuente_datos is not None:
+            datos = config.fuente_datos.datos if isinstance(config.fuente_datos, FuenteObservable) else config.fuente_datos
             # Si la fuente de datos es un DataFrame o una lista, actualizamos los valores
-            if isinstance(config.fuente_datos, (pd.DataFrame, list)):
-                self._actualizar_valores_desde_fuente(config.fuente_datos)
+            if isinstance(datos, (pd.DataFrame, list)):
+                self._actualizar_valores_desde_fuente(datos)
             
             # Crear BuscadorCadena - se encarga automáticamente de todos los eventos
             self.buscador = BuscadorCadena(
@@ -3157,29 +6659,221 @@ class Listbox(tk.Frame):
                 modo_busqueda=config.modo_busqueda,
                 sensible_mayusculas=config.sensible_mayusculas,
                 df_columna_id=getattr(config, "df_columna_id", None),
-                df_columna_valor=getattr(config, "df_columna_valor", None)
+                df_columna_valor=getattr(config, "df_columna_valor", None),
+                limite_resultados=self.limite_resultados,
+                ruta_cache=getattr(config, "ruta_cache", None),
+                indice_compacto=getattr(config, "indice_compacto", False),
+                df_columnas_busqueda=getattr(config, "df_columnas_busqueda", None),
+                orden_resultados=getattr(config, "orden_resultados", None),
+                historial_uso=getattr(config, "historial_uso", None),
+                clave_historial=_clave_historial(self, config)
             )            
+            self.buscador.al_cambiar_fuente = self._aplicar_cambio_fuente
             self.entry_busqueda.bind("<KeyRelease>", self._actualizar_busqueda)                            
+            if self.seleccion_multiple:
+                self.listbox.bind("<<ListboxSelect>>", self._registrar_seleccion, add="+")
+            else:
+                # En selección simple las flechas también seleccionan: cuenta el clic o la confirmación
+                self.listbox.bind("<ButtonRelease-1>", self._registrar_seleccion, add="+")
+                self.listbox.bind("<Return>", self._registrar_seleccion, add="+")
+            if self.buscador.fuente_externa() is not None:
+                self._mostrar_primera_pagina()
+
+    def _registrar_seleccion(self, event=None):
+        """Anota en el buscador los valores que el usuario acaba de seleccionar."""
+        seleccion = self.get_selected_all()
+        for valor in seleccion:
+            if valor not in self._valores_registrados:
+                self.buscador.registrar_seleccion(valor)
+        self._valores_registrados = set(seleccion)
+
+    def _mostrar_primera_pagina(self):
+        """
+        Muestra los primeros elementos de una FuenteDatos (limite_resultados, o PAGINA_FUENTE)
+        en lugar de pedirle todos. Con búsqueda asíncrona la consulta se hace con buscar_async.
+        """
+        limite = self.limite_resultados or self.PAGINA_FUENTE
+        if not self.busqueda_asincrona:
+            self._mostrar_pagina(self.buscador.primeros_valores(limite))
+            return
+        generacion = self._generacion_busqueda
+        futuro = self.buscador.fuente_externa().buscar_async("", self.buscador.modo_busqueda, limite)
+        self._busqueda_en_curso = futuro
+
+        def terminar(futuro):
+            if futuro.cancelled():
+                return
+            try:
+                self.after(0, self._aplicar_primera_pagina, futuro, generacion)
+            except (RuntimeError, tk.TclError):
+                pass
+
+        futuro.add_done_callback(terminar)
+
+    def _aplicar_primera_pagina(self, futuro, generacion):
+        """Pinta en el hilo de Tk la primera página si el usuario no ha empezado a buscar."""
+        if generacion != self._generacion_busqueda:
+            return
+        try:
+            self._mostrar_pagina(futuro.result())
+        except Exception as e:
+            logger.error(f"Error al obtener valores desde la fuente de datos: {e}")
+
+    def _mostrar_pagina(self, coincidencias):
+        """Muestra una página de la fuente sin filtrar (sin seleccionar ningún elemento)."""
+        self._lista_completa = False
+        valores = [str(valor) for valor, _ in coincidencias]
+        if self.virtual:
+            self._cargar_datos_virtuales(valores)
+        else:
+            self._aplicar_diferencias(valores)
 
     def _actualizar_valores_desde_fuente(self, fuente_datos):
         """Actualiza los valores del listbox desde la fuente de datos."""
+        self._lista_completa = True
+        if self.virtual:
+            self._cargar_datos_virtuales(self._valores_de_fuente(fuente_datos))
+            return
+
+        # Una sola llamada a Tcl para toda la lista
         self.listbox.delete(0, tk.END)
-        
+        valores = self._valores_de_fuente(fuente_datos)
+        if valores:
+            self.listbox.insert(tk.END, *valores)
+        self._valores_mostrados = valores
+  
+    def _valores_de_fuente(self, fuente_datos):
+        """Extrae de la fuente de datos la lista de valores (str) a mostrar."""
         if isinstance(fuente_datos, list):
-            for item in fuente_datos:
-                self.listbox.insert(tk.END, str(item))
-        elif isinstance(fuente_datos, dict):
-            for valor in fuente_datos.values():
-                self.listbox.insert(tk.END, str(valor))
-        elif callable(fuente_datos):
+            return [str(item) for item in fuente_datos]
+        if isinstance(fuente_datos, dict):
+            return [str(valor) for valor in fuente_datos.values()]
+        if FuenteDatos.desde(fuente_datos) is not None:
+            # Solo la primera página: una fuente externa puede no caber en memoria
             try:
-                valores = fuente_datos(obtener_todos=True)
-                if valores:
-                    for valor, _ in valores:
-                        self.listbox.insert(tk.END, str(valor))
+                valores = FuenteDatos.desde(fuente_datos).buscar("", limite=self.limite_resultados or self.PAGINA_FUENTE)
+                return [str(valor) for valor, _ in valores] if valores else []
             except Exception as e:
                 print(f"Error al obtener valores desde fuente personalizada: {e}")
-  
+        return []
+
+    # === MODO VIRTUAL ===
+
+    def _cargar_datos_virtuales(self, valores, seleccion=None):
+        """
+        Sustituye los datos del modo virtual y vuelve a pintar desde la primera fila.
+
+        Args:
+            valores (list): Valores (str) a mostrar.
+            seleccion (iterable, optional): Índices de valores a dejar seleccionados.
+        """
+        self._datos = valores
+        self._seleccion = set(seleccion) if seleccion else set()
+        self._inicio_render = self._fin_render = 0
+        self._renderizar_ventana(0, forzar=True)
+
+    def _renderizar_ventana(self, primera, forzar=False):
+        """
+        Pinta en el Listbox las filas visibles a partir de `primera` más un margen por
+        arriba y por abajo. Si las filas visibles ya están pintadas solo se desplaza la vista.
+        """
+        total = len(self._datos)
+        primera = max(0, min(int(primera), total - self.altura))
+        self._primera_visible = primera
+        ultima = min(total, primera + self.altura)
+
+        if forzar or primera < self._inicio_render or ultima > self._fin_render:
+            inicio = max(0, primera - self.margen_virtual)
+            fin = min(total, ultima + self.margen_virtual)
+            self.listbox.delete(0, tk.END)
+            if fin > inicio:
+                self.listbox.insert(tk.END, *self._datos[inicio:fin])
+            self._inicio_render, self._fin_render = inicio, fin
+            # Reaplicar la selección de las filas pintadas
+            if len(self._seleccion) < fin - inicio:
+                filas = [i for i in self._seleccion if inicio <= i < fin]
+            else:
+                filas = [i for i in range(inicio, fin) if i in self._seleccion]
+            for indice in filas:
+                self.listbox.selection_set(indice - inicio)
+
+        self.listbox.yview(primera - self._inicio_render)
+        self._actualizar_scrollbar_virtual()
+
+    def _actualizar_scrollbar_virtual(self):
+        """Coloca la barra de desplazamiento según la posición sobre los datos completos."""
+        total = len(self._datos)
+        if total <= self.altura:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self._primera_visible / total, (self._primera_visible + self.altura) / total)
+
+    def _desplazar_virtual(self, *args):
+        """Atiende los comandos de la barra de desplazamiento ("moveto" y "scroll")."""
+        if not args:
+            return
+        if args[0] == "moveto":
+            primera = float(args[1]) * len(self._datos)
+        elif args[0] == "scroll":
+            paso = self.altura if args[2] == "pages" else 1
+            primera = self._primera_visible + int(args[1]) * paso
+        else:
+            return
+        self._renderizar_ventana(primera)
+
+    def _rueda_virtual(self, event):
+        """Desplaza la ventana virtual con la rueda del ratón."""
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self._renderizar_ventana(self._primera_visible - 3)
+        else:
+            self._renderizar_ventana(self._primera_visible + 3)
+        return "break"
+
+    def _al_desplazar_listbox(self, primera, ultima):
+        """
+        Recibe los desplazamientos que hace el propio Listbox (por ejemplo, al arrastrar una
+        selección) y mantiene sincronizada la fila visible y la barra de desplazamiento.
+        """
+        filas_pintadas = self._fin_render - self._inicio_render
+        if not filas_pintadas:
+            self._actualizar_scrollbar_virtual()
+            return
+        primera_visible = self._inicio_render + int(round(float(primera) * filas_pintadas))
+        if primera_visible != self._primera_visible:
+            self.after_idle(self._renderizar_ventana, primera_visible)
+        else:
+            self._actualizar_scrollbar_virtual()
+
+    def _sincronizar_seleccion_virtual(self, event=None):
+        """Traslada la selección de las filas pintadas a los índices de los datos completos."""
+        seleccion_visible = {self._inicio_render + i for i in self.listbox.curselection()}
+        if not self.seleccion_multiple:
+            self._seleccion = seleccion_visible
+            return
+        for indice in range(self._inicio_render, self._fin_render):
+            if indice in seleccion_visible:
+                self._seleccion.add(indice)
+            else:
+                self._seleccion.discard(indice)
+
+    def _mover_activo_virtual(self, paso):
+        """Mueve la selección con las flechas recorriendo todos los datos, no solo las filas pintadas."""
+        if not self._datos:
+            return "break"
+        actual = min(self._seleccion) if self._seleccion else self._primera_visible - paso
+        nuevo = max(0, min(len(self._datos) - 1, actual + paso))
+        if not self.seleccion_multiple:
+            self._seleccion = {nuevo}
+        if nuevo < self._primera_visible:
+            self._renderizar_ventana(nuevo, forzar=True)
+        elif nuevo >= self._primera_visible + self.altura:
+            self._renderizar_ventana(nuevo - self.altura + 1, forzar=True)
+        else:
+            self._renderizar_ventana(self._primera_visible, forzar=True)
+        self.listbox.activate(nuevo - self._inicio_render)
+        self.listbox.event_generate("<<ListboxSelect>>")
+        return "break"
+
     def busca_cadena(self, texto, modo_busqueda=None, sensible_mayusculas=None, max_resultados=None):
         """Delega la búsqueda al BuscadorCadena si existe."""
         if hasattr(self, 'buscador'):
@@ -3188,39 +6882,205 @@ class Listbox(tk.Frame):
 
     def _actualizar_busqueda(self, event):
         """Actualiza la búsqueda en tiempo real con autocompletado"""
+        if self.busqueda_asincrona:
+            self._programar_busqueda()
+            return
+
         texto = self.entry_busqueda.get()
         
         if hasattr(self, 'buscador'):
-            # 1. Buscar coincidencias
-            coincidencias = self.buscador.busca_cadena(texto)
-            
-            # 2. Actualizar Listbox con resultados
-            self._actualizar_lista(coincidencias)
-            
-            # 3. Autocompletar el campo de búsqueda
-            if coincidencias and texto:
-                self.buscador.autocompletar_en_widget(
-                    self.entry_busqueda, 
-                    texto, 
-                    "entry"
-                ) 
+            # Buscar coincidencias (estrechando la búsqueda anterior del mismo campo)
+            coincidencias = self.buscador.busca_cadena(texto, widget=self.entry_busqueda)
+            self._mostrar_resultados(coincidencias, texto)
+
+    def _mostrar_resultados(self, coincidencias, texto):
+        """Pinta el resultado de una búsqueda ya aplicada al buscador (síncrona o asíncrona)."""
+        # 1. Actualizar Listbox con resultados
+        self._actualizar_lista(coincidencias)
+        self._actualizar_contador(coincidencias, texto)
+
+        # 2. Autocompletar el campo de búsqueda
+        if coincidencias and texto:
+            self.buscador.autocompletar_en_widget(
+                self.entry_busqueda,
+                texto,
+                "entry",
+                coincidencias=coincidencias
+            )
   
+    def _programar_busqueda(self):
+        """
+        Programa la búsqueda tras el retardo configurado (debounce). Cada pulsación
+        cancela la búsqueda pendiente y deja obsoletas las que ya estén en marcha.
+        """
+        self._generacion_busqueda += 1
+        if self._busqueda_programada is not None:
+            self.after_cancel(self._busqueda_programada)
+        self._busqueda_programada = self.after(
+            self.retardo_busqueda_ms, self._lanzar_busqueda, self._generacion_busqueda)
+
+    def _lanzar_busqueda(self, generacion):
+        """Envía la búsqueda al hilo de trabajo; su resultado vuelve al hilo de Tk al terminar."""
+        self._busqueda_programada = None
+        if generacion != self._generacion_busqueda or not hasattr(self, 'buscador'):
+            return
+        texto = self.entry_busqueda.get()
+
+        # Una búsqueda anterior que aún no ha empezado ya no es necesaria
+        if self._busqueda_en_curso is not None:
+            self._busqueda_en_curso.cancel()
+        if self._ejecutor_busqueda is None:
+            self._ejecutor_busqueda = ThreadPoolExecutor(max_workers=1, thread_name_prefix="busqueda_listbox")
+        # El hilo de trabajo solo calcula la respuesta; el buscador y los widgets se actualizan en Tk
+        futuro = self.buscador.buscar_async(texto, self._ejecutor_busqueda, widget=self.entry_busqueda)
+        self._busqueda_en_curso = futuro
+        futuro.add_done_callback(lambda futuro: self._al_terminar_busqueda(futuro, generacion, texto))
+
+    def _al_terminar_busqueda(self, futuro, generacion, texto):
+        """Se llama en el hilo de trabajo al terminar la búsqueda: pasa el resultado al hilo de Tk."""
+        if futuro.cancelled():
+            return
+        try:
+            self.after(0, self._aplicar_busqueda, futuro, generacion, texto)
+        except (RuntimeError, tk.TclError):
+            # La aplicación se está cerrando
+            pass
+
+    def _aplicar_busqueda(self, futuro, generacion, texto):
+        """Aplica el resultado en el hilo de Tk si sigue siendo el de la última pulsación."""
+        if generacion != self._generacion_busqueda:
+            return
+        try:
+            respuesta = futuro.result()
+        except Exception as e:
+            logger.error(f"Error en la búsqueda asíncrona del Listbox: {e}")
+            return
+        self._mostrar_resultados(self.buscador.aplicar_busqueda(respuesta), texto)
+
+    def destroy(self):
+        """Cancela las búsquedas pendientes y libera el hilo de trabajo antes de destruir el control."""
+        self._generacion_busqueda += 1
+        if self._busqueda_programada is not None:
+            self.after_cancel(self._busqueda_programada)
+            self._busqueda_programada = None
+        if self._ejecutor_busqueda is not None:
+            self._ejecutor_busqueda.shutdown(wait=False, cancel_futures=True)
+            self._ejecutor_busqueda = None
+        if hasattr(self, 'buscador'):
+            self.buscador.liberar()
+        super().destroy()
+
+    def _actualizar_contador(self, coincidencias, texto, hay_mas=None):
+        """Muestra cuántos resultados hay; con búsqueda acotada indica si existen más ("N+")."""
+        if not hasattr(self, 'label_resultados'):
+            return
+        if not texto:
+            self.label_resultados.configure(text="")
+            return
+        if hay_mas is None:
+            hay_mas = self.buscador.hay_mas
+        sufijo = "+" if hay_mas else ""
+        self.label_resultados.configure(text=f"{len(coincidencias)}{sufijo} resultados")
+
     def _actualizar_lista(self, coincidencias):
         """Actualiza el Listbox con las coincidencias encontradas"""
-        # Limpiar lista existente
-        self.listbox.delete(0, tk.END)
-        
-        # Agregar nuevas coincidencias
-        for valor, _ in coincidencias:
-            self.listbox.insert(tk.END, valor)
+        self._lista_completa = False
+        # La selección automática del primer resultado no es una elección del usuario
+        self._valores_registrados = set()
+        if self.virtual:
+            self._cargar_datos_virtuales([valor for valor, _ in coincidencias],
+                                         seleccion=[0] if coincidencias else None)
+            if coincidencias:
+                self.listbox.activate(0)
+            return
+
+        # Sustituir solo el tramo de filas que cambia respecto a la lista actual
+        self._aplicar_diferencias([valor for valor, _ in coincidencias])
         
         # Seleccionar primer elemento si hay resultados
         if coincidencias:
+            self.listbox.selection_clear(0, tk.END)
             self.listbox.selection_set(0)
             self.listbox.activate(0)  
+
+    def _aplicar_cambio_fuente(self, cambio):
+        """
+        Aplica un cambio de una fuente observable. Si se muestra la fuente completa solo se
+        toca la fila afectada; si hay un filtro activo se repite la búsqueda sobre el índice
+        ya actualizado.
+
+        Args:
+            cambio (CambioFuente): Cambio emitido por la fuente.
+        """
+        texto = self.entry_busqueda.get()
+        if texto:
+            coincidencias = self.buscador.busca_cadena(texto, widget=self.entry_busqueda)
+            self._actualizar_lista(coincidencias)
+            self._actualizar_contador(coincidencias, texto)
+            return
+        # Las filas pintadas deben corresponder una a una con la fuente antes del cambio
+        mostrados = self._datos if self.virtual else self._valores_mostrados
+        antes = len(self.buscador.fuente_datos) + {"insertar": -1, "eliminar": 1}.get(cambio.tipo, 0)
+        if cambio.tipo == "recargar" or not self._lista_completa or len(mostrados) != antes:
+            self._actualizar_valores_desde_fuente(self.buscador.fuente_datos)
+            return
+
+        p = cambio.posicion
+        valor = self.buscador.valor_mostrado(cambio)
+        if self.virtual:
+            if cambio.tipo == "insertar":
+                self._datos.insert(p, valor)
+                self._seleccion = {i + 1 if i >= p else i for i in self._seleccion}
+            elif cambio.tipo == "actualizar":
+                self._datos[p] = valor
+            elif cambio.tipo == "eliminar":
+                del self._datos[p]
+                self._seleccion = {i - 1 if i > p else i for i in self._seleccion if i != p}
+            self._renderizar_ventana(self._primera_visible, forzar=p <= self._fin_render)
+            return
+
+        if cambio.tipo in ("actualizar", "eliminar"):
+            seleccionada = self.listbox.selection_includes(p)
+            self.listbox.delete(p)
+            del self._valores_mostrados[p]
+        if cambio.tipo in ("insertar", "actualizar"):
+            self.listbox.insert(p, valor)
+            self._valores_mostrados.insert(p, valor)
+            if cambio.tipo == "actualizar" and seleccionada:
+                self.listbox.selection_set(p)
+
+    def _aplicar_diferencias(self, nuevos):
+        """
+        Actualiza las filas del Listbox con un número constante de llamadas a Tcl.
+
+        Conserva el prefijo y el sufijo comunes entre la lista mostrada y la nueva,
+        y sustituye el tramo intermedio con un único delete y un único insert.
+
+        Args:
+            nuevos (list): Valores (str) que debe mostrar el Listbox.
+        """
+        actuales = self._valores_mostrados
+        limite = min(len(actuales), len(nuevos))
+        comunes_inicio = 0
+        while comunes_inicio < limite and actuales[comunes_inicio] == nuevos[comunes_inicio]:
+            comunes_inicio += 1
+        comunes_fin = 0
+        while (comunes_fin < limite - comunes_inicio
+               and actuales[-1 - comunes_fin] == nuevos[-1 - comunes_fin]):
+            comunes_fin += 1
+
+        fin_actual = len(actuales) - comunes_fin
+        fin_nuevo = len(nuevos) - comunes_fin
+        if fin_actual > comunes_inicio:
+            self.listbox.delete(comunes_inicio, fin_actual - 1)
+        if fin_nuevo > comunes_inicio:
+            self.listbox.insert(comunes_inicio, *nuevos[comunes_inicio:fin_nuevo])
+        self._valores_mostrados = nuevos
         
     def get_selected(self):
         """Obtiene el valor seleccionado en el listbox."""
+        if self.virtual:
+            return self._datos[min(self._seleccion)] if self._seleccion else None
         seleccion = self.listbox.curselection()
         if seleccion:
             return self.listbox.get(seleccion[0])
@@ -3228,6 +7088,8 @@ class Listbox(tk.Frame):
     
     def get_selected_all(self):
         """Obtiene todos los valores seleccionados en el listbox."""
+        if self.virtual:
+            return [self._datos[i] for i in sorted(self._seleccion)]
         seleccion = self.listbox.curselection()
         return [self.listbox.get(i) for i in seleccion]
 
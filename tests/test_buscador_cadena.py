@@ -0,0 +1,144 @@
+"""
+Pruebas de BuscadorCadena sin widgets: paginación de resultados, registro de índices y
+sugerencias del historial de uso.
+"""
+import gc
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Formulario import (BuscadorCadena, ConfiguracionCombobox, HistorialUso, ListaObservable,  # noqa: E402
+                        OrdenPorLongitud, OrdenResultados, _clave_historial, registro_indices)
+
+VALORES = [f"a{i:03d}" for i in range(100)]
+
+
+def _buscador(caso):
+    if caso == "acotado":
+        return BuscadorCadena(VALORES, limite_resultados=10)
+    if caso == "ordenado":
+        return BuscadorCadena(VALORES, limite_resultados=10, orden_resultados=OrdenResultados(OrdenPorLongitud()))
+    return BuscadorCadena(VALORES)
+
+
+@pytest.mark.parametrize("caso", ["sin_limite", "acotado", "ordenado"])
+@pytest.mark.parametrize("desplazamiento, esperado, hay_mas", [
+    (0, VALORES[:10], True),
+    (10, VALORES[10:20], True),
+    (90, VALORES[90:], False),
+    (95, VALORES[95:], False),
+    (100, [], False),
+])
+def test_paginas_de_resultados(caso, desplazamiento, esperado, hay_mas):
+    buscador = _buscador(caso)
+    resultados = buscador.busca_cadena("a", max_resultados=10, desplazamiento=desplazamiento)
+    assert [valor for valor, _ in resultados] == esperado
+    assert buscador.hay_mas is hay_mas
+
+
+@pytest.mark.parametrize("caso", ["sin_limite", "acotado", "ordenado"])
+def test_paginas_con_busqueda_previa_del_widget(caso):
+    buscador = _buscador(caso)
+    widget = object()
+    buscador.busca_cadena("a", max_resultados=10, widget=widget)
+    resultados = buscador.busca_cadena("a", max_resultados=10, widget=widget, desplazamiento=10)
+    assert [valor for valor, _ in resultados] == VALORES[10:20]
+    assert buscador.hay_mas is True
+
+
+def test_buscadores_sueltos_no_retienen_indices():
+    inicial = len(registro_indices)
+    buscadores = [BuscadorCadena([f"v{j}-{i}" for i in range(50)]) for j in range(5)]
+    for buscador in buscadores:
+        buscador.busca_cadena("v")
+    assert len(registro_indices) == inicial + 5
+    del buscadores, buscador
+    gc.collect()
+    assert len(registro_indices) == inicial
+
+
+def test_buscador_observable_recolectado_se_desuscribe():
+    inicial = len(registro_indices)
+    fuente = ListaObservable(["uno", "dos"])
+    buscador = BuscadorCadena(fuente)
+    buscador.busca_cadena("u")
+    fuente.append("tres")
+    assert [valor for valor, _ in buscador.busca_cadena("t")] == ["tres"]
+    del buscador
+    gc.collect()
+    assert len(registro_indices) == inicial
+    assert fuente._suscriptores() == []
+
+
+def test_indice_compartido_hasta_soltar_el_ultimo_buscador():
+    inicial = len(registro_indices)
+    valores = ["a", "b"]
+    primero, segundo = BuscadorCadena(valores), BuscadorCadena(valores)
+    primero.busca_cadena("a")
+    segundo.busca_cadena("a")
+    assert primero._indice is segundo._indice
+    del primero
+    gc.collect()
+    assert len(registro_indices) == inicial + 1
+    segundo.liberar()
+    assert len(registro_indices) == inicial
+
+
+class _Entrada:
+    """Widget de texto mínimo con la interfaz que usa autocompletar_en_widget."""
+    def __init__(self):
+        self.texto = ""
+
+    def delete(self, *args):
+        self.texto = ""
+
+    def insert(self, indice, texto):
+        self.texto = texto
+
+    def tag_add(self, *args):
+        pass
+
+    def mark_set(self, *args):
+        pass
+
+
+def test_sugerencia_frecuente_de_otra_fuente_no_se_usa():
+    historial = HistorialUso()
+    BuscadorCadena(["Zeta", "Zorro"], historial_uso=historial, clave_historial="ciudad").registrar_seleccion("Zeta")
+    buscador = BuscadorCadena(["Alfa", "Beta"], historial_uso=historial, clave_historial="ciudad")
+    entrada = _Entrada()
+    buscador.autocompletar_en_widget(entrada, "z")
+    assert entrada.texto == "z"
+    assert buscador._sugerencia_aceptable is False
+
+
+def test_sugerencia_frecuente_borrada_de_la_fuente():
+    historial = HistorialUso()
+    fuente = ListaObservable(["Zorro", "Zeta"])
+    buscador = BuscadorCadena(fuente, historial_uso=historial, clave_historial="ciudad")
+    buscador.registrar_seleccion("Zeta")
+    entrada = _Entrada()
+    buscador.autocompletar_en_widget(entrada, "z")
+    assert entrada.texto == "Zeta"
+    fuente.remove("Zeta")
+    buscador.autocompletar_en_widget(entrada, "z")
+    assert entrada.texto == "Zorro"
+    assert buscador._sugerencia_aceptable is True
+
+
+def test_clave_historial_por_defecto_distingue_controles():
+    class Control:
+        def __init__(self, ruta):
+            self.ruta = ruta
+
+        def __str__(self):
+            return self.ruta
+
+    config = ConfiguracionCombobox(titulo_control="Ciudad")
+    assert _clave_historial(Control(".!frame.!combobox"), config) != \
+        _clave_historial(Control(".!frame.!combobox2"), config)
+    config.clave_historial = "ciudad"
+    assert _clave_historial(Control(".!frame.!combobox"), config) == "ciudad"
@@ -0,0 +1,271 @@
+"""
+Pruebas de regresión de MotorMascara.
+
+Los casos de CASOS se obtuvieron del Textbox original, anterior a MotorMascara: para cada texto
+escrito, lo que mostraba el control (texto, longitud de la parte oscura y cursor), el texto
+ingresado tras normalizarlo y el resultado de validar_dato(). El motor debe reproducirlos sin
+crear widgets.
+"""
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Formulario import (ConfiguracionTextbox, MotorMascara, Textbox, ValidadorDataFrame,  # noqa: E402
+                        _detectar_caracter_comodin)
+
+CONFIGURACIONES = {
+    'fecha_dma': dict(tipo_validacion='fecha', mascara='DD/MM/AAAA', caracteres_fijos='/'),
+    'fecha_amd': dict(tipo_validacion='fecha', mascara='AAAA-MM-DD', caracteres_fijos='-'),
+    'fecha_mda': dict(tipo_validacion='fecha', mascara='MM/DD/AAAA', caracteres_fijos='/'),
+    'fecha_myd': dict(tipo_validacion='fecha', mascara='MM YYYY DD', caracteres_fijos=' '),
+    'fecha_rango': dict(tipo_validacion='fecha', mascara='DD/MM/AAAA', caracteres_fijos='/', restricciones=('2000-01-01', '2030-12-31')),
+    'hora': dict(tipo_validacion='hora', mascara='HH:MM', caracteres_fijos=':'),
+    'hora_minusculas': dict(tipo_validacion='hora', mascara='hh:mm', caracteres_fijos=':'),
+    'momento': dict(tipo_validacion='momento', mascara='DD/MM/AAAA HH:MM', caracteres_fijos='/ :'),
+    'momento_guiones': dict(tipo_validacion='momento', mascara='DD-MM-AAAA HH.MM', caracteres_fijos='- .'),
+    'telefono': dict(tipo_validacion='str', mascara='(###) ##-##-##', caracteres_fijos='() -'),
+    'telefono_espacios': dict(tipo_validacion='str', mascara='(###) ## ## ##', caracteres_fijos='() '),
+    'cp': dict(tipo_validacion='str', mascara='#####'),
+    'dni': dict(tipo_validacion='str', mascara='########-#', caracteres_fijos='-'),
+    'codigo_fijo': dict(tipo_validacion='str', mascara='XXXX######XXX'),
+    'texto': dict(tipo_validacion='str', mascara=''),
+    'texto_corto': dict(tipo_validacion='str', mascara='', restricciones=5),
+    'entero': dict(tipo_validacion='int', mascara='###'),
+    'entero_rango': dict(tipo_validacion='int', mascara='##', restricciones=(1, 50)),
+    'decimal_coma': dict(tipo_validacion='float', mascara='###,##'),
+    'decimal_rango': dict(tipo_validacion='float', mascara='####.##', restricciones=(0, 500)),
+    'email': dict(tipo_validacion='email', mascara=''),
+}
+
+CASOS = [
+    ('fecha_dma', '', 'DD/MM/AAAA', 0, 0, '', False),
+    ('fecha_dma', '68/', '68/MM/AAAA', 3, 3, '68/', False),
+    ('fecha_dma', '6608', '66/08/AAAA', 6, 6, '6608', False),
+    ('fecha_dma', '53/62/', '53/62/AAAA', 6, 6, '53/62/', False),
+    ('fecha_dma', '97/39/2', '97/39/2AAA', 7, 7, '97/39/2', False),
+    ('fecha_dma', '02/18/9306/', '02/18/9306', 10, 10, '02/18/9306/', False),
+    ('fecha_dma', '15032024', '15/03/2024', 10, 10, '15032024', '15/03/2024'),
+    ('fecha_dma', '15/03/2024', '15/03/2024', 10, 10, '15/03/2024', '15/03/2024'),
+    ('fecha_dma', '29022023', '29/02/2023', 10, 10, '29022023', False),
+    ('fecha_dma', '29/02/2024', '29/02/2024', 10, 10, '29/02/2024', '29/02/2024'),
+    ('fecha_amd', '', 'AAAA-MM-DD', 0, 0, '', False),
+    ('fecha_amd', '90-', '90AA-MM-DD', 2, 2, '90-', False),
+    ('fecha_amd', '35968', '3596-08-DD', 7, 6, '35968', False),
+    ('fecha_amd', '0629957', '0629-95-07', 10, 9, '0629957', False),
+    ('fecha_amd', '56-20-44', '5620-44-DD', 8, 8, '56-20-44', False),
+    ('fecha_amd', '92-33-08-95', '9233-08-95', 10, 10, '92-33-08-95', False),
+    ('fecha_amd', '20240315', '2024-03-15', 10, 10, '20240315', '2024-03-15'),
+    ('fecha_amd', '2024-13-01', '2024-13-01', 10, 10, '2024-13-01', False),
+    ('fecha_mda', '', 'MM/DD/AAAA', 0, 0, '', False),
+    ('fecha_mda', '74/', '74/DD/AAAA', 3, 3, '74/', False),
+    ('fecha_mda', '85/1', '85/01/AAAA', 5, 4, '85/1', False),
+    ('fecha_mda', '708707', '70/87/07AA', 8, 8, '708707', False),
+    ('fecha_mda', '26/10/10', '26/10/10AA', 8, 8, '26/10/10', False),
+    ('fecha_mda', '31/17/01/97/', '31/17/0197', 10, 10, '31/17/01/97/', False),
+    ('fecha_mda', '03152024', '03/15/2024', 10, 10, '03152024', '03/15/2024'),
+    ('fecha_mda', '02/30/2024', '02/30/2024', 10, 10, '02/30/2024', False),
+    ('fecha_myd', '', 'MM YYYY DD', 0, 0, '', False),
+    ('fecha_myd', ' 294', '29 4YYY DD', 4, 4, ' 294', False),
+    ('fecha_myd', '54095', '54 095Y DD', 6, 6, '54095', False),
+    ('fecha_myd', '02 63 2', '02 632Y DD', 6, 6, '02 63 2', False),
+    ('fecha_myd', '44 49 71', '44 4971 DD', 8, 8, '44 49 71', False),
+    ('fecha_myd', '77 34 91 46', '77 3491 46', 10, 10, '77 34 91 46', False),
+    ('fecha_myd', '03202415', '03 2024 15', 10, 10, '03202415', '03 2024 15'),
+    ('fecha_rango', '', 'DD/MM/AAAA', 0, 0, '', False),
+    ('fecha_rango', '78/', '78/MM/AAAA', 3, 3, '78/', False),
+    ('fecha_rango', '84/4', '84/04/AAAA', 5, 4, '84/4', False),
+    ('fecha_rango', '58/54/', '58/54/AAAA', 6, 6, '58/54/', False),
+    ('fecha_rango', '08/10/30', '08/10/30AA', 8, 8, '08/10/30', False),
+    ('fecha_rango', '65/56/09/93', '65/56/0993', 10, 10, '65/56/09/93', False),
+    ('fecha_rango', '15031999', '15/03/1999', 10, 10, '15031999', False),
+    ('fecha_rango', '15032024', '15/03/2024', 10, 10, '15032024', '15/03/2024'),
+    ('hora', '', 'HH:MM', 0, 0, '', False),
+    ('hora', '83:', '83:MM', 3, 3, '83:', False),
+    ('hora', ':657', '65:07', 5, 4, ':657', False),
+    ('hora', '321685', '32:16', 5, 5, '321685', False),
+    ('hora', '15450485', '15:45', 5, 5, '15450485', '15:45'),
+    ('hora', '79895482898855', '79:89', 5, 5, '79895482898855', False),
+    ('hora', '0930', '09:30', 5, 5, '0930', '09:30'),
+    ('hora', '2460', '24:60', 5, 5, '2460', False),
+    ('hora_minusculas', '', 'hh:mm', 0, 0, '', False),
+    ('hora_minusculas', '90:', '90:mm', 3, 3, '90:', False),
+    ('hora_minusculas', '05288', '05:28', 5, 5, '05288', '05:28'),
+    ('hora_minusculas', '517850', '51:78', 5, 5, '517850', False),
+    ('hora_minusculas', '7059584:', '70:59', 5, 5, '7059584:', False),
+    ('hora_minusculas', '46:00182789262', '46:00', 5, 5, '46:00182789262', False),
+    ('momento', '', 'DD/MM/AAAA HH:MM', 0, 0, '', False),
+    ('momento', '73/', '73/MM/AAAA HH:MM', 3, 3, '73/', False),
+    ('momento', '2510/', '25/10/AAAA HH:MM', 6, 6, '2510/', False),
+    ('momento', '35/75/7', '35/75/7AAA HH:MM', 7, 7, '35/75/7', False),
+    ('momento', '1102/9142 ', '11/02/9142 HH:MM', 11, 10, '1102/9142 ', False),
+    ('momento', '38/95/4463 75:579681', '38/95/4463 75:57', 16, 16, '38/95/4463 75:579681', False),
+    ('momento', '15032024 0930', '15/03/2024 09:30', 16, 16, '15032024 0930', '15/03/2024 09:30'),
+    ('momento', '15/03/2024 9:30', '15/03/2024 93:00', 16, 15, '15/03/2024 9:30', False),
+    ('momento', '150320240930', '15/03/2024 HH:MM', 16, 10, '150320240930', False),
+    ('momento', '31042024 1200', '31/04/2024 12:00', 16, 16, '31042024 1200', False),
+    ('momento_guiones', '', 'DD-MM-AAAA HH.MM', 0, 0, '', False),
+    ('momento_guiones', ' 07.', 'DD-MM-AAAA 07.MM', 4, 14, ' 07.', False),
+    ('momento_guiones', '9623-', '96-23-AAAA HH.MM', 6, 6, '9623-', False),
+    ('momento_guiones', '24-05-4', '24-05-4AAA HH.MM', 7, 7, '24-05-4', False),
+    ('momento_guiones', '64-62-147', '64-62-147A HH.MM', 9, 9, '64-62-147', False),
+    ('momento_guiones', '43-56-6890 40.385', '43-56-6890 40.38', 16, 16, '43-56-6890 40.385', False),
+    ('momento_guiones', '01-01-2025 23.59', '01-01-2025 23.59', 16, 16, '01-01-2025 23.59', '01-01-2025 23.59'),
+    ('telefono', '', '(###) ##-##-##', 0, 1, '', '(###) ##-##-##'),
+    ('telefono', 'a7', '(a7#) ##-##-##', 3, 3, 'a7', '(a7#) ##-##-##'),
+    ('telefono', '0839', '(083) 9#-##-##', 7, 7, '0839', '(083) 9#-##-##'),
+    ('telefono', '79829', '(798) 29-##-##', 9, 9, '79829', '(798) 29-##-##'),
+    ('telefono', '15200245', '(152) 00-24-5#', 13, 13, '15200245', '(152) 00-24-5#'),
+    ('telefono', 'a756X98802', '(a75) 6X-98-82', 14, 14, 'a756X9882', '(a75) 6X-98-82'),
+    ('telefono_espacios', '', '(###) ## ## ##', 0, 1, '', '(###) ## ## ##'),
+    ('telefono_espacios', '(28', '(28#) ## ## ##', 3, 3, '28', '(28#) ## ## ##'),
+    ('telefono_espacios', '0770', '(077) 0# ## ##', 7, 7, '0770', '(077) 0# ## ##'),
+    ('telefono_espacios', '81785', '(817) 85 ## ##', 9, 9, '81785', '(817) 85 ## ##'),
+    ('telefono_espacios', '740518/', '(740) 51 8# ##', 10, 10, '740518', '(740) 51 8# ##'),
+    ('telefono_espacios', '(205) 02 37', '(205) 02 37 ##', 12, 12, '2050237', '(205) 02 37 ##'),
+    ('cp', '', '#####', 0, 0, '', '#####'),
+    ('cp', '12,', '12###', 2, 2, '12', '12###'),
+    ('cp', '5606', '5606#', 4, 4, '5606', '5606#'),
+    ('cp', 'a9762', 'a9762', 5, 5, 'a9762', 'a9762'),
+    ('cp', '6X9556', '6X956', 5, 5, '6X956', '6X956'),
+    ('cp', 'z726ba', 'z726a', 5, 5, 'z726a', 'z726a'),
+    ('dni', '', '########-#', 0, 0, '', '########-#'),
+    ('dni', 'X1', 'X1######-#', 2, 2, 'X1', 'X1######-#'),
+    ('dni', '0388', '0388####-#', 4, 4, '0388', '0388####-#'),
+    ('dni', '65847', '65847###-#', 5, 5, '65847', '65847###-#'),
+    ('dni', '8575161', '8575161#-#', 7, 7, '8575161', '8575161#-#'),
+    ('dni', 'b85b751650', 'b85b7516-0', 10, 10, 'b85b75160', 'b85b7516-0'),
+    ('codigo_fijo', '', 'XXXX######XXX', 0, 0, '', 'XXXX######XXX'),
+    ('codigo_fijo', '195', '195X######XXX', 3, 3, '195', '195X######XXX'),
+    ('codigo_fijo', '584 ', '584X######XXX', 3, 3, '584', '584X######XXX'),
+    ('codigo_fijo', 'X1b06', 'X1b0######6XX', 11, 11, 'X1b06', 'X1b0######6XX'),
+    ('codigo_fijo', '950794.', '9507######94X', 12, 12, '950794', '9507######94X'),
+    ('codigo_fijo', 'X1b0668-', 'X1b0######668', 13, 13, 'X1b0668', 'X1b0######668'),
+    ('texto', '', '', 0, 0, '', ''),
+    ('texto', '096', '096', 3, 3, '096', '096'),
+    ('texto', '75/2', '75/2', 4, 4, '75/2', '75/2'),
+    ('texto', '56,- 4', '56,- 4', 6, 6, '56,- 4', '56,- 4'),
+    ('texto', '1603,456X', '1603,456X', 9, 9, '1603,456X', '1603,456X'),
+    ('texto', '9906/65609996325', '9906/65609996325', 16, 16, '9906/65609996325', '9906/65609996325'),
+    ('texto_corto', '', '', 0, 0, '', ''),
+    ('texto_corto', '880', '880', 3, 3, '880', '880'),
+    ('texto_corto', '8:29b', '8:29b', 5, 5, '8:29b', '8:29b'),
+    ('texto_corto', '9419084', '9419084', 7, 7, '9419084', False),
+    ('texto_corto', '454-349.17', '454-349.17', 10, 10, '454-349.17', False),
+    ('texto_corto', '7505z6z05475126 75', '7505z6z05475126 75', 18, 18, '7505z6z05475126 75', False),
+    ('texto_corto', '123456', '123456', 6, 6, '123456', False),
+    ('entero', '', '000', 0, 3, '', 0),
+    ('entero', '8.', '008', 3, 3, '8', 8),
+    ('entero', '704', '704', 3, 3, '704', 704),
+    ('entero', '3846', '386', 3, 3, '386', 386),
+    ('entero', '6020', '600', 3, 3, '600', 600),
+    ('entero', '9996', '996', 3, 3, '996', 996),
+    ('entero_rango', '', '00', 0, 2, '', False),
+    ('entero_rango', '62', '62', 2, 2, '62', False),
+    ('entero_rango', '168', '18', 2, 2, '18', 18),
+    ('entero_rango', '43a', '43', 2, 2, '43', 43),
+    ('entero_rango', '705', '75', 2, 2, '75', False),
+    ('entero_rango', '999', '99', 2, 2, '99', False),
+    ('entero_rango', '0', '00', 2, 2, '0', False),
+    ('entero_rango', '51', '51', 2, 2, '51', False),
+    ('decimal_coma', '', '000,00', 0, 3, '', 0.0),
+    ('decimal_coma', ',63', '000,63', 6, 6, ',63', 0.63),
+    ('decimal_coma', '221,', '221,00', 4, 4, '221,', 221.0),
+    ('decimal_coma', '203,32', '203,32', 6, 6, '203,32', 203.32),
+    ('decimal_coma', '123,863', '123,83', 6, 6, '123,83', 123.83),
+    ('decimal_coma', '944,675', '944,65', 6, 6, '944,65', 944.65),
+    ('decimal_rango', '', '0000.00', 0, 4, '', 0.0),
+    ('decimal_rango', '129', '0129.00', 4, 4, '129', 129.0),
+    ('decimal_rango', '5991', '5991.00', 4, 4, '5991', False),
+    ('decimal_rango', '7048.2', '7048.20', 7, 6, '7048.2', False),
+    ('decimal_rango', '1070.762', '1070.72', 7, 7, '1070.72', False),
+    ('decimal_rango', '9495.847', '9495.87', 7, 7, '9495.87', False),
+    ('decimal_rango', '499,99', '0499.99', 7, 7, '499.99', 499.99),
+    ('decimal_rango', '500.01', '0500.01', 7, 7, '500.01', False),
+    ('email', '', '', 0, 0, '', False),
+    ('email', '375', '375', 3, 3, '375', False),
+    ('email', 'x3@0', 'x3@0', 4, 4, 'x3@0', False),
+    ('email', '@63,6z', '@63,6z', 6, 6, '@63,6z', False),
+    ('email', '886-7x7x1', '886-7x7x1', 9, 9, '886-7x7x1', False),
+    ('email', '886-7x7x16712z,179', '886-7x7x16712z,179', 18, 18, '886-7x7x16712z,179', False),
+    ('email', 'Ana.Perez@Ejemplo.com', 'ana.perez@ejemplo.com', 21, 21, 'ana.perez@ejemplo.com', 'ana.perez@ejemplo.com'),
+    ('email', ' ana @ejemplo.es', 'ana@ejemplo.es', 14, 14, 'ana@ejemplo.es', 'ana@ejemplo.es'),
+    ('email', 'sin-arroba.com', 'sin-arroba.com', 14, 14, 'sin-arroba.com', False),
+    ('email', 'a@b', 'a@b', 3, 3, 'a@b', False),
+]
+
+
+def _motor(nombre):
+    return MotorMascara.desde_configuracion(ConfiguracionTextbox(**CONFIGURACIONES[nombre]))
+
+
+@pytest.mark.parametrize("nombre, texto, mostrado, oscura, cursor, ingresado, validado", CASOS)
+def test_renderizar_como_textbox_original(nombre, texto, mostrado, oscura, cursor, ingresado, validado):
+    estado = _motor(nombre).renderizar(texto)
+    assert (estado.texto, estado.longitud_oscura, estado.cursor, estado.texto_ingresado) == \
+        (mostrado, oscura, cursor, ingresado)
+
+
+@pytest.mark.parametrize("nombre, texto, mostrado, oscura, cursor, ingresado, validado", CASOS)
+def test_validar_como_textbox_original(nombre, texto, mostrado, oscura, cursor, ingresado, validado):
+    assert _motor(nombre).validar(texto) == validado
+
+
+@pytest.mark.parametrize("nombre", ["decimal_coma", "decimal_rango", "entero", "entero_rango"])
+def test_procesar_lote_numeros_como_validador_dataframe(nombre):
+    config = ConfiguracionTextbox(**CONFIGURACIONES[nombre])
+    valores = pd.Series([1e-09, 1e-05, 0.0025, 0.1 + 0.2, 12.345, 499.99, 1e20, 3.0, -1.5], dtype="float64")
+    lote = MotorMascara.desde_configuracion(config).procesar_lote(valores)["error"]
+    validador = ValidadorDataFrame({"x": config}).validar(pd.DataFrame({"x": valores})).errores["x"]
+    assert lote.fillna("").tolist() == validador.fillna("").tolist()
+
+
+def test_procesar_lote_sin_notacion_cientifica():
+    config = ConfiguracionTextbox(**CONFIGURACIONES["decimal_rango"])
+    lote = MotorMascara.desde_configuracion(config).procesar_lote([1e-09, 1e-05])
+    assert lote.loc[0, "formateado"] == "0000.00"
+    assert lote["error"].fillna("").tolist() == ["", "longitud"]
+
+
+def _textbox(nombre):
+    """Textbox sin tk.Frame: solo los atributos que usan motor y validar_dato."""
+    config = ConfiguracionTextbox(**CONFIGURACIONES[nombre])
+    textbox = Textbox.__new__(Textbox)
+    textbox.mascara = config.mascara
+    textbox.caracteres_fijos = config.caracteres_fijos
+    textbox.caracter_comodin = _detectar_caracter_comodin(config.mascara, config.caracteres_fijos,
+                                                          config.caracter_comodin)
+    textbox.tipo_validacion = config.tipo_validacion
+    textbox.restricciones = config.restricciones
+    textbox._motor = None
+    textbox._restricciones_motor = None
+    textbox.texto_ingresado = ""
+    return textbox
+
+
+def test_motor_en_cache_hasta_cambiar_la_configuracion():
+    textbox = _textbox("entero_rango")
+    motor = textbox.motor
+    assert textbox.motor is motor
+    textbox.restricciones["max"] = 20
+    assert textbox.motor is not motor
+    textbox.texto_ingresado = "30"
+    assert textbox.validar_dato() is False
+    motor = textbox.motor
+    textbox.tipo_validacion = "str"
+    assert textbox.motor is not motor
+    motor = textbox.motor
+    textbox.mascara = "###"
+    assert textbox.motor is not motor
+    assert textbox.motor.plan.mascara == "###"
+    assert textbox.motor is textbox.motor
+
+
+def test_validar_dato_no_escribe_en_la_salida(capsys):
+    textbox = _textbox("fecha_dma")
+    textbox.texto_ingresado = "31042024"
+    assert textbox.validar_dato() is False
+    assert capsys.readouterr().out == ""